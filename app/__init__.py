@@ -35,6 +35,8 @@ from app.main import main as main_blueprint
 # --- NOVA IMPORTAÇÃO (no final) ---
 # Importa os eventos do chat para que sejam registrados
 from . import events
+from .presence import presence_registry
+from .cache import shared_versions
 
 def create_app(config_class=Config):
     """
@@ -50,7 +52,9 @@ def create_app(config_class=Config):
     admin.init_app(app)
     mail.init_app(app)
     # --- INICIALIZAÇÃO DO SOCKET.IO ---
-    socketio.init_app(app)
+    socketio.init_app(app, message_queue=app.config.get('SOCKETIO_MESSAGE_QUEUE'))
+    presence_registry.init_app(app)
+    shared_versions.init_app(app)
 
 
     # --- PASSO 4: Registrar os Blueprints ---
@@ -0,0 +1,188 @@
+# app/activity.py
+
+import atexit
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event, insert, select, delete, func, or_, and_
+from sqlalchemy.exc import IntegrityError
+
+from . import db, socketio
+from .models import ActivityLog, ActivityRollup
+
+# Uma atividade como exibida no perfil
+ActivityItem = namedtuple('ActivityItem', ['id', 'event_type', 'details', 'created_at'])
+
+
+class ActivityBuffer:
+    """
+    Acumula os eventos de atividade em memória e os grava em lote (um único
+    INSERT com vários valores) a cada intervalo, a partir de uma tarefa em
+    segundo plano. Eventos registrados durante uma requisição só entram no
+    buffer quando a transação da requisição é confirmada (ver _move_to_buffer).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = []
+        self._app = None
+
+    def _ensure_started(self):
+        if self._app is not None:
+            return
+        self._app = current_app._get_current_object()
+        socketio.start_background_task(self._run)
+        atexit.register(self._flush_at_exit)
+
+    def add(self, rows):
+        with self._lock:
+            self._pending.extend(rows)
+            full = len(self._pending) >= current_app.config.get('ACTIVITY_BUFFER_MAX', 1000)
+        self._ensure_started()
+        if full:
+            # Buffer cheio: grava já, em vez de deixar a memória crescer
+            self.flush()
+
+    def flush(self, user_id=None):
+        """
+        Grava no banco os eventos pendentes (só os do usuário, se `user_id`
+        for informado). Retorna quantos foram gravados.
+        """
+        with self._lock:
+            if user_id is None:
+                pending, self._pending = self._pending, []
+            else:
+                pending = [row for row in self._pending if row['user_id'] == user_id]
+                if pending:
+                    self._pending = [row for row in self._pending if row['user_id'] != user_id]
+        if not pending:
+            return 0
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(insert(ActivityLog), pending)
+        except IntegrityError as e:
+            # Algum usuário foi apagado antes da gravação: grava os demais, um a um
+            saved = 0
+            for row in pending:
+                try:
+                    with db.engine.begin() as conn:
+                        conn.execute(insert(ActivityLog), [row])
+                    saved += 1
+                except IntegrityError:
+                    pass
+            logging.warning(f"{len(pending) - saved} atividade(s) descartada(s) na gravação em lote: {e}")
+            return saved
+        except Exception as e:
+            with self._lock:
+                self._pending[:0] = pending
+            logging.error(f"Falha ao gravar {len(pending)} atividades: {e}")
+            return 0
+        return len(pending)
+
+    def _run(self):
+        while True:
+            socketio.sleep(self._app.config.get('ACTIVITY_FLUSH_INTERVAL', 10))
+            with self._app.app_context():
+                self.flush()
+
+    def _flush_at_exit(self):
+        with self._app.app_context():
+            self.flush()
+
+
+# Instância única usada pela aplicação
+activity_buffer = ActivityBuffer()
+
+
+# --- REGISTRO ---
+
+def record_activity(user_id, event_type, details=None):
+    """
+    Registra uma atividade na transação atual. Ela vai para o buffer quando a
+    transação for confirmada e é descartada se houver rollback.
+    """
+    db.session.info.setdefault('pending_activities', []).append({
+        'user_id': user_id,
+        'event_type': event_type,
+        'details': details[:255] if details else details,
+        'created_at': datetime.utcnow(),
+    })
+
+
+@event.listens_for(db.session, 'after_commit')
+def _move_to_buffer(session):
+    rows = session.info.pop('pending_activities', None)
+    if rows:
+        activity_buffer.add(rows)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop('pending_activities', None)
+
+
+# --- LEITURA ---
+
+def recent_activity(user_id, before=None, limit=20):
+    """
+    Atividades do usuário, das mais recentes para trás, usando o índice
+    (user_id, created_at). `before` é a posição (created_at, id) da última
+    atividade já exibida. Antes da primeira página, os eventos do usuário
+    ainda no buffer são gravados, para que apareçam com a sua posição real.
+
+    Retorna (itens, posição da próxima página ou None).
+    """
+    if before is None:
+        activity_buffer.flush(user_id)
+
+    query = select(ActivityLog.id, ActivityLog.event_type, ActivityLog.details, ActivityLog.created_at) \
+        .where(ActivityLog.user_id == user_id)
+    if before:
+        created_at, activity_id = before
+        query = query.where(or_(
+            ActivityLog.created_at < created_at,
+            and_(ActivityLog.created_at == created_at, ActivityLog.id < activity_id)
+        ))
+    rows = db.session.execute(
+        query.order_by(ActivityLog.created_at.desc(), ActivityLog.id.desc()).limit(limit + 1)
+    ).all()
+
+    items = [ActivityItem(*row) for row in rows[:limit]]
+    return items, (items[-1] if len(rows) > limit else None)
+
+
+# --- RETENÇÃO ---
+
+def compact_activity(retention_days):
+    """
+    Agrega os eventos mais antigos que `retention_days` em contagens diárias
+    por usuário e tipo (tabela activity_rollups) e apaga os eventos brutos.
+    Retorna (eventos agregados, linhas de resumo criadas ou atualizadas).
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    day = func.date(ActivityLog.created_at)
+    totals = db.session.execute(
+        select(ActivityLog.user_id, ActivityLog.event_type, day, func.count())
+        .where(ActivityLog.created_at < cutoff)
+        .group_by(ActivityLog.user_id, ActivityLog.event_type, day)
+    ).all()
+    if not totals:
+        return 0, 0
+
+    compacted = 0
+    for user_id, event_type, event_day, count in totals:
+        if isinstance(event_day, str):
+            event_day = datetime.strptime(event_day, '%Y-%m-%d').date()
+        rollup = db.session.get(ActivityRollup, (user_id, event_type, event_day))
+        if rollup:
+            rollup.count += count
+        else:
+            db.session.add(ActivityRollup(user_id=user_id, event_type=event_type, day=event_day, count=count))
+        compacted += count
+
+    db.session.execute(delete(ActivityLog).where(ActivityLog.created_at < cutoff))
+    db.session.commit()
+    return compacted, len(totals)
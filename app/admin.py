@@ -14,6 +14,8 @@ from wtforms import StringField, IntegerField, TextAreaField, BooleanField, Pass
 
 from .models import User, Course, Lesson, Quiz, Question, Answer
 from . import db
+from .http_cache import response_cache
+from .rendering import prerender
 
 
 class MyAdminIndexView(AdminIndexView):
@@ -25,12 +27,29 @@ class MyAdminIndexView(AdminIndexView):
 
 
 class SecureModelView(ModelView):
+    # Escopos do cache de respostas afetados por alterações no modelo
+    cache_scopes = ()
+
     def is_accessible(self):
         return current_user.is_authenticated and current_user.is_admin
 
     def inaccessible_callback(self, name, **kwargs):
         return redirect(url_for('main.dashboard'))
 
+    def cache_scopes_for(self, model):
+        return self.cache_scopes
+
+    def on_model_change(self, form, model, is_created):
+        # O HTML do corpo (aulas e cursos) é gerado uma vez, ao salvar
+        prerender(model)
+
+    def after_model_change(self, form, model, is_created):
+        # Chamado após o commit: as páginas em cache não são regeradas com o conteúdo antigo
+        response_cache.bump(*self.cache_scopes_for(model))
+
+    def after_model_delete(self, model):
+        response_cache.bump(*self.cache_scopes_for(model))
+
 
 class UserAdminForm(FlaskForm):
     username = StringField('Username')
@@ -47,13 +66,29 @@ class UserAdminView(SecureModelView):
     category = "Serviços"
     form = UserAdminForm
     column_list = ['username', 'email', 'full_name', 'score', 'is_admin']
+    cache_scopes = ('landing',)
+
+    def cache_scopes_for(self, model):
+        return self.cache_scopes + (f'user:{model.id}',)
+
     def on_model_change(self, form, model, is_created):
+        super().on_model_change(form, model, is_created)
         if form.password.data and form.password.data.strip():
             model.password_hash = generate_password_hash(form.password.data, method='pbkdf2:sha256')
 
 
+class CourseAdminView(SecureModelView):
+    category = "Serviços"
+    cache_scopes = ('catalog',)
+    # Contadores são mantidos pelas rotas da aplicação, não editados à mão
+    column_list = ['title', 'category', 'created_at', 'enrollment_count']
+    form_excluded_columns = ['likes_count', 'dislikes_count', 'rating_sum', 'rating_count', 'enrollment_count',
+                             'summary', 'description_html']
+
+
 class AnswerAdminView(SecureModelView):
     category = "Serviços"
+    cache_scopes = ('catalog',)
     column_list = ['text', 'is_correct', 'question']
     form_columns = ['question', 'text', 'is_correct']
 
@@ -72,6 +107,7 @@ class AnswerAdminView(SecureModelView):
 
 class LessonAdminView(SecureModelView):
     category = "Serviços"
+    cache_scopes = ('catalog',)
     column_list = ['title', 'course']
     form_columns = ['course', 'title', 'content']
 
@@ -90,6 +126,7 @@ class LessonAdminView(SecureModelView):
 
 class QuizAdminView(SecureModelView):
     category = "Serviços"
+    cache_scopes = ('catalog',)
     column_list = ['title', 'lesson']
     form_columns = ['lesson', 'title']
 
@@ -108,6 +145,7 @@ class QuizAdminView(SecureModelView):
 
 class QuestionAdminView(SecureModelView):
     category = "Serviços"
+    cache_scopes = ('catalog',)
     column_list = ['text', 'quiz']
     form_columns = ['quiz', 'text']
 
@@ -134,7 +172,7 @@ admin = Admin(
 
 # Adiciona as views com a categoria "Serviços"
 admin.add_view(UserAdminView(User, db.session, name='Usuários'))
-admin.add_view(SecureModelView(Course, db.session, name='Cursos', category="Serviços"))
+admin.add_view(CourseAdminView(Course, db.session, name='Cursos'))
 admin.add_view(LessonAdminView(Lesson, db.session, name='Aulas'))
 admin.add_view(QuizAdminView(Quiz, db.session, name='Simulados'))
 admin.add_view(QuestionAdminView(Question, db.session, name='Perguntas'))
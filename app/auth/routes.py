@@ -1,5 +1,7 @@
 # app/auth/routes.py
 
+import logging
+
 from flask import render_template, request, redirect, url_for, flash
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import login_user, logout_user, login_required, current_user
@@ -7,7 +9,9 @@ from flask_login import login_user, logout_user, login_required, current_user
 from . import auth
 from app import db
 from app.models import User
-from app.email import send_password_reset_email, send_confirmation_email
+from app.email import send_password_reset_email, send_confirmation_email, EmailQueueFull
+from app.leaderboard import leaderboard
+from app.http_cache import response_cache
 from .forms import PasswordResetRequestForm, ResetPasswordForm
 
 
@@ -41,9 +45,16 @@ def pagina_cadastro():
 
         db.session.add(novo_usuario)
         db.session.commit()
+        leaderboard.record_score(novo_usuario.id, novo_usuario.username, novo_usuario.score)
+        # A página inicial mostra o total de membros
+        response_cache.bump('landing')
 
         # Envia o e-mail de confirmação para o novo usuário
-        send_confirmation_email(novo_usuario)
+        try:
+            send_confirmation_email(novo_usuario)
+        except EmailQueueFull as e:
+            flash(f'Cadastro realizado com sucesso! {e}', 'warning')
+            return redirect(url_for('auth.pagina_login'))
 
         flash('Cadastro realizado com sucesso! Um e-mail de confirmação foi enviado para você.', 'success')
         return redirect(url_for('auth.pagina_login'))
@@ -69,9 +80,13 @@ def pagina_login():
         if user and check_password_hash(user.password_hash, password):
             # Verifica se o usuário confirmou o e-mail
             if not user.confirmed:
-                # Se não confirmou, reenvia o e-mail de confirmação
-                send_confirmation_email(user)
-                flash('Sua conta ainda não foi confirmada. Um novo e-mail de confirmação foi enviado para você.',
+                # Se não confirmou, reenvia o e-mail de confirmação (a fila ignora reenvios seguidos)
+                try:
+                    send_confirmation_email(user)
+                except EmailQueueFull as e:
+                    flash(f'Sua conta ainda não foi confirmada. {e}', 'warning')
+                    return redirect(url_for('auth.pagina_login'))
+                flash('Sua conta ainda não foi confirmada. Verifique sua caixa de entrada: enviamos um e-mail de confirmação para você.',
                       'warning')
                 return redirect(url_for('auth.pagina_login'))
 
@@ -135,7 +150,11 @@ def resend_confirmation():
         flash('Sua conta já está confirmada!', 'info')
         return redirect(url_for('main.dashboard'))
 
-    send_confirmation_email(current_user)
+    try:
+        send_confirmation_email(current_user)
+    except EmailQueueFull as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('auth.pagina_login'))
     flash('Um novo e-mail de confirmação foi enviado para sua caixa de entrada.', 'success')
     return redirect(url_for('auth.pagina_login'))
 
@@ -149,7 +168,12 @@ def pagina_reset_password_request():
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
         if user:
-            send_password_reset_email(user)
+            try:
+                send_password_reset_email(user)
+            except EmailQueueFull:
+                # Formulário público: a resposta é a mesma para qualquer endereço,
+                # para não revelar quais e-mails têm conta
+                logging.error(f"Redefinição de senha para {user.email} não enviada: fila de e-mails cheia.")
         flash('Um e-mail com instruções para redefinir sua senha foi enviado.', 'info')
         return redirect(url_for('auth.pagina_login'))
     return render_template('auth/reset_password_request.html', form=form)
@@ -0,0 +1,301 @@
+# app/cache.py
+
+import threading
+import time
+
+from flask import g, has_request_context
+
+
+class SimpleCache:
+    """
+    Cache em memória compartilhado entre as requisições de um mesmo processo.
+    Cada entrada guarda o instante em que expira; entradas vencidas são
+    descartadas na leitura.
+    """
+
+    def __init__(self, default_timeout=300):
+        self.default_timeout = default_timeout
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value, timeout=None):
+        if timeout is None:
+            timeout = self.default_timeout
+        expires_at = time.monotonic() + timeout if timeout else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def update(self, key, func):
+        """
+        Substitui o valor em cache por `func(valor)`, de forma atômica e sem
+        alterar a expiração. Se a chave não estiver em cache, não faz nada
+        (a próxima leitura recarrega da origem). Retorna True se atualizou.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return False
+            self._data[key] = (expires_at, func(value))
+            return True
+
+    def get_or_set(self, key, factory, timeout=None):
+        """Retorna o valor em cache ou o calcula com `factory` e o armazena."""
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = factory()
+            self.set(key, value, timeout)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Instância única usada pela aplicação
+cache = SimpleCache()
+
+
+class LocalStore:
+    """
+    Substituto local, em memória, do cliente Redis com os comandos usados pelo
+    registro de presença (SharedStorePresenceBackend) e pelas versões
+    compartilhadas (SharedVersions). Útil com um único worker, em
+    desenvolvimento e nos testes.
+    Transações rodam inteiras sob o mesmo lock, o que as torna atômicas.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._data = {}
+        self._expires = {}
+
+    def _expire(self, key):
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._expires.pop(key, None)
+            self._data.pop(key, None)
+
+    def set(self, key, value, ex=None, nx=False):
+        with self._lock:
+            self._expire(key)
+            if nx and key in self._data:
+                return None
+            self._data[key] = str(value)
+            if ex:
+                self._expires[key] = time.monotonic() + ex
+            else:
+                self._expires.pop(key, None)
+            return True
+
+    def get(self, key):
+        with self._lock:
+            self._expire(key)
+            return self._data.get(key)
+
+    def mget(self, keys):
+        with self._lock:
+            for key in keys:
+                self._expire(key)
+            return [self._data.get(key) for key in keys]
+
+    def incr(self, key):
+        with self._lock:
+            self._expire(key)
+            value = int(self._data.get(key) or 0) + 1
+            self._data[key] = str(value)
+            return value
+
+    def exists(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._expire(key)
+            return sum(key in self._data for key in keys)
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def transaction(self, func, *watches, value_from_callable=False):
+        with self._lock:
+            value = func(_LocalPipeline(self))
+        return value if value_from_callable else []
+
+    def sadd(self, key, *members):
+        with self._lock:
+            current = self._data.setdefault(key, set())
+            added = len(set(map(str, members)) - current)
+            current.update(map(str, members))
+            return added
+
+    def srem(self, key, *members):
+        with self._lock:
+            current = self._data.get(key, set())
+            removed = len(current & set(map(str, members)))
+            current.difference_update(map(str, members))
+            if not current:
+                self._data.pop(key, None)
+            return removed
+
+    def scard(self, key):
+        with self._lock:
+            return len(self._data.get(key, ()))
+
+    def smembers(self, key):
+        with self._lock:
+            return set(self._data.get(key, ()))
+
+    def hset(self, key, field, value):
+        with self._lock:
+            self._data.setdefault(key, {})[str(field)] = str(value)
+            return 1
+
+    def hget(self, key, field):
+        with self._lock:
+            return self._data.get(key, {}).get(str(field))
+
+    def hdel(self, key, *fields):
+        with self._lock:
+            current = self._data.get(key, {})
+            return sum(current.pop(str(field), None) is not None for field in fields)
+
+    def hmget(self, key, fields):
+        with self._lock:
+            current = self._data.get(key, {})
+            return [current.get(str(field)) for field in fields]
+
+    def hgetall(self, key):
+        with self._lock:
+            return dict(self._data.get(key, {}))
+
+    def hlen(self, key):
+        with self._lock:
+            return len(self._data.get(key, {}))
+
+
+class _LocalPipeline:
+    """Pipeline de uma transação do LocalStore: os comandos rodam na hora, já sob o lock."""
+
+    def __init__(self, store):
+        self._store = store
+
+    def multi(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._store, name)
+
+
+class SharedVersions:
+    """
+    Versões dos dados mantidos em cache nos processos (gabaritos, contagens
+    de mensagens não lidas, vizinhança no grafo de amizades, escopos do cache
+    de respostas HTTP). Cada nome tem um contador que é incrementado quando
+    os dados mudam; uma entrada em cache guarda a versão com que foi
+    calculada e só vale enquanto essa versão for a atual.
+
+    Com PRESENCE_STORE_URL configurado, os contadores ficam no armazenamento
+    compartilhado (Redis), e uma alteração feita em qualquer worker invalida
+    o cache de todos. Sem ele, ficam em memória (LocalStore).
+
+    Um contador que ainda não existe começa no instante atual (em
+    microssegundos), e não em zero: se o armazenamento for reiniciado, as
+    versões não voltam a valores já usados antes. Dentro de uma requisição,
+    cada versão é lida do armazenamento uma única vez (memorizada em `g`).
+    """
+
+    prefix = 'version'
+
+    def __init__(self, client=None):
+        self.client = client or LocalStore()
+
+    def init_app(self, app):
+        url = app.config.get('PRESENCE_STORE_URL')
+        if url:
+            import redis  # dependência opcional, só necessária com vários workers
+            self.client = redis.Redis.from_url(url)
+
+    def _key(self, name):
+        return f'{self.prefix}:{name}'
+
+    def _memo(self):
+        if not has_request_context():
+            return {}
+        if '_shared_versions' not in g:
+            g._shared_versions = {}
+        return g._shared_versions
+
+    def get_many(self, names):
+        """Versões atuais dos nomes, na mesma ordem."""
+        memo = self._memo()
+        missing = [name for name in dict.fromkeys(names) if name not in memo]
+        if missing:
+            keys = [self._key(name) for name in missing]
+            values = self.client.mget(keys)
+            if None in values:
+                start = time.time_ns() // 1000
+                for key, value in zip(keys, values):
+                    if value is None:
+                        self.client.set(key, start, nx=True)
+                values = self.client.mget(keys)
+            memo.update((name, int(value)) for name, value in zip(missing, values))
+        return [memo[name] for name in names]
+
+    def get(self, name):
+        return self.get_many([name])[0]
+
+    def bump(self, *names):
+        """Incrementa as versões (invalida os dados em cache). Retorna as novas versões."""
+        memo = self._memo()
+        versions = []
+        for name in names:
+            memo[name] = self.client.incr(self._key(name))
+            versions.append(memo[name])
+        return versions
+
+    def cached(self, key, name, factory, timeout=None):
+        """
+        Valor de `factory()` em cache (no processo) sob `key`, válido enquanto
+        a versão `name` não mudar.
+        """
+        version = self.get(name)
+        entry = cache.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        value = factory()
+        cache.set(key, (version, value), timeout)
+        return value
+
+    def update(self, key, name, func):
+        """
+        Faz o bump da versão `name` e aplica `func` ao valor em cache sob `key`,
+        que continua valendo neste processo sem ser recarregado. Se a entrada
+        não estava na versão anterior (outro worker mudou os dados), fica como
+        está: já não vale e será recarregada na próxima leitura.
+        """
+        version, = self.bump(name)
+        cache.update(key, lambda entry: (version, func(entry[1])) if entry[0] == version - 1 else entry)
+
+
+# Instância única usada pela aplicação
+shared_versions = SharedVersions()
@@ -0,0 +1,162 @@
+# app/catalog.py
+
+import base64
+import binascii
+from datetime import datetime
+
+from sqlalchemy import func, or_, and_, select
+
+from . import db
+from .models import Course, Lesson, CourseRating, CourseLike, Enrollment
+from .search import match_ids
+from .loading import with_summary
+
+
+class CatalogEntry:
+    """
+    Um curso do catálogo com seus agregados já calculados.
+    Os atributos do próprio curso (title, category, ...) são repassados ao objeto Course.
+    """
+
+    def __init__(self, course, average_rating=0, likes_count=0, dislikes_count=0,
+                 is_enrolled=False, user_rating=None, user_like=None):
+        self.course = course
+        self.average_rating = average_rating
+        self.likes_count = likes_count
+        self.dislikes_count = dislikes_count
+        self.is_enrolled = is_enrolled
+        self.user_rating = user_rating
+        # True = curtiu, False = não curtiu, None = sem interação
+        self.user_like = user_like
+
+    def __getattr__(self, name):
+        return getattr(self.course, name)
+
+    def __repr__(self):
+        return f'<CatalogEntry {self.course.title}>'
+
+
+def build_catalog(courses, user):
+    """
+    Monta as entradas do catálogo para uma lista de cursos com um número
+    constante de consultas, independente da quantidade de cursos.
+    """
+    courses = list(courses)
+    if not courses:
+        return []
+    course_ids = [course.id for course in courses]
+
+    enrolled_ids = set()
+    user_ratings = {}
+    user_likes = {}
+    if user.is_authenticated:
+        enrolled_ids = {course_id for (course_id,) in db.session.query(Enrollment.course_id).filter(
+            Enrollment.user_id == user.id, Enrollment.course_id.in_(course_ids))}
+        user_ratings = dict(db.session.query(CourseRating.course_id, CourseRating.stars).filter(
+            CourseRating.user_id == user.id, CourseRating.course_id.in_(course_ids)).all())
+        user_likes = dict(db.session.query(CourseLike.course_id, CourseLike.is_like).filter(
+            CourseLike.user_id == user.id, CourseLike.course_id.in_(course_ids)).all())
+
+    entries = []
+    for course in courses:
+        # Avaliação média e curtidas vêm dos contadores denormalizados do curso
+        entries.append(CatalogEntry(
+            course,
+            average_rating=course.average_rating(),
+            likes_count=course.likes_count,
+            dislikes_count=course.dislikes_count,
+            is_enrolled=course.id in enrolled_ids,
+            user_rating=user_ratings.get(course.id),
+            user_like=user_likes.get(course.id),
+        ))
+    return entries
+
+
+# --- PAGINAÇÃO POR CURSOR (KEYSET) ---
+
+def encode_cursor(row):
+    """Gera um cursor opaco a partir da posição (created_at, id) de um curso (ou outra linha)."""
+    raw = f'{row.created_at.isoformat()}|{row.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Retorna a tupla (created_at, id) do cursor ou None se ele for inválido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, course_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(course_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def courses_query(search_query=None):
+    # Listagens trazem só o resumo da descrição, nunca o texto completo
+    query = Course.query.options(with_summary(Course))
+    if search_query:
+        # Casa pelo próprio curso ou pelo conteúdo de alguma de suas aulas
+        query = query.filter(
+            or_(
+                Course.id.in_(match_ids('course', search_query)),
+                Course.id.in_(select(Lesson.course_id).where(Lesson.id.in_(match_ids('lesson', search_query))))
+            )
+        )
+    return query
+
+
+def course_page_query(search_query=None, cursor=None, per_page=12):
+    """
+    Consulta de uma página de cursos (mais recentes primeiro), com uma linha
+    a mais para saber se há próxima página. A posição é filtrada por
+    (created_at, id), então nenhuma página precisa de OFFSET.
+    """
+    query = courses_query(search_query)
+
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        created_at, course_id = position
+        query = query.filter(or_(
+            Course.created_at < created_at,
+            and_(Course.created_at == created_at, Course.id < course_id)
+        ))
+
+    return query.order_by(Course.created_at.desc(), Course.id.desc()).limit(per_page + 1)
+
+
+def course_page(search_query=None, cursor=None, per_page=12):
+    """
+    Retorna uma página de cursos (mais recentes primeiro) e o cursor da
+    próxima página, ou None quando não há mais resultados.
+    """
+    courses = course_page_query(search_query, cursor, per_page).all()
+
+    next_cursor = None
+    if len(courses) > per_page:
+        courses = courses[:per_page]
+        next_cursor = encode_cursor(courses[-1])
+    return courses, next_cursor
+
+
+# --- CONTADORES DENORMALIZADOS ---
+
+def reconcile_counters():
+    """
+    Recalcula os contadores de todos os cursos a partir das tabelas de origem,
+    corrigindo qualquer divergência. Retorna quantos cursos estavam divergentes.
+    """
+    expected = {
+        Course.likes_count: select(func.count()).where(
+            CourseLike.course_id == Course.id, CourseLike.is_like == True).scalar_subquery(),
+        Course.dislikes_count: select(func.count()).where(
+            CourseLike.course_id == Course.id, CourseLike.is_like == False).scalar_subquery(),
+        Course.rating_sum: select(func.coalesce(func.sum(CourseRating.stars), 0)).where(
+            CourseRating.course_id == Course.id).scalar_subquery(),
+        Course.rating_count: select(func.count()).where(
+            CourseRating.course_id == Course.id).scalar_subquery(),
+        Course.enrollment_count: select(func.count()).where(
+            Enrollment.course_id == Course.id).scalar_subquery(),
+    }
+    drifted = Course.query.filter(or_(*[column != value for column, value in expected.items()]))
+    total = drifted.update(expected, synchronize_session=False)
+    db.session.commit()
+    return total
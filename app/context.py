@@ -0,0 +1,76 @@
+# app/context.py
+
+from flask import current_app, g
+from sqlalchemy import func
+from werkzeug.local import LocalProxy
+
+from . import db
+from .cache import shared_versions
+from .models import User, PrivateMessage
+
+
+def _timeout():
+    return current_app.config.get('CONTEXT_CACHE_TIMEOUT', 300)
+
+
+def lazy_context(name, loader):
+    """
+    Cria um valor de contexto que só é calculado quando o template o acessa.
+    O resultado é memorizado em `g`, então vários acessos na mesma requisição
+    executam o `loader` uma única vez.
+    """
+    def _resolve():
+        key = f'_lazy_{name}'
+        if key not in g:
+            setattr(g, key, loader())
+        return getattr(g, key)
+
+    return LocalProxy(_resolve)
+
+
+# --- MENSAGENS NÃO LIDAS ---
+
+def _unread_key(user_id):
+    return f'unread_counts:{user_id}'
+
+
+def _unread_version(user_id):
+    return f'unread:{user_id}'
+
+
+def get_unread_counts(user_id):
+    """
+    Retorna {username_do_remetente: quantidade} das mensagens não lidas do usuário.
+    A consulta agregada só roda quando a contagem não está em cache; depois disso
+    ela é mantida por record_unread_message e clear_unread_from, que também
+    trocam a versão compartilhada da contagem (os outros workers a recarregam).
+    """
+    def _load():
+        rows = db.session.query(
+            User.username, func.count(PrivateMessage.id)
+        ).join(
+            PrivateMessage, User.id == PrivateMessage.sender_id
+        ).filter(
+            PrivateMessage.recipient_id == user_id,
+            PrivateMessage.read == False
+        ).group_by(User.username).all()
+        return {username: count for username, count in rows}
+
+    return shared_versions.cached(_unread_key(user_id), _unread_version(user_id), _load, _timeout())
+
+
+def record_unread_message(recipient_id, sender_username):
+    """Soma uma mensagem não lida do remetente à contagem em cache do destinatário."""
+    shared_versions.update(_unread_key(recipient_id), _unread_version(recipient_id),
+                           lambda counts: {**counts, sender_username: counts.get(sender_username, 0) + 1})
+
+
+def clear_unread_from(user_id, sender_username):
+    """Zera, na contagem em cache, as mensagens do remetente que o usuário acabou de ler."""
+    shared_versions.update(_unread_key(user_id), _unread_version(user_id),
+                           lambda counts: {username: count for username, count in counts.items()
+                                           if username != sender_username})
+
+
+def invalidate_unread_counts(user_id):
+    shared_versions.bump(_unread_version(user_id))
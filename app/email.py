@@ -1,75 +1,260 @@
 # app/email.py
 
-from flask_mail import Message
-from flask import render_template, current_app
-from . import mail
-from threading import Thread
-# --- NOVA IMPORTAÇÃO ---
-# Adicionamos o módulo de logging do Python
+import atexit
 import logging
+import smtplib
+import time
+from datetime import datetime, timedelta
+
+from flask_mail import Message
+from flask import render_template, current_app, request
+from sqlalchemy import func, update
+
+from . import db, mail, socketio
+from .models import User, OutboxEmail
 
 # --- CONFIGURAÇÃO BÁSICA DO LOGGING ---
 # Isso fará com que as mensagens de log apareçam no seu console
 logging.basicConfig(level=logging.INFO)
 
 
-def send_async_email(app, msg):
-    """ Função que será executada em uma thread separada para enviar o e-mail. """
-    with app.app_context():
+# Tipo do e-mail -> (assunto, template sem extensão, método do usuário que gera o token)
+EMAIL_KINDS = {
+    'confirmation': ('Confirme sua Conta - Plataforma EAD', 'auth/email/confirm_email',
+                     'get_confirmation_token'),
+    'password_reset': ('Redefinição de Senha - Plataforma EAD', 'auth/email/reset_password',
+                       'get_reset_password_token'),
+}
+
+
+class EmailQueueFull(Exception):
+    """A fila de saída chegou a EMAIL_OUTBOX_MAX_PENDING e-mails pendentes; o pedido não foi gravado."""
+
+    def __init__(self):
+        super().__init__('Não foi possível enviar o e-mail agora: a fila de envio está cheia. '
+                         'Tente novamente em alguns minutos.')
+
+
+class EmailOutbox:
+    """
+    Fila de saída de e-mails persistida na tabela `email_outbox`.
+
+    A requisição só grava uma linha (sem renderizar templates nem abrir conexão
+    SMTP). Um pool fixo de workers em segundo plano pega lotes de e-mails
+    vencidos e envia cada lote por uma única conexão SMTP (mail.connect()).
+    Como a fila é a própria tabela, nada se perde se o processo reiniciar, e
+    picos de pedidos apenas aumentam a fila, sem bloquear as requisições.
+
+    Falhas são reagendadas com espera exponencial até EMAIL_MAX_ATTEMPTS.
+    Pedidos repetidos do mesmo tipo para o mesmo destinatário dentro de
+    EMAIL_DEDUP_SECONDS são descartados, e cada destinatário recebe no máximo
+    EMAIL_RATE_LIMIT e-mails por hora. Com EMAIL_OUTBOX_MAX_PENDING e-mails
+    aguardando envio, novos pedidos são recusados (EmailQueueFull), para que
+    uma falha longa do SMTP não faça a tabela crescer sem limite.
+
+    Cada worker devolve periodicamente à fila os e-mails presos em 'sending'
+    há mais de EMAIL_STALE_SENDING_SECONDS (recover_stale), a cada
+    EMAIL_RECOVER_INTERVAL segundos.
+    """
+
+    def __init__(self):
+        self._app = None
+
+    def _config(self, key, default):
+        return current_app.config.get(key, default)
+
+    # --- ENFILEIRAMENTO ---
+
+    def enqueue(self, kind, user):
+        """
+        Grava o e-mail na fila. Retorna o OutboxEmail ou None se foi descartado
+        (duplicado/limite do destinatário). Levanta EmailQueueFull se a fila está cheia.
+        """
+        now = datetime.utcnow()
+        recent = OutboxEmail.query.filter(
+            OutboxEmail.recipient == user.email,
+            OutboxEmail.created_at > now - timedelta(hours=1)
+        )
+
+        dedup_since = now - timedelta(seconds=self._config('EMAIL_DEDUP_SECONDS', 600))
+        duplicate = recent.filter(
+            OutboxEmail.kind == kind,
+            OutboxEmail.status != 'failed',
+            OutboxEmail.created_at > dedup_since
+        ).first()
+        if duplicate:
+            logging.info(f"E-mail '{kind}' para {user.email} já está na fila ou foi enviado há pouco; ignorado.")
+            return None
+
+        if recent.count() >= self._config('EMAIL_RATE_LIMIT', 5):
+            logging.warning(f"Limite de e-mails por hora atingido para {user.email}; '{kind}' ignorado.")
+            return None
+
+        if self.pending_count() >= self._config('EMAIL_OUTBOX_MAX_PENDING', 1000):
+            logging.error(f"Fila de e-mails cheia; '{kind}' para {user.email} recusado.")
+            raise EmailQueueFull()
+
+        email = OutboxEmail(kind=kind, recipient=user.email, user_id=user.id, base_url=request.host_url)
+        db.session.add(email)
+        db.session.commit()
+        logging.info(f"E-mail '{kind}' para {user.email} adicionado à fila (id={email.id}).")
+        self._ensure_started()
+        return email
+
+    # --- ENVIO ---
+
+    def _claim(self, limit):
+        """Reserva até `limit` e-mails vencidos para este worker. Outro worker nunca pega os mesmos."""
+        now = datetime.utcnow()
+        candidates = db.session.scalars(
+            db.select(OutboxEmail.id).where(
+                OutboxEmail.status == 'pending', OutboxEmail.next_attempt_at <= now
+            ).order_by(OutboxEmail.next_attempt_at, OutboxEmail.id).limit(limit)
+        ).all()
+
+        claimed = []
+        for email_id in candidates:
+            result = db.session.execute(
+                update(OutboxEmail).where(OutboxEmail.id == email_id, OutboxEmail.status == 'pending')
+                .values(status='sending', attempts=OutboxEmail.attempts + 1, next_attempt_at=now)
+            )
+            if result.rowcount == 1:
+                claimed.append(email_id)
+        db.session.commit()
+        if not claimed:
+            return []
+        return OutboxEmail.query.filter(OutboxEmail.id.in_(claimed)).order_by(OutboxEmail.id).all()
+
+    def _render(self, email):
+        subject, template, token_method = EMAIL_KINDS[email.kind]
+        user = db.session.get(User, email.user_id)
+        token = getattr(user, token_method)()
+        # Os templates usam url_for(..., _external=True): renderiza com o endereço da requisição original
+        with current_app.test_request_context(base_url=email.base_url):
+            msg = Message(subject, sender=current_app.config['MAIL_DEFAULT_SENDER'], recipients=[email.recipient])
+            msg.body = render_template(f'{template}.txt', user=user, token=token)
+            msg.html = render_template(f'{template}.html', user=user, token=token)
+        return msg
+
+    def _mark_failed_attempt(self, email, error):
+        max_attempts = self._config('EMAIL_MAX_ATTEMPTS', 5)
+        email.last_error = str(error)[:255]
+        if email.attempts >= max_attempts:
+            email.status = 'failed'
+            logging.error(f"E-mail {email.id} para {email.recipient} falhou {email.attempts} vezes; desistindo: {error}")
+        else:
+            delay = self._config('EMAIL_RETRY_BASE_SECONDS', 30) * 2 ** (email.attempts - 1)
+            email.status = 'pending'
+            email.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+            logging.warning(f"Falha ao enviar e-mail {email.id} para {email.recipient}; nova tentativa em {delay}s: {error}")
+
+    def process_due(self, limit=None):
+        """Envia um lote de e-mails vencidos por uma única conexão SMTP. Retorna (enviados, com falha)."""
+        batch = self._claim(limit or self._config('EMAIL_BATCH_SIZE', 20))
+        if not batch:
+            return 0, 0
+
+        sent = failed = 0
         try:
-            # --- LOG ADICIONADO ---
-            logging.info(f"Tentando enviar e-mail para: {msg.recipients}")
-            mail.send(msg)
-            # --- LOG ADICIONADO ---
-            logging.info(f"E-mail para {msg.recipients} enviado com sucesso!")
+            with mail.connect() as conn:
+                for email in batch:
+                    try:
+                        conn.send(self._render(email))
+                    except smtplib.SMTPServerDisconnected:
+                        raise
+                    except Exception as e:
+                        self._mark_failed_attempt(email, e)
+                        failed += 1
+                    else:
+                        email.status = 'sent'
+                        email.sent_at = datetime.utcnow()
+                        email.last_error = None
+                        sent += 1
+                    db.session.commit()
         except Exception as e:
-            # --- LOG DE ERRO ADICIONADO ---
-            # Se algo der errado, isso irá imprimir a exceção no console
-            logging.error(f"Falha ao enviar e-mail para {msg.recipients}: {e}")
+            # Conexão indisponível ou perdida: os e-mails ainda não enviados voltam para a fila
+            for email in batch:
+                if email.status == 'sending':
+                    self._mark_failed_attempt(email, e)
+                    failed += 1
+            db.session.commit()
 
+        if sent:
+            logging.info(f"{sent} e-mail(s) enviados em uma conexão SMTP.")
+        return sent, failed
 
-def send_email_wrapper(subject, sender, recipients, text_body, html_body):
-    """ Função wrapper para preparar e disparar a thread de e-mail. """
-    msg = Message(subject, sender=sender, recipients=recipients)
-    msg.body = text_body
-    msg.html = html_body
+    def recover_stale(self):
+        """
+        Devolve à fila e-mails que ficaram 'sending' por mais de EMAIL_STALE_SENDING_SECONDS
+        (processo interrompido durante o envio). Ao ser reservado, o e-mail tem
+        next_attempt_at ajustado para o instante da reserva.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=self._config('EMAIL_STALE_SENDING_SECONDS', 600))
+        result = db.session.execute(
+            update(OutboxEmail).where(OutboxEmail.status == 'sending', OutboxEmail.next_attempt_at < cutoff)
+            .values(status='pending')
+        )
+        db.session.commit()
+        return result.rowcount
 
-    # Obtém a app atual para passar para a thread
-    app = current_app._get_current_object()
+    def pending_count(self):
+        return db.session.scalar(
+            db.select(func.count()).select_from(OutboxEmail).where(OutboxEmail.status.in_(('pending', 'sending')))
+        )
 
-    # --- LOG ADICIONADO ---
-    logging.info(f"Disparando thread de envio de e-mail para: {recipients}")
-    # Cria e inicia a thread
-    Thread(target=send_async_email, args=(app, msg)).start()
+    # --- WORKERS ---
 
+    def start(self, app):
+        """Inicia o pool de workers (EMAIL_WORKERS) para a aplicação, uma única vez por processo."""
+        if self._app is not None:
+            return
+        self._app = app
+        with app.app_context():
+            self.recover_stale()
+        workers = app.config.get('EMAIL_WORKERS', 2)
+        if not workers:
+            # Sem workers (ex.: testes), os e-mails só saem por process_due / flask send-emails
+            return
+        for _ in range(workers):
+            socketio.start_background_task(self._run)
+        atexit.register(self._drain_at_exit)
+
+    def _ensure_started(self):
+        self.start(current_app._get_current_object())
+
+    def _run(self):
+        recover_interval = self._app.config.get('EMAIL_RECOVER_INTERVAL', 60)
+        recovered_at = time.monotonic()
+        while True:
+            with self._app.app_context():
+                try:
+                    if time.monotonic() - recovered_at >= recover_interval:
+                        recovered_at = time.monotonic()
+                        self.recover_stale()
+                    sent, failed = self.process_due()
+                except Exception as e:
+                    db.session.rollback()
+                    logging.error(f"Erro no worker de e-mails: {e}")
+                    sent = failed = 0
+            if not sent and not failed:
+                socketio.sleep(self._app.config.get('EMAIL_POLL_INTERVAL', 3))
+
+    def _drain_at_exit(self):
+        with self._app.app_context():
+            self.process_due()
 
-def send_password_reset_email(user):
-    """ Envia o e-mail de redefinição de senha de forma assíncrona. """
-    token = user.get_reset_password_token()
-    app = current_app._get_current_object()  # Precisamos da app para renderizar o template
 
-    # --- LOG ADICIONADO ---
+# Instância única usada pela aplicação
+email_outbox = EmailOutbox()
+
+
+def send_password_reset_email(user):
+    """ Coloca na fila o e-mail de redefinição de senha. Levanta EmailQueueFull se a fila está cheia. """
     logging.info(f"Preparando e-mail de redefinição de senha para o usuário: {user.email}")
-    send_email_wrapper(
-        subject='Redefinição de Senha - Plataforma EAD',
-        sender=app.config['MAIL_DEFAULT_SENDER'],
-        recipients=[user.email],
-        text_body=render_template('auth/email/reset_password.txt', user=user, token=token),
-        html_body=render_template('auth/email/reset_password.html', user=user, token=token)
-    )
+    return email_outbox.enqueue('password_reset', user)
 
 
 def send_confirmation_email(user):
-    """ Envia o e-mail de confirmação de conta de forma assíncrona. """
-    token = user.get_confirmation_token()
-    app = current_app._get_current_object()  # Precisamos da app para renderizar o template
-
-    # --- LOG ADICIONADO ---
+    """ Coloca na fila o e-mail de confirmação de conta. Levanta EmailQueueFull se a fila está cheia. """
     logging.info(f"Preparando e-mail de confirmação para o usuário: {user.email}")
-    send_email_wrapper(
-        subject='Confirme sua Conta - Plataforma EAD',
-        sender=app.config['MAIL_DEFAULT_SENDER'],
-        recipients=[user.email],
-        text_body=render_template('auth/email/confirm_email.txt', user=user, token=token),
-        html_body=render_template('auth/email/confirm_email.html', user=user, token=token)
-    )
+    return email_outbox.enqueue('confirmation', user)
@@ -1,17 +1,21 @@
 # app/events.py
 
-from flask import request
+import heapq
+from datetime import datetime
+from itertools import islice
+
+from flask import request, current_app
 from flask_socketio import emit, join_room
 from flask_login import current_user
-from sqlalchemy import or_
+from sqlalchemy import select, tuple_
 
 from . import socketio, db
 from .models import User, PrivateMessage
+from .context import record_unread_message, clear_unread_from
+from .presence import last_seen_tracker, presence_registry, get_user_room_name
+from .presence_updates import presence_broadcaster
 
 
-# Dicionário para rastrear usuários online e seus session IDs
-online_users = {}
-
 def get_private_room_name(user1_id, user2_id):
     """Gera um nome de sala consistente para dois usuários, garantindo a ordem dos IDs."""
     return f"sala_{min(user1_id, user2_id)}_{max(user1_id, user2_id)}"
@@ -19,32 +23,100 @@ def get_private_room_name(user1_id, user2_id):
 
 @socketio.on('connect')
 def handle_connect():
-    """Lida com a conexão de um novo cliente."""
+    """Lida com a conexão de um novo cliente: envia a ele os amigos online e agenda o aviso aos amigos."""
     if current_user.is_authenticated:
-        online_users[current_user.username] = request.sid
-        emit('update_online_users', list(online_users.keys()), broadcast=True)
+        join_room(get_user_room_name(current_user.id))
+        if presence_registry.add(current_user.id, current_user.username, request.sid):
+            presence_broadcaster.user_changed(current_user.id, current_user.username, True)
+        last_seen_tracker.touch(current_user.id)
+        emit('presence_snapshot', presence_broadcaster.snapshot(current_user.id))
         print(f'Cliente conectado: {current_user.username} com sid: {request.sid}')
 
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    """Lida com a desconexão de um cliente de forma robusta."""
-    disconnected_user = None
-    for username, sid in list(online_users.items()):
-        if sid == request.sid:
-            disconnected_user = username
-            break
+    """Lida com a desconexão de um cliente; o usuário só sai da lista ao fechar a última conexão."""
+    removed = presence_registry.remove(request.sid)
+    if removed is None:
+        return
+
+    user_id, username, went_offline = removed
+    last_seen_tracker.touch(user_id)
+    if went_offline:
+        presence_broadcaster.user_changed(user_id, username, False)
+        print(f'Cliente desconectado: {username}')
+
 
-    if disconnected_user:
-        del online_users[disconnected_user]
-        emit('user_typing_stop', {'username': disconnected_user}, broadcast=True)
-        emit('update_online_users', list(online_users.keys()), broadcast=True)
-        print(f'Cliente desconectado: {disconnected_user}')
+def _message_payload(message_id, sender, text, timestamp):
+    return {
+        'id': message_id,
+        'username': sender.username,
+        'profile_picture': sender.profile_picture,
+        'text': text,
+        'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+def _encode_history_cursor(message_id, timestamp):
+    return {'timestamp': timestamp.isoformat(), 'id': message_id}
+
+
+def _decode_history_cursor(cursor):
+    """Retorna (timestamp, id) do cursor recebido do cliente, ou None se for inválido."""
+    try:
+        return datetime.fromisoformat(cursor['timestamp']), int(cursor['id'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def history_queries(user_id, other_id, before=None, limit=30):
+    """
+    Uma consulta para cada sentido da conversa, das mensagens mais recentes
+    para trás. Cada uma percorre o índice (sender_id, recipient_id,
+    timestamp, id) já na ordem pedida, a partir da posição `before`, e para
+    em `limit` linhas: nenhuma página lê ou ordena a conversa inteira.
+    """
+    queries = []
+    for sender_id, recipient_id in ((user_id, other_id), (other_id, user_id)):
+        query = select(
+            PrivateMessage.id, PrivateMessage.sender_id, PrivateMessage.content, PrivateMessage.timestamp
+        ).where(PrivateMessage.sender_id == sender_id, PrivateMessage.recipient_id == recipient_id)
+        if before:
+            query = query.where(tuple_(PrivateMessage.timestamp, PrivateMessage.id) < tuple_(*before))
+        queries.append(query.order_by(PrivateMessage.timestamp.desc(), PrivateMessage.id.desc()).limit(limit))
+    return queries
+
+
+def history_page(user, other, before=None):
+    """
+    Uma página do histórico entre dois usuários, das mais recentes para trás.
+    `before` é a posição (timestamp, id) da mensagem mais antiga já exibida.
+    Retorna (mensagens em ordem cronológica, cursor da página anterior ou None).
+    Os dois sentidos da conversa são lidos separadamente e intercalados aqui.
+    Os remetentes são os dois participantes, já carregados: nenhuma consulta por mensagem.
+    """
+    per_page = current_app.config['CHAT_HISTORY_PAGE_SIZE']
+    directions = [db.session.execute(query).all()
+                  for query in history_queries(user.id, other.id, before, per_page + 1)]
+    rows = list(islice(heapq.merge(*directions, key=lambda row: (row.timestamp, row.id), reverse=True),
+                       per_page + 1))
+
+    cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        cursor = _encode_history_cursor(rows[-1].id, rows[-1].timestamp)
+
+    senders = {user.id: user, other.id: other}
+    messages = [
+        _message_payload(row.id, senders[row.sender_id], row.content, row.timestamp)
+        for row in reversed(rows)
+    ]
+    return messages, cursor
 
 
 @socketio.on('join_private_chat')
 def join_private_chat(data):
-    """Coloca o usuário em uma sala privada para conversar com outro."""
+    """Coloca o usuário em uma sala privada e envia a página mais recente do histórico."""
     recipient_username = data['recipient_username']
     recipient = User.query.filter_by(username=recipient_username).first()
 
@@ -54,24 +126,27 @@ def join_private_chat(data):
     room = get_private_room_name(current_user.id, recipient.id)
     join_room(room)
 
-    history = PrivateMessage.query.filter(
-        or_(
-            (PrivateMessage.sender_id == current_user.id) & (PrivateMessage.recipient_id == recipient.id),
-            (PrivateMessage.sender_id == recipient.id) & (PrivateMessage.recipient_id == current_user.id)
-        )
-    ).order_by(PrivateMessage.timestamp.asc()).all()
-
-    message_history = [
-        {
-            'username': msg.sender.username,
-            'profile_picture': msg.sender.profile_picture,
-            'text': msg.content,
-            'timestamp': msg.timestamp.strftime('%Y-%m-%d %H:%M:%S')
-        }
-        for msg in history
-    ]
+    message_history, cursor = history_page(current_user, recipient)
+    emit('private_message_history', {'history': message_history, 'room': room, 'cursor': cursor})
 
-    emit('private_message_history', {'history': message_history, 'room': room})
+
+@socketio.on('load_older_messages')
+def load_older_messages(data):
+    """Envia a página do histórico anterior ao cursor recebido ("carregar anteriores")."""
+    if not current_user.is_authenticated:
+        return
+
+    before = _decode_history_cursor(data.get('cursor'))
+    recipient = User.query.filter_by(username=data.get('recipient_username')).first()
+    if not recipient or before is None:
+        return
+
+    message_history, cursor = history_page(current_user, recipient, before)
+    emit('older_private_messages', {
+        'history': message_history,
+        'room': get_private_room_name(current_user.id, recipient.id),
+        'cursor': cursor
+    })
 
 
 @socketio.on('private_message')
@@ -93,13 +168,9 @@ def handle_private_message(data):
     )
     db.session.add(new_message)
     db.session.commit()
+    record_unread_message(recipient.id, current_user.username)
 
-    message_payload = {
-        'username': current_user.username,
-        'profile_picture': current_user.profile_picture,
-        'text': message_text,
-        'timestamp': new_message.timestamp.strftime('%Y-%m-%d %H:%M:%S')
-    }
+    message_payload = _message_payload(new_message.id, current_user, message_text, new_message.timestamp)
 
     room = get_private_room_name(current_user.id, recipient.id)
     join_room(room)
@@ -108,11 +179,10 @@ def handle_private_message(data):
     emit('new_private_message', message_payload, to=room)
 
     # --- NOVA LÓGICA DE NOTIFICAÇÃO ---
-    # Se o destinatário estiver online, envia uma notificação diretamente para ele
-    if recipient.username in online_users:
-        recipient_sid = online_users[recipient.username]
-        # Emite um evento separado de notificação
-        emit('unread_message_notification', {'sender': current_user.username}, to=recipient_sid)
+    # Se o destinatário estiver online, notifica todas as conexões dele (em qualquer worker)
+    if presence_registry.is_online(recipient.id):
+        emit('unread_message_notification', {'sender': current_user.username},
+             to=get_user_room_name(recipient.id))
 
 
 # --- NOVO EVENTO PARA MARCAR MENSAGENS COMO LIDAS ---
@@ -126,18 +196,16 @@ def mark_messages_as_read(data):
     sender = User.query.filter_by(username=sender_username).first()
 
     if sender:
-        # Encontra todas as mensagens não lidas que o usuário atual recebeu do remetente
-        messages_to_update = PrivateMessage.query.filter(
+        # Um único UPDATE para todas as mensagens não lidas recebidas do remetente
+        updated = PrivateMessage.query.filter(
             PrivateMessage.recipient_id == current_user.id,
             PrivateMessage.sender_id == sender.id,
             PrivateMessage.read == False
-        ).all()
-        
-        for msg in messages_to_update:
-            msg.read = True
-            
+        ).update({PrivateMessage.read: True}, synchronize_session=False)
+
         db.session.commit()
-        print(f'{len(messages_to_update)} mensagens de {sender_username} marcadas como lidas para {current_user.username}')
+        clear_unread_from(current_user.id, sender.username)
+        print(f'{updated} mensagens de {sender_username} marcadas como lidas para {current_user.username}')
 
 
 @socketio.on('typing_start')
@@ -0,0 +1,210 @@
+# app/forum.py
+
+import atexit
+import logging
+import math
+import threading
+from collections import namedtuple, Counter
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import select, func, update, bindparam, or_, and_
+from sqlalchemy.orm import selectinload
+
+from . import db, socketio
+from .catalog import encode_cursor, decode_cursor
+from .loading import with_body
+from .models import User, ForumCategory, ForumTopic, ForumPost
+
+# Uma página de respostas de um tópico
+PostPage = namedtuple('PostPage', ['posts', 'page', 'pages'])
+
+# Colunas do autor exibidas nas listagens do fórum
+AUTHOR_COLUMNS = (User.id, User.username, User.profile_picture)
+
+
+# --- ESCRITA ---
+
+def record_new_topic(topic, user_id):
+    """
+    Prepara o resumo do tópico novo (ainda não gravado) e atualiza o da
+    categoria (tópicos e última atividade), na transação de quem chamou.
+    """
+    now = datetime.utcnow()
+    topic.created_at = topic.last_post_at = now
+    topic.last_post_user_id = user_id
+    ForumCategory.bump_counters(topic.category_id, topic_count=1,
+                                assign={'last_post_at': now, 'last_post_user_id': user_id})
+
+
+def record_reply(topic, post, user_id):
+    """Atualiza o resumo do tópico e da categoria com a nova resposta, na transação de quem chamou."""
+    post.created_at = now = datetime.utcnow()
+    last_post = {'last_post_at': now, 'last_post_user_id': user_id}
+    ForumTopic.bump_counters(topic, post_count=1, assign=last_post)
+    ForumCategory.bump_counters(topic.category_id, post_count=1, assign=last_post)
+
+
+# --- LEITURA ---
+
+def categories_overview():
+    """Categorias com o resumo já calculado e o autor da última atividade, sem carregar tópicos."""
+    return ForumCategory.query.options(
+        selectinload(ForumCategory.last_post_user).load_only(*AUTHOR_COLUMNS)
+    ).order_by(ForumCategory.name.asc()).all()
+
+
+def with_topic_authors():
+    """Opções que carregam, em lote, o autor e o autor da última resposta dos tópicos listados."""
+    return [selectinload(ForumTopic.user).load_only(*AUTHOR_COLUMNS),
+            selectinload(ForumTopic.last_post_user).load_only(*AUTHOR_COLUMNS)]
+
+
+def category_topics_page(category_id, cursor=None, per_page=20):
+    """
+    Tópicos da categoria, dos mais recentes para os mais antigos, filtrados
+    pela posição (created_at, id) do último tópico já exibido, sem OFFSET.
+    Retorna (tópicos, cursor da próxima página ou None).
+    """
+    query = ForumTopic.query.options(*with_topic_authors()).filter(ForumTopic.category_id == category_id)
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        created_at, topic_id = position
+        query = query.filter(or_(
+            ForumTopic.created_at < created_at,
+            and_(ForumTopic.created_at == created_at, ForumTopic.id < topic_id)
+        ))
+
+    topics = query.order_by(ForumTopic.created_at.desc(), ForumTopic.id.desc()).limit(per_page + 1).all()
+    if len(topics) > per_page:
+        topics = topics[:per_page]
+        return topics, encode_cursor(topics[-1])
+    return topics, None
+
+
+def topic_posts_page(topic, page=1, per_page=20):
+    """
+    Página `page` das respostas do tópico, em ordem de publicação
+    (created_at, id). O total de páginas vem do contador `post_count` do
+    tópico, sem COUNT, e os autores da página são carregados de uma vez,
+    em uma única consulta, só com as colunas exibidas.
+    Páginas fora do intervalo são ajustadas para a primeira ou a última.
+    """
+    pages = max(math.ceil(topic.post_count / per_page), 1)
+    page = min(max(page, 1), pages)
+
+    posts = ForumPost.query.options(
+        *with_body(ForumPost),
+        selectinload(ForumPost.user).load_only(*AUTHOR_COLUMNS)
+    ).filter(ForumPost.topic_id == topic.id) \
+        .order_by(ForumPost.created_at.asc(), ForumPost.id.asc()) \
+        .offset((page - 1) * per_page).limit(per_page).all()
+    return PostPage(posts, page, pages)
+
+
+def last_page(topic, per_page=20):
+    """Página em que está a resposta mais recente do tópico."""
+    return max(math.ceil(topic.post_count / per_page), 1)
+
+
+# --- VISUALIZAÇÕES ---
+
+class TopicViewCounter:
+    """
+    Soma em memória as visualizações de cada tópico e as grava em lote, a cada
+    intervalo, com UPDATEs atômicos (views = views + n) em um único
+    executemany. Ler um tópico deixa de ser uma escrita no banco, e tópicos
+    muito acessados não disputam o bloqueio da própria linha a cada visita.
+    As visualizações ainda em memória aparecem nas listagens após a gravação.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._app = None
+
+    def _ensure_started(self):
+        if self._app is not None:
+            return
+        self._app = current_app._get_current_object()
+        socketio.start_background_task(self._run)
+        atexit.register(self._flush_at_exit)
+
+    def hit(self, topic_id, n=1):
+        with self._lock:
+            self._pending[topic_id] += n
+        self._ensure_started()
+
+    def flush(self):
+        """Grava as visualizações pendentes. Retorna quantos tópicos foram atualizados."""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        if not pending:
+            return 0
+        topics = ForumTopic.__table__
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(
+                    update(topics).where(topics.c.id == bindparam('topic_id'))
+                    .values(views=func.coalesce(topics.c.views, 0) + bindparam('n')),
+                    [{'topic_id': topic_id, 'n': n} for topic_id, n in pending.items()]
+                )
+        except Exception as e:
+            # Devolve as visualizações ao buffer para a próxima tentativa
+            with self._lock:
+                self._pending.update(pending)
+            logging.error(f"Falha ao gravar visualizações de {len(pending)} tópicos: {e}")
+            return 0
+        return len(pending)
+
+    def _run(self):
+        while True:
+            socketio.sleep(self._app.config.get('FORUM_VIEWS_FLUSH_INTERVAL', 10))
+            with self._app.app_context():
+                self.flush()
+
+    def _flush_at_exit(self):
+        with self._app.app_context():
+            self.flush()
+
+
+# Instância única usada pela aplicação
+topic_view_counter = TopicViewCounter()
+
+
+# --- CONTADORES DENORMALIZADOS ---
+
+def _reconcile(model, expected):
+    drifted = model.query.filter(or_(*[column.is_distinct_from(value) for column, value in expected.items()]))
+    return drifted.update(expected, synchronize_session=False)
+
+
+def reconcile_forum_counters():
+    """
+    Recalcula o resumo de cada tópico (respostas e última atividade) e de cada
+    categoria (tópicos, respostas e última atividade) a partir das tabelas de
+    origem, corrigindo divergências. Retorna (tópicos divergentes, categorias divergentes).
+    """
+    def latest_post(column):
+        return select(column).where(ForumPost.topic_id == ForumTopic.id) \
+            .order_by(ForumPost.created_at.desc(), ForumPost.id.desc()).limit(1).scalar_subquery()
+
+    def latest_topic(column):
+        return select(column).where(ForumTopic.category_id == ForumCategory.id) \
+            .order_by(ForumTopic.last_post_at.desc(), ForumTopic.id.desc()).limit(1).scalar_subquery()
+
+    topics = _reconcile(ForumTopic, {
+        ForumTopic.post_count: select(func.count()).where(ForumPost.topic_id == ForumTopic.id).scalar_subquery(),
+        ForumTopic.last_post_at: func.coalesce(latest_post(ForumPost.created_at), ForumTopic.created_at),
+        ForumTopic.last_post_user_id: func.coalesce(latest_post(ForumPost.user_id), ForumTopic.user_id),
+    })
+    categories = _reconcile(ForumCategory, {
+        ForumCategory.topic_count: select(func.count()).where(
+            ForumTopic.category_id == ForumCategory.id).scalar_subquery(),
+        ForumCategory.post_count: select(func.coalesce(func.sum(ForumTopic.post_count), 0)).where(
+            ForumTopic.category_id == ForumCategory.id).scalar_subquery(),
+        ForumCategory.last_post_at: latest_topic(ForumTopic.last_post_at),
+        ForumCategory.last_post_user_id: latest_topic(ForumTopic.last_post_user_id),
+    })
+    db.session.commit()
+    return topics, categories
@@ -0,0 +1,84 @@
+# app/friends.py
+
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import select, literal
+
+from . import db
+from .cache import shared_versions
+from .models import User, Friendship
+
+# Vizinhança de um usuário no grafo de amizades (conjuntos de IDs)
+Adjacency = namedtuple('Adjacency', ['friends', 'sent', 'received'])
+
+
+class FriendGraph:
+    """
+    Grafo de amizades com a vizinhança de cada usuário em cache: amigos,
+    pedidos enviados e pedidos recebidos, carregados com uma única consulta
+    (UNION ALL dos dois lados da tabela). Consultas de pertinência e do status
+    entre dois usuários são feitas nos conjuntos, sem ir ao banco.
+    A vizinhança deve ser invalidada sempre que uma amizade muda (invalidate);
+    a versão fica em shared_versions, então a invalidação vale para todos os
+    workers.
+    """
+
+    def _key(self, user_id):
+        return f'friend_graph:{user_id}'
+
+    def _version_name(self, user_id):
+        return f'friends:{user_id}'
+
+    def _load(self, user_id):
+        sent = select(Friendship.addressee_id, Friendship.status, literal('out')).where(
+            Friendship.requester_id == user_id)
+        received = select(Friendship.requester_id, Friendship.status, literal('in')).where(
+            Friendship.addressee_id == user_id)
+
+        friends, pending_sent, pending_received = set(), set(), set()
+        for other_id, status, direction in db.session.execute(sent.union_all(received)):
+            if status == 'accepted':
+                friends.add(other_id)
+            elif direction == 'out':
+                pending_sent.add(other_id)
+            else:
+                pending_received.add(other_id)
+        return Adjacency(frozenset(friends), frozenset(pending_sent), frozenset(pending_received))
+
+    def adjacency(self, user_id):
+        timeout = current_app.config.get('CONTEXT_CACHE_TIMEOUT', 300)
+        return shared_versions.cached(self._key(user_id), self._version_name(user_id),
+                                      lambda: self._load(user_id), timeout)
+
+    def friend_ids(self, user_id):
+        """Conjunto com os IDs dos amigos (amizades aceitas) do usuário."""
+        return self.adjacency(user_id).friends
+
+    def are_friends(self, user_id, other_id):
+        return other_id in self.adjacency(user_id).friends
+
+    def status(self, user_id, other_id):
+        """Situação da amizade vista por `user_id`: friends, request_sent, request_received ou not_friends."""
+        adjacency = self.adjacency(user_id)
+        if other_id in adjacency.friends:
+            return 'friends'
+        if other_id in adjacency.sent:
+            return 'request_sent'
+        if other_id in adjacency.received:
+            return 'request_received'
+        return 'not_friends'
+
+    def friends(self, user_id):
+        """Carrega os amigos do usuário com uma única consulta, em ordem alfabética."""
+        friend_ids = self.friend_ids(user_id)
+        if not friend_ids:
+            return []
+        return User.query.filter(User.id.in_(friend_ids)).order_by(User.username.asc()).all()
+
+    def invalidate(self, *user_ids):
+        shared_versions.bump(*[self._version_name(user_id) for user_id in user_ids])
+
+
+# Instância única usada pela aplicação
+friend_graph = FriendGraph()
@@ -0,0 +1,149 @@
+# app/http_cache.py
+
+import hashlib
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, request, session, make_response
+from flask_login import current_user
+
+from .cache import cache, shared_versions
+from .context import get_unread_counts
+from .friends import friend_graph
+from .leaderboard import leaderboard
+from .presence import last_seen_tracker
+
+
+class ResponseCache:
+    """
+    Cache de respostas HTTP com GET condicional (ETag / Last-Modified -> 304).
+
+    Cada página declara de quais "escopos" de conteúdo depende (ex.: 'catalog',
+    'course:{course_id}', com os argumentos da view). Cada escopo tem uma
+    versão compartilhada entre os workers (shared_versions); trocar a versão
+    (bump) invalida, em todos eles, as páginas que dependem do escopo. O
+    painel de administração e as rotas de escrita fazem o bump dos escopos
+    que alteram.
+
+    Há duas políticas:
+
+    - `public`: a resposta inteira fica em cache e é compartilhada entre os
+      visitantes anônimos, servida sem executar a view (nem tocar no banco).
+      Usuários autenticados sempre recebem a página gerada na hora.
+    - `private`: páginas de usuários autenticados. A view só é executada quando
+      o ETag muda; ele combina as versões dos escopos com o que a página
+      mostra do próprio usuário (mensagens não lidas, amigos e quem está
+      online, ranking), tudo lido de memória. Qualquer escrita do usuário
+      (requisição que não seja GET) troca a versão do escopo 'user:{id}'.
+
+    Páginas com mensagens flash pendentes nunca são servidas do cache.
+    """
+
+    def _config(self, key, default):
+        return current_app.config.get(key, default)
+
+    # --- VERSÕES ---
+
+    def _version_name(self, scope):
+        return f'http:{scope}'
+
+    def versions(self, scopes):
+        """Versões atuais dos escopos, na mesma ordem."""
+        return shared_versions.get_many([self._version_name(scope) for scope in scopes])
+
+    def bump(self, *scopes):
+        """Invalida as páginas que dependem dos escopos."""
+        shared_versions.bump(*[self._version_name(scope) for scope in scopes])
+
+    def _versions(self, scopes, view_args):
+        return self.versions([scope.format(**view_args) for scope in scopes])
+
+    # --- RESPOSTAS ---
+
+    def _has_flashes(self):
+        return bool(session.get('_flashes'))
+
+    def _finish(self, response, etag, last_modified, cache_control):
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        response.headers['Cache-Control'] = cache_control
+        response.vary.add('Cookie')
+        return response.make_conditional(request)
+
+    def public(self, *scopes, timeout=None):
+        """
+        Página compartilhada entre visitantes anônimos (ex.: a página inicial).
+        O corpo fica em cache por RESPONSE_CACHE_PUBLIC_TIMEOUT segundos, ou
+        até um bump dos escopos, e o ETag é o hash do corpo.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if current_user.is_authenticated or self._has_flashes():
+                    return view(*args, **kwargs)
+
+                key = f'http_response:{_digest(request.path, self._versions(scopes, kwargs))}'
+                cached = cache.get(key)
+                if cached is None:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    body = response.get_data()
+                    cached = (body, response.mimetype, hashlib.sha1(body).hexdigest(),
+                              datetime.utcnow().replace(microsecond=0))
+                    cache.set(key, cached, timeout or self._config('RESPONSE_CACHE_PUBLIC_TIMEOUT', 60))
+
+                body, mimetype, etag, last_modified = cached
+                response = current_app.response_class(body, mimetype=mimetype)
+                return self._finish(response, etag, last_modified, 'public, no-cache')
+            return wrapper
+        return decorator
+
+    def private(self, *scopes):
+        """Página de usuário autenticado, revalidada a cada acesso pelo ETag."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not current_user.is_authenticated or self._has_flashes():
+                    return view(*args, **kwargs)
+
+                user_id = current_user.id
+                versions = self.versions([scope.format(**kwargs) for scope in scopes] + [f'user:{user_id}'])
+                etag = _digest(request.full_path, versions, _user_fingerprint(user_id))
+                if etag in request.if_none_match:
+                    # Nada mudou para este usuário: 304 sem executar a view
+                    response = current_app.response_class(status=304)
+                    response.set_etag(etag)
+                    response.headers['Cache-Control'] = 'private, no-cache'
+                    return response
+
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                return self._finish(response, etag, None, 'private, no-cache')
+            return wrapper
+        return decorator
+
+
+def _user_fingerprint(user_id):
+    """
+    O que as páginas mostram do usuário fora do conteúdo principal (barra de
+    navegação e barra lateral), lido dos caches em memória.
+    """
+    friend_ids = sorted(friend_graph.friend_ids(user_id))
+    return (
+        current_user.username, current_user.profile_picture, current_user.is_admin,
+        sorted(get_unread_counts(user_id).items()),
+        friend_ids, response_cache.versions([f'user:{friend_id}' for friend_id in friend_ids]),
+        sorted(last_seen_tracker.online_ids().intersection(friend_ids)),
+        leaderboard.top(10),
+    )
+
+
+def _digest(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+# Instância única usada pela aplicação
+response_cache = ResponseCache()
@@ -0,0 +1,205 @@
+# app/leaderboard.py
+
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import namedtuple
+
+from flask import current_app
+
+from . import db
+from .models import User, Enrollment
+
+# Representação leve de um usuário no ranking, segura para ficar em memória
+RankingEntry = namedtuple('RankingEntry', ['id', 'username', 'score'])
+
+
+class SortedScores:
+    """
+    Pontuações mantidas em ordem decrescente numa lista ordenada de chaves
+    (-pontuação, id). Consultas de posição usam busca binária (O(log n)).
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._scores = {}
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """Monta o ranking de uma vez a partir de pares (id, pontuação), com uma única ordenação."""
+        scores = cls()
+        scores._scores = {member_id: score or 0 for member_id, score in pairs}
+        scores._keys = sorted((-score, member_id) for member_id, score in scores._scores.items())
+        return scores
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, member_id):
+        return member_id in self._scores
+
+    def score(self, member_id):
+        return self._scores.get(member_id)
+
+    def update(self, member_id, score):
+        old_score = self._scores.get(member_id)
+        if old_score == score:
+            return
+        if old_score is not None:
+            del self._keys[bisect_left(self._keys, (-old_score, member_id))]
+        insort(self._keys, (-score, member_id))
+        self._scores[member_id] = score
+
+    def remove(self, member_id):
+        old_score = self._scores.pop(member_id, None)
+        if old_score is not None:
+            del self._keys[bisect_left(self._keys, (-old_score, member_id))]
+
+    def rank(self, member_id):
+        """Posição 1-based do membro; empates dividem a mesma posição."""
+        score = self._scores.get(member_id)
+        if score is None:
+            return None
+        return bisect_left(self._keys, (-score,)) + 1
+
+    def top(self, n):
+        return [(member_id, -neg_score) for neg_score, member_id in self._keys[:n]]
+
+
+class Leaderboard:
+    """
+    Ranking materializado em memória: global (User.score), por curso
+    (Enrollment.score) e por círculo de amigos. Carregado do banco na primeira
+    consulta e atualizado incrementalmente quando pontos são concedidos.
+    O ranking global é recarregado periodicamente para absorver alterações
+    feitas por outros processos; só uma requisição por vez faz a recarga,
+    e as demais continuam usando o ranking anterior enquanto isso.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._global = None
+        self._usernames = {}
+        self._courses = {}
+        self._loaded_at = 0
+
+    def _refresh_interval(self):
+        return current_app.config.get('LEADERBOARD_REFRESH_SECONDS', 300)
+
+    def _is_stale(self):
+        return self._global is None or time.monotonic() - self._loaded_at >= self._refresh_interval()
+
+    def _ensure_loaded(self):
+        if not self._is_stale():
+            return
+        # Sem ranking carregado é preciso esperar a carga; com um ranking antigo,
+        # quem não conseguir o lock segue com ele
+        if not self._load_lock.acquire(blocking=self._global is None):
+            return
+        try:
+            if self._is_stale():
+                self._reload()
+        finally:
+            self._load_lock.release()
+
+    def _reload(self):
+        rows = db.session.query(User.id, User.username, User.score).all()
+        scores = SortedScores.from_pairs((user_id, score) for user_id, _, score in rows)
+        usernames = {user_id: username for user_id, username, _ in rows}
+        with self._lock:
+            self._global = scores
+            self._usernames = usernames
+            self._courses = {}
+            self._loaded_at = time.monotonic()
+
+    def _course_scores(self, course_id):
+        self._ensure_loaded()
+        scores = self._courses.get(course_id)
+        if scores is None:
+            rows = db.session.query(Enrollment.user_id, Enrollment.score) \
+                .filter(Enrollment.course_id == course_id).all()
+            scores = SortedScores.from_pairs(rows)
+            with self._lock:
+                self._courses[course_id] = scores
+        return scores
+
+    def _entries(self, pairs):
+        return [RankingEntry(user_id, self._usernames.get(user_id), score) for user_id, score in pairs]
+
+    # --- CONSULTAS ---
+
+    def top(self, n=10):
+        self._ensure_loaded()
+        with self._lock:
+            return self._entries(self._global.top(n))
+
+    def rank_of(self, user_id):
+        self._ensure_loaded()
+        with self._lock:
+            return self._global.rank(user_id)
+
+    def course_top(self, course_id, n=10):
+        scores = self._course_scores(course_id)
+        with self._lock:
+            return self._entries(scores.top(n))
+
+    def course_rank_of(self, course_id, user_id):
+        scores = self._course_scores(course_id)
+        with self._lock:
+            return scores.rank(user_id)
+
+    def friends_top(self, user_id, friend_ids, n=10):
+        """Ranking do usuário e seus amigos, a partir das pontuações globais em memória."""
+        self._ensure_loaded()
+        with self._lock:
+            members = [(member_id, self._global.score(member_id))
+                       for member_id in {user_id, *friend_ids} if member_id in self._global]
+        members.sort(key=lambda pair: (-pair[1], pair[0]))
+        return self._entries(members[:n])
+
+    def friends_rank_of(self, user_id, friend_ids):
+        self._ensure_loaded()
+        with self._lock:
+            my_score = self._global.score(user_id)
+            if my_score is None:
+                return None
+            return 1 + sum(1 for friend_id in friend_ids if (self._global.score(friend_id) or 0) > my_score)
+
+    # --- ATUALIZAÇÕES INCREMENTAIS ---
+    # Chamadas após o commit; se o ranking ainda não foi carregado não há nada a fazer.
+
+    def record_score(self, user_id, username, score):
+        with self._lock:
+            if self._global is None:
+                return
+            self._global.update(user_id, score or 0)
+            self._usernames[user_id] = username
+
+    def record_course_score(self, course_id, user_id, score):
+        with self._lock:
+            scores = self._courses.get(course_id)
+            if scores is not None:
+                scores.update(user_id, score or 0)
+
+    def add_course_member(self, course_id, user_id):
+        """Inclui um recém-inscrito com pontuação zero, sem sobrescrever quem já participa."""
+        with self._lock:
+            scores = self._courses.get(course_id)
+            if scores is not None and user_id not in scores:
+                scores.update(user_id, 0)
+
+    def remove_course_member(self, course_id, user_id):
+        with self._lock:
+            scores = self._courses.get(course_id)
+            if scores is not None:
+                scores.remove(user_id)
+
+    def reset(self):
+        with self._lock:
+            self._global = None
+            self._courses = {}
+
+
+# Instância única usada pela aplicação
+leaderboard = Leaderboard()
@@ -0,0 +1,78 @@
+# app/loading.py
+
+from contextlib import contextmanager
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import undefer, with_expression
+
+from .models import User, Course, Lesson, PrivateMessage, ForumTopic, ForumPost
+
+# Colunas de texto sem limite de cada modelo. No mapeamento elas são adiadas
+# (grupo 'body'): listagens nunca as buscam e as páginas de detalhe pedem
+# explicitamente com with_body().
+BODY_COLUMNS = {
+    User: ('bio',),
+    Course: ('description', 'description_html'),
+    Lesson: ('content', 'content_html'),
+    PrivateMessage: ('content',),
+    ForumTopic: ('content', 'content_html'),
+    ForumPost: ('content', 'content_html'),
+}
+
+# Modelo -> (atributo de resumo, coluna de origem)
+SUMMARY_COLUMNS = {
+    Course: ('summary', 'description'),
+}
+
+SUMMARY_LENGTH = 200
+
+
+# --- PERFIS DE CARREGAMENTO ---
+
+def with_body(*models):
+    """Opções de consulta para páginas de detalhe: o corpo vem na mesma consulta da linha."""
+    return [undefer(getattr(model, attr)) for model in models for attr in BODY_COLUMNS[model]]
+
+
+def with_summary(model, length=SUMMARY_LENGTH):
+    """Opção de consulta para listagens: preenche o resumo com os primeiros caracteres do corpo."""
+    summary_attr, body_attr = SUMMARY_COLUMNS[model]
+    return with_expression(getattr(model, summary_attr), func.substr(getattr(model, body_attr), 1, length))
+
+
+# --- VERIFICAÇÃO (TESTES) ---
+
+@contextmanager
+def assert_bodies_not_loaded(*models, allow=()):
+    """
+    Falha com AssertionError se alguma instância dos modelos tiver o corpo
+    carregado dentro do bloco, seja na consulta original ou por carga tardia.
+    Sem argumentos, vigia todos os modelos de BODY_COLUMNS. `allow` lista
+    pares (modelo, id) que podem ter o corpo carregado, como o item principal
+    de uma página de detalhe. Uso nos testes (ver tests/test_loading.py):
+
+        with app.app_context(), assert_bodies_not_loaded():
+            client.get('/cursos')
+    """
+    models = models or tuple(BODY_COLUMNS)
+    loaded = []
+
+    def _check(target, context, attrs=None):
+        if (type(target), target.id) in allow:
+            return
+        unloaded = inspect(target).unloaded
+        for attr in BODY_COLUMNS[type(target)]:
+            if attr not in unloaded and (attrs is None or attr in attrs):
+                loaded.append(f'{type(target).__name__}.{attr} (id={target.id})')
+
+    for model in models:
+        event.listen(model, 'load', _check)
+        event.listen(model, 'refresh', _check)
+    try:
+        yield loaded
+    finally:
+        for model in models:
+            event.remove(model, 'load', _check)
+            event.remove(model, 'refresh', _check)
+
+    assert not loaded, f'Colunas de corpo carregadas em uma listagem: {", ".join(loaded)}'
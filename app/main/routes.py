@@ -1,24 +1,37 @@
 # app/main/routes.py
 
-import markdown
-from datetime import datetime, timedelta
 from . import main
 from flask_login import login_required, current_user
-from flask import render_template, flash, redirect, url_for, request, jsonify
-# lesson_completions foi importado para a nova query
-from app.models import User, Course, Lesson, Question, Answer, Quiz, Friendship, CourseRating, Enrollment, \
-    PrivateMessage, ContentSuggestion, ForumCategory, ForumTopic, ForumPost, CourseLike, lesson_completions
+from flask import render_template, flash, redirect, url_for, request, jsonify, current_app, abort
+from app.models import User, Course, Lesson, Question, Friendship, CourseRating, Enrollment, \
+    PrivateMessage, ContentSuggestion, ForumCategory, ForumTopic, ForumPost, CourseLike
 from app import db
 from .forms import EditProfileForm, ContentSuggestionForm, TopicForm, PostForm
 from app.utils import log_user_activity
-from sqlalchemy import or_, func
+from app.context import lazy_context, get_unread_counts, record_unread_message
+from app.friends import friend_graph
+from app.suggestions import people_suggestions, community_page
+from app.leaderboard import leaderboard
+from app.catalog import build_catalog, course_page, encode_cursor, decode_cursor
+from app.activity import recent_activity
+from app.search import search
+from app.presence import last_seen_tracker
+from app.recommendations import course_recommender, course_cards
+from app.quizzes import answer_key, grade, record_attempt
+from app.forum import topic_posts_page, last_page, topic_view_counter, record_new_topic, record_reply, \
+    categories_overview, category_topics_page, with_topic_authors
+from app.progress import course_progress, learning_summary, completed_lesson_ids
+from app.loading import with_body
+from app.http_cache import response_cache
+from app.rendering import render_markdown, rendered_html, prerender
+from sqlalchemy.orm import selectinload
 
 
 @main.before_app_request
 def before_request():
     if current_user.is_authenticated:
-        current_user.last_seen = datetime.utcnow()
-        db.session.commit()
+        # Registrado em memória e gravado em lote pelo rastreador (sem commit por requisição)
+        last_seen_tracker.touch(current_user.id)
         if not current_user.confirmed \
                 and request.blueprint != 'auth' \
                 and request.endpoint != 'static':
@@ -26,28 +39,28 @@ def before_request():
             return redirect(url_for('auth.resend_confirmation'))
 
 
+@main.after_app_request
+def invalidate_user_pages(response):
+    # Qualquer escrita do usuário pode mudar o que as páginas em cache mostram a ele
+    if request.method not in ('GET', 'HEAD') and current_user.is_authenticated:
+        response_cache.bump(f'user:{current_user.id}')
+    return response
+
+
 @main.app_context_processor
 def inject_unread_counts():
     """Injeta a contagem de mensagens não lidas em todos os templates."""
     if current_user.is_authenticated:
-        unread_counts = db.session.query(
-            User.username, func.count(PrivateMessage.id)
-        ).join(
-            PrivateMessage, User.id == PrivateMessage.sender_id
-        ).filter(
-            PrivateMessage.recipient_id == current_user.id,
-            PrivateMessage.read == False
-        ).group_by(User.username).all()
-
-        unread_dict = {username: count for username, count in unread_counts}
-        return dict(unread_counts=unread_dict)
+        user_id = current_user.id
+        return dict(unread_counts=lazy_context('unread_counts', lambda: get_unread_counts(user_id)))
     return dict(unread_counts={})
 
 
 @main.route('/')
+@response_cache.public('landing')
 def landing_page():
     total_users = User.query.count()
-    online_users = User.query.filter(User.last_seen > datetime.utcnow() - timedelta(minutes=5)).count()
+    online_users = last_seen_tracker.online_count()
 
     return render_template('main/landing_page.html', total_users=total_users, online_users=online_users)
 
@@ -56,58 +69,81 @@ def landing_page():
 @login_required
 def dashboard():
     total_users = User.query.count()
-    online_users = User.query.filter(User.last_seen > datetime.utcnow() - timedelta(minutes=5)).count()
+    online_users = last_seen_tracker.online_count()
+
+    my_rank = leaderboard.rank_of(current_user.id)
+    learning = learning_summary(current_user.id)
 
-    return render_template('main/dashboard.html', total_users=total_users, online_users=online_users)
+    # "Porque você fez X": consulta ao índice em memória, mais uma consulta para os títulos
+    recommendations = course_recommender.for_user([item.course_id for item in learning])
+    recommended_courses = course_cards([r.course_id for r in recommendations] +
+                                       [r.because_id for r in recommendations])
+
+    return render_template('main/dashboard.html', total_users=total_users, online_users=online_users,
+                           my_rank=my_rank, learning=learning, recommendations=recommendations,
+                           recommended_courses=recommended_courses)
+
+
+@main.route('/api/meu-aprendizado')
+@login_required
+def meu_aprendizado_api():
+    """Progresso do usuário em todos os cursos inscritos, sem carregar o conteúdo das aulas."""
+    return jsonify({'courses': [{
+        **item._asdict(),
+        'url': url_for('main.pagina_curso', course_id=item.course_id)
+    } for item in learning_summary(current_user.id)]})
 
 
 @main.app_template_filter('markdown_to_html')
 def markdown_to_html(text):
-    return markdown.markdown(text)
+    return render_markdown(text)
+
+
+@main.app_template_filter('rendered_html')
+def rendered_html_filter(obj):
+    """Corpo de um curso, aula, tópico ou resposta em HTML, sem converter o Markdown a cada exibição."""
+    return rendered_html(obj)
 
 
 @main.app_context_processor
 def inject_friends():
     if current_user.is_authenticated:
-        friends = current_user.get_friends()
-        return dict(friends_list=friends)
+        user_id = current_user.id
+        return dict(friends_list=lazy_context('friends_list', lambda: friend_graph.friends(user_id)))
     return dict(friends_list=[])
 
 
 @main.route('/usuarios')
 @login_required
 def pagina_usuarios():
-    all_users = User.query.filter(User.id != current_user.id).order_by(User.username.asc()).all()
-    return render_template('main/users.html', users=all_users)
+    suggestions_page = request.args.get('sugestoes', 1, type=int)
+    suggestions, more_suggestions = people_suggestions.page(current_user.id, max(suggestions_page, 1))
+    users, next_after = community_page(current_user.id, request.args.get('depois'),
+                                       per_page=current_app.config['USERS_PER_PAGE'])
+    return render_template('main/users.html', users=users, next_after=next_after,
+                           suggestions=suggestions, suggestions_page=suggestions_page,
+                           more_suggestions=more_suggestions)
 
 
 @main.route('/perfil/<username>')
 @login_required
 def pagina_perfil(username):
-    user = User.query.filter_by(username=username).first_or_404()
+    user = User.query.options(*with_body(User)).filter_by(username=username).first_or_404()
     friendship_status = 'not_friends'
-
     if user != current_user:
-        friendship = Friendship.query.filter(
-            or_(
-                (Friendship.requester_id == current_user.id) & (Friendship.addressee_id == user.id),
-                (Friendship.requester_id == user.id) & (Friendship.addressee_id == current_user.id)
-            )
-        ).first()
-
-        if friendship:
-            if friendship.status == 'accepted':
-                friendship_status = 'friends'
-            elif friendship.status == 'pending':
-                if friendship.requester_id == current_user.id:
-                    friendship_status = 'request_sent'
-                else:
-                    friendship_status = 'request_received'
+        friendship_status = friend_graph.status(current_user.id, user.id)
 
     pending_requests = Friendship.query.filter_by(addressee_id=user.id, status='pending').all()
 
+    # Linha do tempo paginada por cursor (?atividades=...), sem carregar o histórico inteiro
+    cursor = request.args.get('atividades')
+    before = decode_cursor(cursor) if cursor else None
+    activities, next_position = recent_activity(user.id, before, current_app.config['ACTIVITY_PAGE_SIZE'])
+    next_activities_cursor = encode_cursor(next_position) if next_position else None
+
     return render_template('main/profile.html', user=user, friendship_status=friendship_status,
-                           pending_requests=pending_requests)
+                           pending_requests=pending_requests, activities=activities,
+                           next_activities_cursor=next_activities_cursor)
 
 
 @main.route('/perfil/editar', methods=['GET', 'POST'])
@@ -134,14 +170,7 @@ def adicionar_amigo(username):
         flash('Você não pode adicionar a si mesmo como amigo.', 'warning')
         return redirect(url_for('main.pagina_perfil', username=username))
 
-    existing_friendship = Friendship.query.filter(
-        or_(
-            (Friendship.requester_id == current_user.id) & (Friendship.addressee_id == user_to_add.id),
-            (Friendship.requester_id == user_to_add.id) & (Friendship.addressee_id == current_user.id)
-        )
-    ).first()
-
-    if existing_friendship:
+    if friend_graph.status(current_user.id, user_to_add.id) != 'not_friends':
         flash('Um pedido de amizade já existe com este usuário.', 'info')
         return redirect(url_for('main.pagina_perfil', username=username))
 
@@ -154,6 +183,7 @@ def adicionar_amigo(username):
     )
     db.session.add(new_friendship)
     db.session.commit()
+    friend_graph.invalidate(current_user.id, user_to_add.id)
     flash(f'Pedido de amizade enviado para {username}.', 'success')
     return redirect(url_for('main.pagina_perfil', username=username))
 
@@ -172,6 +202,8 @@ def aceitar_amizade(request_id):
     log_user_activity(friend_request.requester, 'new_friend', f'Agora é amigo de {current_user.username}')
 
     db.session.commit()
+    friend_graph.invalidate(current_user.id, friend_request.requester_id)
+    people_suggestions.invalidate(current_user.id, friend_request.requester_id)
     flash(f'Você e {friend_request.requester.username} agora são amigos!', 'success')
     return redirect(url_for('main.pagina_perfil', username=current_user.username))
 
@@ -186,6 +218,7 @@ def recusar_amizade(request_id):
 
     db.session.delete(friend_request)
     db.session.commit()
+    friend_graph.invalidate(current_user.id, friend_request.requester_id)
     flash('Pedido de amizade recusado.', 'info')
     return redirect(url_for('main.pagina_perfil', username=current_user.username))
 
@@ -194,45 +227,74 @@ def recusar_amizade(request_id):
 @login_required
 def pagina_cursos():
     search_query = request.args.get('q')
-    if search_query:
-        cursos = Course.query.filter(
-            or_(
-                Course.title.ilike(f'%{search_query}%'),
-                Course.description.ilike(f'%{search_query}%')
-            )
-        ).order_by(Course.created_at.desc()).all()
-    else:
-        cursos = Course.query.order_by(Course.created_at.desc()).all()
-    return render_template('main/courses.html', cursos=cursos, search_query=search_query)
+    cursos, next_cursor = course_page(search_query, per_page=current_app.config['COURSES_PER_PAGE'])
+    cursos = build_catalog(cursos, current_user)
+    return render_template('main/courses.html', cursos=cursos, search_query=search_query,
+                           next_cursor=next_cursor)
+
+
+@main.route('/api/cursos')
+@login_required
+def cursos_api():
+    """Próxima página do catálogo, a partir do cursor recebido (rolagem infinita)."""
+    search_query = request.args.get('q')
+    cursor = request.args.get('cursor')
+    if cursor and decode_cursor(cursor) is None:
+        return jsonify({'error': 'Cursor inválido'}), 400
+
+    cursos, next_cursor = course_page(search_query, cursor, per_page=current_app.config['COURSES_PER_PAGE'])
+    cursos = build_catalog(cursos, current_user)
+
+    return jsonify({
+        'courses': [{
+            'id': curso.id,
+            'title': curso.title,
+            'category': curso.category,
+            'average_rating': curso.average_rating,
+            'likes': curso.likes_count,
+            'dislikes': curso.dislikes_count,
+            'is_enrolled': curso.is_enrolled,
+            'user_rating': curso.user_rating,
+            'url': url_for('main.pagina_curso', course_id=curso.id)
+        } for curso in cursos],
+        'html': render_template('main/_course_cards.html', cursos=cursos),
+        'next_cursor': next_cursor
+    })
 
 
-# LÓGICA DESTA ROTA FOI ATUALIZADA
 @main.route('/cursos/<int:course_id>')
 @login_required
+@response_cache.private('catalog')
 def pagina_curso(course_id):
-    curso = Course.query.get_or_404(course_id)
-    progress = 0
+    curso = Course.query.options(*with_body(Course)).get_or_404(course_id)
 
-    if current_user.is_authenticated:
-        total_lessons = len(curso.lessons)
-        if total_lessons > 0:
-            # Conta quantas aulas deste curso o usuário completou
-            completed_lessons_count = db.session.query(lesson_completions).join(Lesson).filter(
-                Lesson.course_id == curso.id,
-                lesson_completions.c.user_id == current_user.id
-            ).count()
-            progress = round((completed_lessons_count / total_lessons) * 100)
+    course_progress_row = course_progress(current_user.id, [curso.id]).get(curso.id)
+    progress = course_progress_row.percent if course_progress_row else 0
 
-    return render_template('main/course_detail.html', curso=curso, progress=progress)
+    # Só o id da primeira aula é necessário para o botão "Acessar Conteúdo"
+    first_lesson_id = db.session.query(Lesson.id).filter(Lesson.course_id == curso.id) \
+        .order_by(Lesson.id.asc()).limit(1).scalar()
+
+    similar = course_recommender.similar(curso.id)
+    cards = course_cards([course_id for course_id, _ in similar])
+    similar_courses = [cards[course_id] for course_id, _ in similar if course_id in cards]
+
+    return render_template('main/course_detail.html', curso=curso, progress=progress,
+                           first_lesson_id=first_lesson_id, similar_courses=similar_courses)
 
 
 @main.route('/cursos/<int:course_id>/aula/<int:lesson_id>')
 @login_required
+@response_cache.private('catalog')
 def pagina_aula(course_id, lesson_id):
-    aula = Lesson.query.get_or_404(lesson_id)
+    aula = Lesson.query.options(*with_body(Lesson)).get_or_404(lesson_id)
     curso = Course.query.get_or_404(course_id)
 
-    lessons_list = curso.lessons
+    # Navegação: só id e título das aulas, sem o conteúdo de cada uma
+    lessons_list = db.session.query(Lesson.id, Lesson.title).filter(Lesson.course_id == curso.id) \
+        .order_by(Lesson.id.asc()).all()
+    completed_ids = completed_lesson_ids(current_user.id)
+
     current_lesson_index = None
     for i, lesson in enumerate(lessons_list):
         if lesson.id == lesson_id:
@@ -245,11 +307,13 @@ def pagina_aula(course_id, lesson_id):
         current_lesson_index + 1] if current_lesson_index is not None and current_lesson_index < len(
         lessons_list) - 1 else None
 
-    is_completed = current_user.has_completed_lesson(aula)
+    is_completed = aula.id in completed_ids
 
     return render_template('main/lesson_detail.html',
                            aula=aula,
                            curso=curso,
+                           lessons_list=lessons_list,
+                           completed_ids=completed_ids,
                            prev_lesson=prev_lesson,
                            next_lesson=next_lesson,
                            is_completed=is_completed)
@@ -271,6 +335,9 @@ def concluir_aula(lesson_id):
         log_user_activity(current_user, 'lesson_completed', f'Concluiu a aula: {aula.title}')
 
         db.session.commit()
+        leaderboard.record_score(current_user.id, current_user.username, current_user.score)
+        if enrollment:
+            leaderboard.record_course_score(course.id, current_user.id, enrollment.score)
         flash(f'Parabéns! Você concluiu a aula "{aula.title}" e ganhou 10 pontos!', 'success')
     else:
         flash(f'Você já havia concluído a aula "{aula.title}".', 'info')
@@ -280,43 +347,66 @@ def concluir_aula(lesson_id):
 
 @main.app_context_processor
 def inject_ranking():
-    top_users = User.query.order_by(User.score.desc()).limit(10).all()
-    return dict(ranking_users=top_users)
+    return dict(ranking_users=lazy_context('ranking_users', lambda: leaderboard.top(10)))
+
+
+@main.route('/api/ranking')
+@login_required
+def ranking_api():
+    """Ranking (global, por curso ou entre amigos) e a posição do usuário atual."""
+    scope = request.args.get('escopo', 'global')
+    limit = min(request.args.get('limite', 10, type=int), 100)
+
+    if scope == 'curso':
+        course_id = request.args.get('course_id', type=int)
+        if course_id is None:
+            return jsonify({'error': 'course_id é obrigatório'}), 400
+        top = leaderboard.course_top(course_id, limit)
+        my_rank = leaderboard.course_rank_of(course_id, current_user.id)
+    elif scope == 'amigos':
+        friend_ids = friend_graph.friend_ids(current_user.id)
+        top = leaderboard.friends_top(current_user.id, friend_ids, limit)
+        my_rank = leaderboard.friends_rank_of(current_user.id, friend_ids)
+    else:
+        top = leaderboard.top(limit)
+        my_rank = leaderboard.rank_of(current_user.id)
+
+    return jsonify({'ranking': [entry._asdict() for entry in top], 'my_rank': my_rank})
 
 
 @main.route('/quiz/submit/<int:quiz_id>', methods=['POST'])
 @login_required
 def submit_quiz(quiz_id):
-    quiz = Quiz.query.get_or_404(quiz_id)
-    course = quiz.lesson.course
+    # Gabarito em cache: nenhuma consulta por pergunta nem por resposta
+    key = answer_key(quiz_id)
+    if key is None:
+        abort(404)
 
-    enrollment = Enrollment.query.filter_by(user_id=current_user.id, course_id=course.id).first()
+    enrollment = Enrollment.query.filter_by(user_id=current_user.id, course_id=key.course_id).first()
     if not enrollment:
         flash('Você precisa estar inscrito no curso para responder ao simulado.', 'warning')
-        return redirect(url_for('main.pagina_aula', course_id=course.id, lesson_id=quiz.lesson.id))
-
-    pontos_ganhos = 0
-    total_perguntas = len(quiz.questions)
-    respostas_corretas = 0
-
-    for pergunta in quiz.questions:
-        id_resposta_selecionada = request.form.get(f'pergunta_{pergunta.id}')
-        if id_resposta_selecionada:
-            resposta = Answer.query.get(id_resposta_selecionada)
-            if resposta and resposta.is_correct:
-                respostas_corretas += 1
-                pontos_ganhos += 10
-
-    if pontos_ganhos > 0:
-        enrollment.score += pontos_ganhos
-        current_user.score += pontos_ganhos
-        db.session.commit()
+        return redirect(url_for('main.pagina_aula', course_id=key.course_id, lesson_id=key.lesson_id))
+
+    result = grade(key, request.form)
+    record_attempt(current_user.id, key, result)
+
+    if result.points > 0:
+        enrollment.score += result.points
+        current_user.score += result.points
+        # Valores lidos antes do commit, que expira os objetos da sessão
+        user_id, username = current_user.id, current_user.username
+        user_score, course_score = current_user.score, enrollment.score
+    db.session.commit()
+
+    if result.points > 0:
+        leaderboard.record_score(user_id, username, user_score)
+        leaderboard.record_course_score(key.course_id, user_id, course_score)
 
     flash(
-        f'Você acertou {respostas_corretas} de {total_perguntas} perguntas e ganhou {pontos_ganhos} pontos neste curso!',
+        f'Você acertou {result.correct} de {result.total} perguntas e ganhou {result.points} pontos neste curso!',
         'success')
 
-    return redirect(url_for('main.pagina_aula', course_id=quiz.lesson.course.id, lesson_id=quiz.lesson.id))
+    return redirect(url_for('main.pagina_aula', course_id=key.course_id, lesson_id=key.lesson_id))
 
 
 @main.route('/curso/<int:course_id>/inscrever', methods=['POST'])
@@ -325,6 +415,8 @@ def enroll(course_id):
     course = Course.query.get_or_404(course_id)
     current_user.enroll(course)
     db.session.commit()
+    people_suggestions.invalidate(current_user.id)
+    leaderboard.add_course_member(course.id, current_user.id)
     flash(f'Você se inscreveu no curso "{course.title}" com sucesso!', 'success')
     return redirect(url_for('main.pagina_cursos'))
 
@@ -335,6 +427,8 @@ def unenroll(course_id):
     course = Course.query.get_or_404(course_id)
     current_user.unenroll(course)
     db.session.commit()
+    people_suggestions.invalidate(current_user.id)
+    leaderboard.remove_course_member(course.id, current_user.id)
     flash(f'Sua inscrição no curso "{course.title}" foi cancelada.', 'info')
     return redirect(url_for('main.pagina_cursos'))
 
@@ -351,11 +445,13 @@ def rate_course(course_id):
 
     rating = CourseRating.query.filter_by(user_id=current_user.id, course_id=course.id).first()
     if rating:
+        Course.bump_counters(course, rating_sum=stars - rating.stars)
         rating.stars = stars
         flash('Sua avaliação foi atualizada!', 'success')
     else:
         rating = CourseRating(user_id=current_user.id, course_id=course.id, stars=stars)
         db.session.add(rating)
+        Course.bump_counters(course, rating_sum=stars, rating_count=1)
         flash('Obrigado por avaliar o curso!', 'success')
 
     db.session.commit()
@@ -374,27 +470,32 @@ def interact_course(course_id):
     existing_interaction = CourseLike.query.filter_by(user_id=current_user.id, course_id=course.id).first()
     is_like = (action == 'like')
 
+    # Variação do contador correspondente a cada tipo de interação
+    counter = 'likes_count' if is_like else 'dislikes_count'
+    other_counter = 'dislikes_count' if is_like else 'likes_count'
+
     if existing_interaction:
         if existing_interaction.is_like == is_like:
             # Toggle off if clicking the same action
             db.session.delete(existing_interaction)
+            Course.bump_counters(course, **{counter: -1})
             message = 'Interação removida.'
         else:
             # Switch interaction
             existing_interaction.is_like = is_like
+            Course.bump_counters(course, **{counter: 1, other_counter: -1})
             message = f'Você deu {action} neste curso.'
     else:
         interaction = CourseLike(user_id=current_user.id, course_id=course.id, is_like=is_like)
         db.session.add(interaction)
+        Course.bump_counters(course, **{counter: 1})
         message = f'Você deu {action} neste curso.'
 
     db.session.commit()
 
-    # Calculate new counts
-    likes = CourseLike.query.filter_by(course_id=course.id, is_like=True).count()
-    dislikes = CourseLike.query.filter_by(course_id=course.id, is_like=False).count()
-
-    return jsonify({'success': True, 'message': message, 'likes': likes, 'dislikes': dislikes})
+    # Lê os contadores já atualizados (o commit expirou o objeto)
+    return jsonify({'success': True, 'message': message,
+                    'likes': course.likes_count, 'dislikes': course.dislikes_count})
 
 
 @main.route('/curso/<int:course_id>/compartilhar', methods=['POST'])
@@ -413,7 +514,7 @@ def share_course(course_id):
         return redirect(url_for('main.pagina_cursos'))
 
     # Check if they are friends
-    if recipient not in current_user.get_friends():
+    if not friend_graph.are_friends(current_user.id, recipient.id):
         flash('Você só pode compartilhar com amigos.', 'danger')
         return redirect(url_for('main.pagina_cursos'))
 
@@ -422,6 +523,7 @@ def share_course(course_id):
     msg = PrivateMessage(sender=current_user, recipient=recipient, content=message_content)
     db.session.add(msg)
     db.session.commit()
+    record_unread_message(recipient.id, current_user.username)
 
     flash(f'Curso compartilhado com {recipient.username}!', 'success')
     return redirect(url_for('main.pagina_cursos'))
@@ -482,43 +584,91 @@ def chatbot_api():
 @login_required
 def forum_search():
     search_query = request.args.get('q', '')
+    topics = []
+    snippets = {}
     if search_query:
-        topics = ForumTopic.query.filter(
-            or_(
-                ForumTopic.title.ilike(f'%{search_query}%'),
-                ForumTopic.content.ilike(f'%{search_query}%')
-            )
-        ).order_by(ForumTopic.created_at.desc()).all()
-    else:
-        topics = []
+        hits = search(search_query, kinds=('topic', 'post'))
+
+        # Respostas encontradas apontam para o tópico em que foram publicadas
+        post_ids = [hit.ref_id for hit in hits if hit.kind == 'post']
+        post_topics = dict(db.session.query(ForumPost.id, ForumPost.topic_id)
+                           .filter(ForumPost.id.in_(post_ids)).all()) if post_ids else {}
+
+        for hit in hits:
+            topic_id = hit.ref_id if hit.kind == 'topic' else post_topics.get(hit.ref_id)
+            if topic_id is not None and topic_id not in snippets:
+                snippets[topic_id] = hit.snippet_html
+
+        # Mantém a ordem de relevância da busca
+        found = {topic.id: topic for topic in ForumTopic.query.options(
+            *with_topic_authors(), selectinload(ForumTopic.category)
+        ).filter(ForumTopic.id.in_(list(snippets))).all()}
+        topics = [found[topic_id] for topic_id in snippets if topic_id in found]
 
-    return render_template('forum/search_results.html', topics=topics, search_query=search_query)
+    return render_template('forum/search_results.html', topics=topics, snippets=snippets,
+                           search_query=search_query)
+
+
+@main.route('/api/busca')
+@login_required
+def search_api():
+    """Busca textual ranqueada em cursos, aulas e fórum, com trechos destacados."""
+    search_query = request.args.get('q', '')
+    hits = search(search_query, limit=min(request.args.get('limite', 20, type=int), 50))
+
+    post_ids = [hit.ref_id for hit in hits if hit.kind == 'post']
+    lesson_ids = [hit.ref_id for hit in hits if hit.kind == 'lesson']
+    post_topics = dict(db.session.query(ForumPost.id, ForumPost.topic_id)
+                       .filter(ForumPost.id.in_(post_ids)).all()) if post_ids else {}
+    lesson_courses = dict(db.session.query(Lesson.id, Lesson.course_id)
+                          .filter(Lesson.id.in_(lesson_ids)).all()) if lesson_ids else {}
+
+    def hit_url(hit):
+        if hit.kind == 'course':
+            return url_for('main.pagina_curso', course_id=hit.ref_id)
+        if hit.kind == 'lesson':
+            return url_for('main.pagina_aula', course_id=lesson_courses.get(hit.ref_id), lesson_id=hit.ref_id)
+        if hit.kind == 'topic':
+            return url_for('main.forum_topic', topic_id=hit.ref_id)
+        return url_for('main.forum_topic', topic_id=post_topics.get(hit.ref_id))
+
+    return jsonify({'results': [{
+        'kind': hit.kind,
+        'id': hit.ref_id,
+        'title': hit.title,
+        'snippet': str(hit.snippet_html),
+        'rank': hit.rank,
+        'url': hit_url(hit)
+    } for hit in hits]})
 
 
 @main.route('/forum')
 @login_required
 def forum_index():
-    categories = ForumCategory.query.order_by(ForumCategory.name.asc()).all()
-    return render_template('forum/index.html', categories=categories)
+    return render_template('forum/index.html', categories=categories_overview())
 
 
 @main.route('/forum/categoria/<int:category_id>')
 @login_required
 def forum_category(category_id):
     category = ForumCategory.query.get_or_404(category_id)
-    topics = ForumTopic.query.filter_by(category_id=category.id).order_by(ForumTopic.created_at.desc()).all()
-    return render_template('forum/category.html', category=category, topics=topics)
+    cursor = request.args.get('depois')
+    topics, next_cursor = category_topics_page(category.id, cursor, current_app.config['FORUM_TOPICS_PER_PAGE'])
+    return render_template('forum/category.html', category=category, topics=topics,
+                           next_cursor=next_cursor, is_first_page=not cursor)
 
 
 @main.route('/forum/topico/<int:topic_id>', methods=['GET', 'POST'])
 @login_required
 def forum_topic(topic_id):
-    topic = ForumTopic.query.get_or_404(topic_id)
+    topic = ForumTopic.query.options(*with_body(ForumTopic)).get_or_404(topic_id)
 
-    # Incrementa visualizações
-    topic.views += 1
-    db.session.commit()
+    # Contada em memória e gravada em lote (sem escrita no banco a cada leitura);
+    # enviar uma resposta não conta como visualização
+    if request.method == 'GET':
+        topic_view_counter.hit(topic.id)
 
+    per_page = current_app.config['FORUM_POSTS_PER_PAGE']
     form = PostForm()
     if form.validate_on_submit():
         post = ForumPost(
@@ -526,15 +676,20 @@ def forum_topic(topic_id):
             user=current_user,
             topic=topic
         )
+        prerender(post)
         db.session.add(post)
+        record_reply(topic, post, current_user.id)
 
         log_user_activity(current_user, 'forum_post', f'Respondeu ao tópico: {topic.title}')
 
         db.session.commit()
         flash('Sua resposta foi publicada.', 'success')
-        return redirect(url_for('main.forum_topic', topic_id=topic.id))
+        # Leva à última página, onde a nova resposta aparece
+        return redirect(url_for('main.forum_topic', topic_id=topic.id, pagina=last_page(topic, per_page)))
 
-    return render_template('forum/topic.html', topic=topic, form=form)
+    posts_page = topic_posts_page(topic, request.args.get('pagina', 1, type=int), per_page)
+    return render_template('forum/topic.html', topic=topic, posts=posts_page.posts, page=posts_page.page,
+                           pages=posts_page.pages, form=form)
 
 
 @main.route('/forum/novo-topico', methods=['GET', 'POST'])
@@ -551,7 +706,9 @@ def create_topic():
             category_id=form.category.data,
             user=current_user
         )
+        prerender(topic)
         db.session.add(topic)
+        record_new_topic(topic, current_user.id)
 
         log_user_activity(current_user, 'forum_topic', f'Criou o tópico: {topic.title}')
 
@@ -1,13 +1,14 @@
 # app/models.py
 
 from . import db
-from datetime import datetime, timedelta
+from datetime import datetime
 from flask_login import UserMixin
 from app import login_manager
 from flask import current_app
 from itsdangerous import URLSafeTimedSerializer as Serializer
 from itsdangerous.exc import SignatureExpired, BadTimeSignature
-from sqlalchemy import func, or_
+from sqlalchemy import or_
+from .presence import last_seen_tracker
 
 
 @login_manager.user_loader
@@ -21,8 +22,28 @@ lesson_completions = db.Table('lesson_completions',
                               )
 
 
+class CounterMixin:
+    """Modelos com contadores denormalizados, mantidos pelas rotas de escrita."""
+
+    @classmethod
+    def bump_counters(cls, obj, assign=None, **deltas):
+        """
+        Soma os deltas aos contadores do objeto (ou do id) com um UPDATE atômico
+        (coluna = coluna + delta), na mesma transação da escrita que os motivou.
+        `assign` define outras colunas no mesmo UPDATE (ex.: a última atividade).
+        """
+        values = {getattr(cls, name): getattr(cls, name) + delta for name, delta in deltas.items() if delta}
+        values.update({getattr(cls, name): value for name, value in (assign or {}).items()})
+        if values:
+            object_id = obj if isinstance(obj, int) else obj.id
+            cls.query.filter(cls.id == object_id).update(values, synchronize_session=False)
+
+
 class Enrollment(db.Model):
     __tablename__ = 'enrollments'
+    __table_args__ = (
+        db.Index('ix_enrollments_course_score', 'course_id', 'score'),
+    )
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
     course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), primary_key=True)
     score = db.Column(db.Integer, default=0)
@@ -39,15 +60,17 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(256), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     full_name = db.Column(db.String(120), nullable=True)
-    score = db.Column(db.Integer, server_default='0', nullable=False)
-    bio = db.Column(db.Text, nullable=True)
+    score = db.Column(db.Integer, server_default='0', nullable=False, index=True)
+    # Textos longos ficam adiados (grupo 'body') e só são lidos quando pedidos; ver app/loading.py
+    bio = db.deferred(db.Column(db.Text, nullable=True), group='body')
     profile_picture = db.Column(db.String(255), nullable=False, server_default='default.jpg')
     is_admin = db.Column(db.Boolean, server_default='f', nullable=False)
-    last_seen = db.Column(db.DateTime, default=datetime.utcnow)
+    last_seen = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     confirmed = db.Column(db.Boolean, nullable=False, default=False)
 
+    # 'dynamic': a coleção nunca é carregada junto com o usuário (ver app/progress.py)
     completed_lessons = db.relationship('Lesson', secondary=lesson_completions,
-                                        lazy='subquery',
+                                        lazy='dynamic',
                                         backref=db.backref('completed_by_users', lazy=True))
     ratings = db.relationship('CourseRating', backref='user', lazy='dynamic')
     enrollments = db.relationship('Enrollment', back_populates='user', lazy='dynamic', cascade="all, delete-orphan")
@@ -59,11 +82,13 @@ class User(UserMixin, db.Model):
         if not self.is_enrolled(course):
             enrollment = Enrollment(user=self, course=course)
             db.session.add(enrollment)
+            Course.bump_counters(course, enrollment_count=1)
 
     def unenroll(self, course):
         enrollment = self.enrollments.filter_by(course_id=course.id).first()
         if enrollment:
             db.session.delete(enrollment)
+            Course.bump_counters(course, enrollment_count=-1)
 
     def get_enrollment_for(self, course):
         return self.enrollments.filter_by(course_id=course.id).first()
@@ -95,23 +120,20 @@ class User(UserMixin, db.Model):
         return User.query.get(user_id)
 
     def has_completed_lesson(self, lesson):
-        return lesson in self.completed_lessons
+        return db.session.query(
+            db.select(lesson_completions).where(
+                lesson_completions.c.user_id == self.id,
+                lesson_completions.c.lesson_id == lesson.id
+            ).exists()
+        ).scalar()
 
     def get_friends(self):
-        friends = []
-        sent_requests = Friendship.query.filter_by(requester_id=self.id, status='accepted').all()
-        for req in sent_requests:
-            friends.append(req.addressee)
-        received_requests = Friendship.query.filter_by(addressee_id=self.id, status='accepted').all()
-        for req in received_requests:
-            friends.append(req.requester)
-        return friends
+        from .friends import friend_graph
+        return friend_graph.friends(self.id)
 
     def is_online(self):
-        if self.last_seen:
-            time_difference = datetime.utcnow() - self.last_seen
-            return time_difference < timedelta(minutes=5)
-        return False
+        # O rastreador em memória tem o acesso mais recente; o banco pode estar até um intervalo atrasado
+        return last_seen_tracker.is_online(self.id, self.last_seen)
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -120,20 +142,36 @@ class User(UserMixin, db.Model):
         return self.username
 
 
-class Course(db.Model):
+class Course(CounterMixin, db.Model):
     __tablename__ = 'courses'
+    # Ordem do catálogo paginado por cursor (ver app/catalog.py)
+    __table_args__ = (
+        db.Index('ix_courses_created_at_id', 'created_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(150), nullable=False)
-    description = db.Column(db.Text, nullable=False)
+    description = db.deferred(db.Column(db.Text, nullable=False), group='body')
+    # Descrição já convertida para HTML ao salvar (ver app/rendering.py); vazia até lá
+    description_html = db.deferred(db.Column(db.Text, nullable=True), group='body')
     category = db.Column(db.String(100), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Início da descrição para as listagens, preenchido só por consultas com app.loading.with_summary
+    summary = db.query_expression()
+
+    # Contadores denormalizados, mantidos pelas rotas de escrita (ver bump_counters)
+    likes_count = db.Column(db.Integer, server_default='0', nullable=False, default=0)
+    dislikes_count = db.Column(db.Integer, server_default='0', nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, server_default='0', nullable=False, default=0)
+    rating_count = db.Column(db.Integer, server_default='0', nullable=False, default=0)
+    enrollment_count = db.Column(db.Integer, server_default='0', nullable=False, default=0)
+
     lessons = db.relationship('Lesson', back_populates='course', lazy=True, cascade="all, delete-orphan")
     ratings = db.relationship('CourseRating', backref='course', lazy='dynamic')
     enrollments = db.relationship('Enrollment', back_populates='course', lazy='dynamic', cascade="all, delete-orphan")
 
     def average_rating(self):
-        avg = db.session.query(func.avg(CourseRating.stars)).filter(CourseRating.course_id == self.id).scalar()
-        return round(avg, 1) if avg else 0
+        return round(self.rating_sum / self.rating_count, 1) if self.rating_count else 0
 
     def user_rating(self, user):
         if not user.is_authenticated:
@@ -151,7 +189,7 @@ class Course(db.Model):
 class CourseRating(db.Model):
     __tablename__ = 'course_ratings'
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
-    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), primary_key=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), primary_key=True, index=True)
     stars = db.Column(db.Integer, nullable=False)
 
 
@@ -159,8 +197,9 @@ class Lesson(db.Model):
     __tablename__ = 'lessons'
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(150), nullable=False)
-    content = db.Column(db.Text, nullable=False)
-    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
+    content = db.deferred(db.Column(db.Text, nullable=False), group='body')
+    content_html = db.deferred(db.Column(db.Text, nullable=True), group='body')
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False, index=True)
     quiz = db.relationship('Quiz', back_populates='lesson', lazy=True, uselist=False, cascade="all, delete-orphan")
     course = db.relationship('Course', back_populates='lessons')
 
@@ -216,8 +255,34 @@ class Answer(db.Model):
         return self.text if len(self.text) <= 80 else self.text[:80] + '...'
 
 
+class QuizAttempt(db.Model):
+    """Uma tentativa de resposta a um simulado, já corrigida (ver app/quizzes.py)."""
+    __tablename__ = 'quiz_attempts'
+    __table_args__ = (
+        db.Index('ix_quiz_attempts_quiz_created', 'quiz_id', 'created_at'),
+        db.Index('ix_quiz_attempts_user_quiz', 'user_id', 'quiz_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quizzes.id', ondelete='CASCADE'), nullable=False)
+    total_questions = db.Column(db.Integer, nullable=False)
+    correct_count = db.Column(db.Integer, nullable=False)
+    points = db.Column(db.Integer, nullable=False, default=0)
+    # {id da pergunta: id da resposta escolhida}, só com respostas válidas para a pergunta
+    answers = db.Column(db.JSON, nullable=False, default=dict)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<QuizAttempt quiz={self.quiz_id} user={self.user_id} {self.correct_count}/{self.total_questions}>'
+
+
 class Friendship(db.Model):
     __tablename__ = 'friendships'
+    # Um índice por lado da amizade; a terceira coluna deixa a lista de amigos coberta pelo índice
+    __table_args__ = (
+        db.Index('ix_friendships_requester_status', 'requester_id', 'status', 'addressee_id'),
+        db.Index('ix_friendships_addressee_status', 'addressee_id', 'status', 'requester_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     requester_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     addressee_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -237,10 +302,16 @@ class Friendship(db.Model):
 # --- NOVO MODELO PARA MENSAGENS PRIVADAS ---
 class PrivateMessage(db.Model):
     __tablename__ = 'private_messages'
+    __table_args__ = (
+        # Contagem de não lidas por remetente
+        db.Index('ix_private_messages_recipient_read', 'recipient_id', 'read', 'sender_id'),
+        # Histórico de cada sentido de uma conversa, paginado por (timestamp, id)
+        db.Index('ix_private_messages_conversation', 'sender_id', 'recipient_id', 'timestamp', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     recipient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    content = db.Column(db.Text, nullable=False)
+    content = db.deferred(db.Column(db.Text, nullable=False), group='body')
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     read = db.Column(db.Boolean, default=False)
 
@@ -254,6 +325,9 @@ class PrivateMessage(db.Model):
 
 class ContentSuggestion(db.Model):
     __tablename__ = 'content_suggestions'
+    __table_args__ = (
+        db.Index('ix_content_suggestions_user_created', 'user_id', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     title = db.Column(db.String(150), nullable=False)
@@ -268,30 +342,52 @@ class ContentSuggestion(db.Model):
         return f'<ContentSuggestion {self.title}>'
 
 
-class ForumCategory(db.Model):
+class ForumCategory(CounterMixin, db.Model):
     __tablename__ = 'forum_categories'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False, unique=True)
     description = db.Column(db.String(255), nullable=True)
     slug = db.Column(db.String(100), nullable=False, unique=True)
+
+    # Resumo denormalizado, mantido pelas rotas de escrita do fórum (ver app/forum.py)
+    topic_count = db.Column(db.Integer, server_default='0', nullable=False, default=0)
+    post_count = db.Column(db.Integer, server_default='0', nullable=False, default=0)
+    last_post_at = db.Column(db.DateTime, nullable=True)
+    last_post_user_id = db.Column(
+        db.Integer, db.ForeignKey('users.id', ondelete='SET NULL', name='fk_forum_categories_last_post_user_id'),
+        nullable=True)
+
     topics = db.relationship('ForumTopic', backref='category', lazy=True, cascade="all, delete-orphan")
+    last_post_user = db.relationship('User', foreign_keys=[last_post_user_id])
 
     def __repr__(self):
         return f'<ForumCategory {self.name}>'
 
 
-class ForumTopic(db.Model):
+class ForumTopic(CounterMixin, db.Model):
     __tablename__ = 'forum_topics'
+    __table_args__ = (
+        db.Index('ix_forum_topics_category_created', 'category_id', 'created_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
-    content = db.Column(db.Text, nullable=False)
+    content = db.deferred(db.Column(db.Text, nullable=False), group='body')
+    content_html = db.deferred(db.Column(db.Text, nullable=True), group='body')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     views = db.Column(db.Integer, default=0)
+    # Resumo denormalizado das respostas, mantido pelas rotas de escrita do fórum (ver app/forum.py).
+    # Sem respostas, a última atividade é a criação do próprio tópico.
+    post_count = db.Column(db.Integer, server_default='0', nullable=False, default=0)
+    last_post_at = db.Column(db.DateTime, nullable=True)
+    last_post_user_id = db.Column(
+        db.Integer, db.ForeignKey('users.id', ondelete='SET NULL', name='fk_forum_topics_last_post_user_id'),
+        nullable=True)
 
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('forum_categories.id'), nullable=False)
 
-    user = db.relationship('User', backref=db.backref('topics', lazy=True))
+    user = db.relationship('User', foreign_keys=[user_id], backref=db.backref('topics', lazy=True))
+    last_post_user = db.relationship('User', foreign_keys=[last_post_user_id])
     posts = db.relationship('ForumPost', backref='topic', lazy=True, cascade="all, delete-orphan")
 
     def __repr__(self):
@@ -300,8 +396,12 @@ class ForumTopic(db.Model):
 
 class ForumPost(db.Model):
     __tablename__ = 'forum_posts'
+    __table_args__ = (
+        db.Index('ix_forum_posts_topic_created', 'topic_id', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    content = db.Column(db.Text, nullable=False)
+    content = db.deferred(db.Column(db.Text, nullable=False), group='body')
+    content_html = db.deferred(db.Column(db.Text, nullable=True), group='body')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -315,6 +415,9 @@ class ForumPost(db.Model):
 
 class ActivityLog(db.Model):
     __tablename__ = 'activity_logs'
+    __table_args__ = (
+        db.Index('ix_activity_logs_user_created', 'user_id', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     event_type = db.Column(db.String(50), nullable=False)
@@ -327,11 +430,52 @@ class ActivityLog(db.Model):
         return f'<ActivityLog {self.event_type} by {self.user.username}>'
 
 
+class ActivityRollup(db.Model):
+    """Contagem diária de atividades já removidas do log bruto (ver app/activity.py)."""
+    __tablename__ = 'activity_rollups'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    event_type = db.Column(db.String(50), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ActivityRollup {self.event_type} x{self.count} em {self.day}>'
+
+
 class CourseLike(db.Model):
     __tablename__ = 'course_likes'
+    __table_args__ = (
+        db.Index('ix_course_likes_course_like', 'course_id', 'is_like'),
+    )
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
     course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), primary_key=True)
     is_like = db.Column(db.Boolean, nullable=False) # True = Like, False = Dislike
 
     user = db.relationship('User', backref=db.backref('course_likes', lazy='dynamic', cascade="all, delete-orphan"))
-    course = db.relationship('Course', backref=db.backref('likes', lazy='dynamic', cascade="all, delete-orphan"))
\ No newline at end of file
+    course = db.relationship('Course', backref=db.backref('likes', lazy='dynamic', cascade="all, delete-orphan"))
+
+
+class OutboxEmail(db.Model):
+    """E-mail aguardando envio (ou já enviado) pela fila de saída; ver app/email.py."""
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        # Próximos e-mails a enviar
+        db.Index('ix_email_outbox_status_next', 'status', 'next_attempt_at'),
+        # Deduplicação e limite de envios por destinatário
+        db.Index('ix_email_outbox_recipient_created', 'recipient', 'created_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # confirmation, password_reset
+    recipient = db.Column(db.String(120), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    # Endereço do site no momento do pedido, para os links externos dos templates
+    base_url = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.String(255), nullable=True)
+
+    def __repr__(self):
+        return f'<OutboxEmail {self.kind} to {self.recipient} - {self.status}>'
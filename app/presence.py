@@ -0,0 +1,385 @@
+# app/presence.py
+
+import atexit
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import table, column, select, update, bindparam, Integer, DateTime
+
+from . import db, socketio
+
+# Visão mínima da tabela de usuários (evita importar os modelos aqui)
+_users = table('users', column('id', Integer), column('last_seen', DateTime))
+
+
+class LastSeenTracker:
+    """
+    Registra em memória o último acesso de cada usuário e grava tudo no banco
+    em lote (um único executemany) a cada intervalo, a partir de uma tarefa
+    em segundo plano. Assim uma requisição autenticada não precisa de commit.
+
+    Quem está online nos outros processos é relido do banco (users.last_seen)
+    depois de cada gravação em lote e, se esta tarefa ainda não roda aqui, na
+    leitura, no máximo uma vez a cada PRESENCE_FLUSH_INTERVAL segundos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}   # user_id -> datetime ainda não gravado no banco
+        self._recent = {}    # user_id -> datetime de quem foi visto dentro da janela "online"
+        self._refreshed_at = None
+        self._app = None
+
+    def _window(self):
+        return timedelta(minutes=current_app.config.get('ONLINE_WINDOW_MINUTES', 5))
+
+    def _ensure_started(self):
+        if self._app is not None:
+            return
+        self._app = current_app._get_current_object()
+        socketio.start_background_task(self._run)
+        atexit.register(self._flush_at_exit)
+
+    def refresh(self):
+        """Carrega do banco quem acessou recentemente, inclusive por outros processos."""
+        cutoff = datetime.utcnow() - self._window()
+        rows = db.session.execute(
+            select(_users.c.id, _users.c.last_seen).where(_users.c.last_seen > cutoff)
+        ).all()
+        with self._lock:
+            for user_id, last_seen in rows:
+                if last_seen > self._recent.get(user_id, datetime.min):
+                    self._recent[user_id] = last_seen
+            self._refreshed_at = time.monotonic()
+
+    def _refresh_if_stale(self):
+        interval = current_app.config.get('PRESENCE_FLUSH_INTERVAL', 30)
+        if self._refreshed_at is None or time.monotonic() - self._refreshed_at >= interval:
+            self.refresh()
+
+    # --- ESCRITA ---
+
+    def touch(self, user_id, when=None):
+        when = when or datetime.utcnow()
+        with self._lock:
+            self._pending[user_id] = when
+            self._recent[user_id] = when
+        self._ensure_started()
+
+    # --- LEITURA ---
+
+    def last_seen(self, user_id):
+        with self._lock:
+            return self._recent.get(user_id)
+
+    def is_online(self, user_id, fallback=None):
+        """`fallback` é o last_seen vindo do banco, usado quando o usuário não está em memória."""
+        last_seen = self.last_seen(user_id) or fallback
+        return bool(last_seen) and datetime.utcnow() - last_seen < self._window()
+
+    def online_ids(self):
+        self._refresh_if_stale()
+        cutoff = datetime.utcnow() - self._window()
+        with self._lock:
+            for user_id in [uid for uid, seen in self._recent.items() if seen <= cutoff]:
+                del self._recent[user_id]
+            return set(self._recent)
+
+    def online_count(self):
+        return len(self.online_ids())
+
+    # --- GRAVAÇÃO EM LOTE ---
+
+    def flush(self):
+        """Grava no banco todos os acessos pendentes com um único executemany."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(
+                    update(_users).where(_users.c.id == bindparam('user_id')).values(last_seen=bindparam('seen')),
+                    [{'user_id': user_id, 'seen': seen} for user_id, seen in pending.items()]
+                )
+        except Exception as e:
+            # Devolve os acessos à fila para a próxima tentativa, sem sobrescrever os mais novos
+            with self._lock:
+                for user_id, seen in pending.items():
+                    self._pending.setdefault(user_id, seen)
+            logging.error(f"Falha ao gravar last_seen de {len(pending)} usuários: {e}")
+            return 0
+        return len(pending)
+
+    def _run(self):
+        while True:
+            socketio.sleep(self._app.config.get('PRESENCE_FLUSH_INTERVAL', 30))
+            with self._app.app_context():
+                self.flush()
+                try:
+                    self.refresh()
+                except Exception as e:
+                    db.session.rollback()
+                    logging.error(f"Falha ao reler os usuários online: {e}")
+
+    def _flush_at_exit(self):
+        with self._app.app_context():
+            self.flush()
+
+
+# Instância única usada pela aplicação
+last_seen_tracker = LastSeenTracker()
+
+
+# --- REGISTRO DE CONEXÕES SOCKET.IO ---
+
+def get_user_room_name(user_id):
+    """Sala pessoal do usuário: reúne todas as suas conexões (abas), em qualquer worker."""
+    return f"usuario_{user_id}"
+
+#
+# Um backend de presença guarda quais conexões (sids) cada usuário tem abertas.
+# Interface comum:
+#   add(user_id, username, sid) -> True se foi a primeira conexão do usuário (ficou online)
+#   remove(sid) -> (user_id, username, ficou_offline) ou None se o sid não é conhecido
+#   sids(user_id) -> conjunto de sids do usuário
+#   is_online(user_id) -> bool
+#   online_users() -> {user_id: username}
+#   online_among(user_ids) -> {user_id: username} só dos que estão online
+#   online_count() -> quantidade de usuários online
+
+class InMemoryPresenceBackend:
+    """Registro no próprio processo. Serve para um único worker."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sids = defaultdict(set)   # user_id -> {sid, ...}
+        self._owners = {}               # sid -> (user_id, username)
+
+    def add(self, user_id, username, sid):
+        with self._lock:
+            self._owners[sid] = (user_id, username)
+            first = not self._sids[user_id]
+            self._sids[user_id].add(sid)
+            return first
+
+    def remove(self, sid):
+        with self._lock:
+            owner = self._owners.pop(sid, None)
+            if owner is None:
+                return None
+            user_id, username = owner
+            sids = self._sids[user_id]
+            sids.discard(sid)
+            if not sids:
+                del self._sids[user_id]
+            return user_id, username, not sids
+
+    def sids(self, user_id):
+        with self._lock:
+            return set(self._sids.get(user_id, ()))
+
+    def is_online(self, user_id):
+        with self._lock:
+            return bool(self._sids.get(user_id))
+
+    def online_users(self):
+        with self._lock:
+            return {user_id: self._owners[next(iter(sids))][1] for user_id, sids in self._sids.items()}
+
+    def online_among(self, user_ids):
+        with self._lock:
+            return {user_id: self._owners[next(iter(self._sids[user_id]))][1]
+                    for user_id in user_ids if self._sids.get(user_id)}
+
+    def online_count(self):
+        with self._lock:
+            return len(self._sids)
+
+
+class SharedStorePresenceBackend:
+    """
+    Registro em um armazenamento compartilhado com a API do Redis (sadd, srem,
+    scard, smembers, hset, hget, hmget, hdel, hgetall, hlen, set, exists,
+    delete e transaction), visível a todos os workers.
+
+    Chaves:
+      presence:sids:<user_id>         conjunto com os sids do usuário
+      presence:owners                 hash sid -> "worker:user_id:username" (busca reversa O(1))
+      presence:online                 hash user_id -> username de quem tem ao menos um sid
+      presence:workers                conjunto dos workers com conexões registradas
+      presence:worker:<worker>        sinal de vida do worker, com validade (heartbeat)
+      presence:worker_sids:<worker>   conjunto com os sids abertos no worker
+
+    Entrar e sair são transações (WATCH no conjunto de sids do usuário +
+    MULTI/EXEC): uma saída em um worker concorrente com uma entrada em outro
+    nunca tira da lista de online um usuário que ainda tem conexão. Os sids
+    de um worker que parou de renovar o heartbeat (ex.: travou) são removidos
+    pelos demais em reap_dead_workers.
+    """
+
+    prefix = 'presence'
+
+    def __init__(self, client, worker_id=None):
+        self.client = client
+        self.worker_id = worker_id or uuid.uuid4().hex
+
+    def _sids_key(self, user_id):
+        return f'{self.prefix}:sids:{user_id}'
+
+    def _worker_key(self, worker_id):
+        return f'{self.prefix}:worker:{worker_id}'
+
+    def _worker_sids_key(self, worker_id):
+        return f'{self.prefix}:worker_sids:{worker_id}'
+
+    @staticmethod
+    def _text(value):
+        return value.decode() if isinstance(value, bytes) else value
+
+    def add(self, user_id, username, sid):
+        sids_key = self._sids_key(user_id)
+
+        def _add(pipe):
+            first = pipe.scard(sids_key) == 0
+            pipe.multi()
+            pipe.hset(f'{self.prefix}:owners', sid, f'{self.worker_id}:{user_id}:{username}')
+            pipe.sadd(sids_key, sid)
+            pipe.hset(f'{self.prefix}:online', user_id, username)
+            pipe.sadd(self._worker_sids_key(self.worker_id), sid)
+            pipe.sadd(f'{self.prefix}:workers', self.worker_id)
+            return first
+
+        return self.client.transaction(_add, sids_key, value_from_callable=True)
+
+    def remove(self, sid):
+        owner = self.client.hget(f'{self.prefix}:owners', sid)
+        if owner is None:
+            return None
+        worker_id, user_id, username = self._text(owner).split(':', 2)
+        user_id = int(user_id)
+        sids_key = self._sids_key(user_id)
+
+        def _remove(pipe):
+            remaining = {self._text(member) for member in pipe.smembers(sids_key)} - {sid}
+            pipe.multi()
+            pipe.hdel(f'{self.prefix}:owners', sid)
+            pipe.srem(sids_key, sid)
+            pipe.srem(self._worker_sids_key(worker_id), sid)
+            if not remaining:
+                pipe.hdel(f'{self.prefix}:online', user_id)
+            return not remaining
+
+        offline = self.client.transaction(_remove, sids_key, value_from_callable=True)
+        return user_id, username, offline
+
+    # --- WORKERS ---
+
+    def heartbeat(self, ttl):
+        """Renova o sinal de vida deste worker por `ttl` segundos."""
+        self.client.set(self._worker_key(self.worker_id), 1, ex=ttl)
+        self.client.sadd(f'{self.prefix}:workers', self.worker_id)
+
+    def reap_dead_workers(self):
+        """
+        Remove as conexões dos workers sem heartbeat. Retorna a lista de
+        (user_id, username, ficou_offline) das conexões removidas.
+        """
+        removed = []
+        for worker_id in map(self._text, self.client.smembers(f'{self.prefix}:workers')):
+            if worker_id == self.worker_id or self.client.exists(self._worker_key(worker_id)):
+                continue
+            for sid in map(self._text, self.client.smembers(self._worker_sids_key(worker_id))):
+                result = self.remove(sid)
+                if result is not None:
+                    removed.append(result)
+            self.client.delete(self._worker_sids_key(worker_id))
+            self.client.srem(f'{self.prefix}:workers', worker_id)
+        return removed
+
+    def sids(self, user_id):
+        return {self._text(sid) for sid in self.client.smembers(self._sids_key(user_id))}
+
+    def is_online(self, user_id):
+        return self.client.scard(self._sids_key(user_id)) > 0
+
+    def online_users(self):
+        return {int(self._text(user_id)): self._text(username)
+                for user_id, username in self.client.hgetall(f'{self.prefix}:online').items()}
+
+    def online_among(self, user_ids):
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        usernames = self.client.hmget(f'{self.prefix}:online', user_ids)
+        return {user_id: self._text(username)
+                for user_id, username in zip(user_ids, usernames) if username is not None}
+
+    def online_count(self):
+        return self.client.hlen(f'{self.prefix}:online')
+
+
+class PresenceRegistry:
+    """
+    Fachada usada pelos eventos do Socket.IO. O backend é escolhido em init_app:
+    com PRESENCE_STORE_URL configurado, usa o armazenamento compartilhado (Redis);
+    senão, o registro em memória do processo.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or InMemoryPresenceBackend()
+        self._offline_listeners = []
+        self._app = None
+
+    def init_app(self, app):
+        url = app.config.get('PRESENCE_STORE_URL')
+        if url:
+            import redis  # dependência opcional, só necessária com vários workers
+            self.backend = SharedStorePresenceBackend(redis.Redis.from_url(url))
+
+    def on_offline(self, listener):
+        """Registra `listener(user_id, username)`, chamado quando um usuário sai por queda de outro worker."""
+        self._offline_listeners.append(listener)
+
+    def add(self, user_id, username, sid):
+        self._ensure_started()
+        return self.backend.add(user_id, username, sid)
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    # --- HEARTBEAT (ARMAZENAMENTO COMPARTILHADO) ---
+
+    def _ensure_started(self):
+        if self._app is not None or not hasattr(self.backend, 'heartbeat'):
+            return
+        self._app = current_app._get_current_object()
+        # Primeiro heartbeat antes da primeira conexão, para os outros workers não a removerem
+        self.backend.heartbeat(self._app.config.get('PRESENCE_WORKER_TTL', 30))
+        socketio.start_background_task(self._run)
+
+    def check_workers(self):
+        """Renova o heartbeat deste worker e remove as conexões dos workers que pararam."""
+        self.backend.heartbeat(self._app.config.get('PRESENCE_WORKER_TTL', 30))
+        for user_id, username, went_offline in self.backend.reap_dead_workers():
+            if went_offline:
+                for listener in self._offline_listeners:
+                    listener(user_id, username)
+
+    def _run(self):
+        while True:
+            socketio.sleep(self._app.config.get('PRESENCE_HEARTBEAT_INTERVAL', 10))
+            with self._app.app_context():
+                try:
+                    self.check_workers()
+                except Exception as e:
+                    logging.error(f"Falha ao renovar o heartbeat de presença: {e}")
+
+
+# Instância única usada pela aplicação
+presence_registry = PresenceRegistry()
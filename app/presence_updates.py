@@ -0,0 +1,87 @@
+# app/presence_updates.py
+
+import logging
+import threading
+from collections import defaultdict
+
+from flask import current_app
+
+from . import socketio
+from .friends import friend_graph
+from .presence import presence_registry, get_user_room_name
+
+
+class PresenceBroadcaster:
+    """
+    Agrupa as entradas e saídas de usuários durante uma janela curta e, ao fim
+    dela, envia a cada usuário online apenas o que mudou entre os seus amigos
+    (evento 'presence_delta'). A contagem geral de online vai num único evento
+    pequeno ('online_count'), e só quando muda. A lista completa é enviada
+    somente a quem acabou de conectar (ver snapshot).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}  # user_id -> [username, estado antes da janela, estado atual]
+        self._last_count = None
+        self._app = None
+
+    def _ensure_started(self):
+        if self._app is not None:
+            return
+        self._app = current_app._get_current_object()
+        socketio.start_background_task(self._run)
+
+    def user_changed(self, user_id, username, online):
+        """Registra que o usuário entrou (online=True) ou saiu; quem entra e sai na mesma janela é ignorado."""
+        with self._lock:
+            change = self._pending.get(user_id)
+            if change is None:
+                self._pending[user_id] = [username, not online, online]
+            else:
+                change[2] = online
+        self._ensure_started()
+
+    def snapshot(self, user_id):
+        """Amigos online e contagem geral, para o cliente que acabou de conectar."""
+        friends = presence_registry.online_among(friend_graph.friend_ids(user_id))
+        return {'online': sorted(friends.values()), 'count': presence_registry.online_count()}
+
+    def flush(self):
+        """Envia os deltas acumulados. Retorna quantos usuários receberam atualização."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        deltas = defaultdict(lambda: {'joined': [], 'left': []})
+        for user_id, (username, before, after) in pending.items():
+            if before == after:
+                continue
+            key = 'joined' if after else 'left'
+            for friend_id in friend_graph.friend_ids(user_id):
+                deltas[friend_id][key].append(username)
+
+        recipients = presence_registry.online_among(list(deltas))
+        for friend_id in recipients:
+            socketio.emit('presence_delta', deltas[friend_id], to=get_user_room_name(friend_id))
+
+        count = presence_registry.online_count()
+        if count != self._last_count:
+            self._last_count = count
+            socketio.emit('online_count', count)
+        return len(recipients)
+
+    def _run(self):
+        while True:
+            socketio.sleep(self._app.config.get('PRESENCE_BROADCAST_INTERVAL', 2))
+            with self._app.app_context():
+                try:
+                    self.flush()
+                except Exception as e:
+                    logging.error(f"Falha ao enviar atualizações de presença: {e}")
+
+
+# Instância única usada pela aplicação
+presence_broadcaster = PresenceBroadcaster()
+
+# Quem estava conectado só a um worker que caiu também sai da lista dos amigos
+presence_registry.on_offline(lambda user_id, username: presence_broadcaster.user_changed(user_id, username, False))
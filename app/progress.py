@@ -0,0 +1,75 @@
+# app/progress.py
+
+from collections import namedtuple
+
+from sqlalchemy import func, select, and_
+
+from . import db
+from .models import Course, Lesson, Enrollment, lesson_completions
+
+
+CourseProgress = namedtuple('CourseProgress', ['course_id', 'total', 'completed', 'percent'])
+
+# Um curso inscrito no painel "meu aprendizado", sem o conteúdo das aulas
+LearningItem = namedtuple('LearningItem', ['course_id', 'title', 'category', 'average_rating',
+                                           'score', 'total', 'completed', 'percent'])
+
+
+def _percent(completed, total):
+    return round((completed / total) * 100) if total else 0
+
+
+def completed_lesson_ids(user_id):
+    """IDs das aulas concluídas pelo usuário, como um conjunto de inteiros."""
+    return set(db.session.scalars(
+        select(lesson_completions.c.lesson_id).where(lesson_completions.c.user_id == user_id)
+    ))
+
+
+def course_progress(user_id, course_ids=None):
+    """
+    Progresso do usuário por curso, em uma única consulta agrupada.
+    Sem `course_ids`, considera todos os cursos em que o usuário está inscrito.
+    Retorna {course_id: CourseProgress}.
+    """
+    if course_ids is None:
+        course_ids = select(Enrollment.course_id).where(Enrollment.user_id == user_id)
+    elif not course_ids:
+        return {}
+
+    rows = db.session.query(
+        Lesson.course_id,
+        func.count(Lesson.id),
+        func.count(lesson_completions.c.lesson_id)
+    ).outerjoin(
+        lesson_completions,
+        and_(lesson_completions.c.lesson_id == Lesson.id, lesson_completions.c.user_id == user_id)
+    ).filter(
+        Lesson.course_id.in_(course_ids)
+    ).group_by(Lesson.course_id).all()
+
+    return {
+        course_id: CourseProgress(course_id, total, completed, _percent(completed, total))
+        for course_id, total, completed in rows
+    }
+
+
+def learning_summary(user_id):
+    """Cursos inscritos do usuário com pontuação e progresso, em duas consultas."""
+    enrollments = db.session.query(
+        Course.id, Course.title, Course.category, Course.rating_sum, Course.rating_count, Enrollment.score
+    ).join(Enrollment, Enrollment.course_id == Course.id).filter(
+        Enrollment.user_id == user_id
+    ).order_by(Course.title.asc()).all()
+
+    progress = course_progress(user_id)
+    items = []
+    for course_id, title, category, rating_sum, rating_count, score in enrollments:
+        course_progress_row = progress.get(course_id, CourseProgress(course_id, 0, 0, 0))
+        items.append(LearningItem(
+            course_id, title, category,
+            round(rating_sum / rating_count, 1) if rating_count else 0,
+            score or 0,
+            course_progress_row.total, course_progress_row.completed, course_progress_row.percent
+        ))
+    return items
@@ -0,0 +1,139 @@
+# app/quizzes.py
+
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import event, select, inspect
+
+from . import db
+from .cache import shared_versions
+from .models import Quiz, Question, Answer, Lesson, QuizAttempt
+
+# Pontos por resposta certa
+POINTS_PER_QUESTION = 10
+
+# Gabarito compacto de um simulado: {id da pergunta: {id da resposta: é a correta?}}
+AnswerKey = namedtuple('AnswerKey', ['quiz_id', 'lesson_id', 'course_id', 'questions'])
+
+# Resultado da correção; `answers` só tem as escolhas válidas ({pergunta: resposta})
+GradeResult = namedtuple('GradeResult', ['total', 'correct', 'points', 'answers', 'invalid'])
+
+
+def _key(quiz_id):
+    return f'quiz_answer_key:{quiz_id}'
+
+
+def _version_name(quiz_id):
+    return f'quiz:{quiz_id}'
+
+
+def _load_answer_key(quiz_id):
+    rows = db.session.execute(
+        select(Quiz.id, Quiz.lesson_id, Lesson.course_id, Question.id, Answer.id, Answer.is_correct)
+        .join(Lesson, Lesson.id == Quiz.lesson_id)
+        .outerjoin(Question, Question.quiz_id == Quiz.id)
+        .outerjoin(Answer, Answer.question_id == Question.id)
+        .where(Quiz.id == quiz_id)
+    ).all()
+    if not rows:
+        return None
+
+    questions = {}
+    for _, _, _, question_id, answer_id, is_correct in rows:
+        if question_id is None:
+            continue
+        choices = questions.setdefault(question_id, {})
+        if answer_id is not None:
+            choices[answer_id] = bool(is_correct)
+    _, lesson_id, course_id = rows[0][:3]
+    return AnswerKey(quiz_id, lesson_id, course_id, questions)
+
+
+def answer_key(quiz_id):
+    """
+    Gabarito do simulado, carregado em uma única consulta e mantido em cache
+    até que uma pergunta ou resposta do simulado seja alterada (em qualquer
+    worker: a versão do gabarito é conferida a cada leitura). None se o
+    simulado não existir.
+    """
+    return shared_versions.cached(_key(quiz_id), _version_name(quiz_id), lambda: _load_answer_key(quiz_id),
+                                  current_app.config.get('QUIZ_KEY_CACHE_TIMEOUT', 3600))
+
+
+def invalidate_answer_key(*quiz_ids):
+    shared_versions.bump(*[_version_name(quiz_id) for quiz_id in quiz_ids])
+
+
+def grade(key, form):
+    """
+    Corrige em memória as respostas enviadas (campos `pergunta_<id>`).
+    Uma resposta que não pertence à pergunta (ou não existe) conta como
+    errada e é contada em `invalid`.
+    """
+    correct = invalid = 0
+    chosen = {}
+    for question_id, choices in key.questions.items():
+        value = form.get(f'pergunta_{question_id}')
+        if not value:
+            continue
+        try:
+            answer_id = int(value)
+        except ValueError:
+            answer_id = None
+        if answer_id not in choices:
+            invalid += 1
+            continue
+        chosen[str(question_id)] = answer_id
+        if choices[answer_id]:
+            correct += 1
+    return GradeResult(len(key.questions), correct, correct * POINTS_PER_QUESTION, chosen, invalid)
+
+
+def record_attempt(user_id, key, result):
+    """Adiciona à sessão o registro da tentativa; o commit fica com quem chamou."""
+    attempt = QuizAttempt(user_id=user_id, quiz_id=key.quiz_id, total_questions=result.total,
+                          correct_count=result.correct, points=result.points, answers=result.answers)
+    db.session.add(attempt)
+    return attempt
+
+
+# --- INVALIDAÇÃO DO GABARITO ---
+
+def _old_and_new(obj, attr):
+    """Valor atual do atributo e o anterior, se ele mudou nesta transação."""
+    history = inspect(obj).attrs[attr].history
+    return {value for value in (getattr(obj, attr), *history.deleted) if value is not None}
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_stale_keys(session, flush_context):
+    """
+    Anota os simulados cujas perguntas ou respostas mudaram (inclusive pelo
+    painel de administração). Os gabaritos saem do cache após o commit.
+    """
+    quiz_ids = set()
+    question_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Quiz):
+            quiz_ids.add(obj.id)
+        elif isinstance(obj, Question):
+            quiz_ids |= _old_and_new(obj, 'quiz_id')
+        elif isinstance(obj, Answer):
+            question_ids |= _old_and_new(obj, 'question_id')
+
+    if question_ids:
+        quiz_ids.update(session.scalars(select(Question.quiz_id).where(Question.id.in_(question_ids))))
+    if quiz_ids:
+        session.info.setdefault('stale_answer_keys', set()).update(quiz_ids)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_stale_keys(session):
+    quiz_ids = session.info.pop('stale_answer_keys', None)
+    if quiz_ids:
+        invalidate_answer_key(*quiz_ids)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_stale_keys(session):
+    session.info.pop('stale_answer_keys', None)
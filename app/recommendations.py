@@ -0,0 +1,179 @@
+# app/recommendations.py
+
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict, namedtuple
+from datetime import datetime
+from itertools import combinations
+
+from flask import current_app
+from sqlalchemy import select
+
+from . import db
+from .models import Course, Lesson, Enrollment, CourseRating, CourseLike, lesson_completions
+
+# Curso recomendado, com o curso do usuário que mais pesou na recomendação ("porque você fez X")
+Recommendation = namedtuple('Recommendation', ['course_id', 'score', 'because_id'])
+
+# Linha leve de curso usada nos cartões de recomendação
+CourseCard = namedtuple('CourseCard', ['id', 'title', 'category'])
+
+
+def interaction_weights():
+    """
+    Força da relação de cada usuário com cada curso, lida em quatro
+    consultas só de colunas: inscrição (+1), aulas concluídas no curso (+1),
+    avaliação (de -1 a +1, conforme as estrelas) e curtida (+1) ou
+    descurtida (-1). Retorna {user_id: {course_id: peso}}, só com pesos positivos.
+    """
+    weights = defaultdict(lambda: defaultdict(float))
+
+    for user_id, course_id in db.session.execute(select(Enrollment.user_id, Enrollment.course_id)):
+        weights[user_id][course_id] += 1.0
+
+    completed = db.session.execute(
+        select(lesson_completions.c.user_id, Lesson.course_id)
+        .join(Lesson, Lesson.id == lesson_completions.c.lesson_id)
+        .group_by(lesson_completions.c.user_id, Lesson.course_id)
+    )
+    for user_id, course_id in completed:
+        weights[user_id][course_id] += 1.0
+
+    for user_id, course_id, stars in db.session.execute(
+            select(CourseRating.user_id, CourseRating.course_id, CourseRating.stars)):
+        weights[user_id][course_id] += (stars - 3) / 2
+
+    for user_id, course_id, is_like in db.session.execute(
+            select(CourseLike.user_id, CourseLike.course_id, CourseLike.is_like)):
+        weights[user_id][course_id] += 1.0 if is_like else -1.0
+
+    return {
+        user_id: {course_id: weight for course_id, weight in courses.items() if weight > 0}
+        for user_id, courses in weights.items()
+    }
+
+
+def build_similarity(weights, neighbors=10):
+    """
+    Similaridade item-item (cosseno) entre cursos, a partir dos vetores
+    esparsos de usuários. Só pares de cursos com algum usuário em comum são
+    visitados (matriz de coocorrência esparsa em dicionários), e cada curso
+    guarda apenas os `neighbors` vizinhos mais parecidos.
+    Retorna {course_id: [(outro_course_id, similaridade), ...]}.
+    """
+    norms = defaultdict(float)
+    dots = defaultdict(lambda: defaultdict(float))
+    for courses in weights.values():
+        for course_id, weight in courses.items():
+            norms[course_id] += weight * weight
+        for (a, weight_a), (b, weight_b) in combinations(sorted(courses.items()), 2):
+            product = weight_a * weight_b
+            dots[a][b] += product
+            dots[b][a] += product
+
+    similarity = {}
+    for course_id, row in dots.items():
+        scored = [(other_id, dot / math.sqrt(norms[course_id] * norms[other_id]))
+                  for other_id, dot in row.items()]
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        similarity[course_id] = [(other_id, round(score, 4)) for other_id, score in scored[:neighbors]]
+    return similarity
+
+
+class CourseRecommender:
+    """
+    Índice de cursos semelhantes em memória, gerado offline (comando
+    `flask recommendations-rebuild`) e gravado em RECOMMENDATIONS_INDEX_PATH.
+
+    As requisições só fazem buscas em dicionário. O arquivo é carregado na
+    primeira consulta e recarregado quando muda no disco, o que é verificado
+    no máximo a cada RECOMMENDATIONS_RELOAD_INTERVAL segundos. Sem índice
+    gerado, as consultas simplesmente não retornam recomendações.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._neighbors = {}
+        self._mtime = None
+        self._checked_at = 0
+
+    def _path(self):
+        return current_app.config['RECOMMENDATIONS_INDEX_PATH']
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < current_app.config.get('RECOMMENDATIONS_RELOAD_INTERVAL', 60):
+            return
+        with self._lock:
+            self._checked_at = now
+            path = self._path()
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                self._neighbors, self._mtime = {}, None
+                return
+            if mtime == self._mtime:
+                return
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            self._neighbors = {
+                int(course_id): [tuple(item) for item in items]
+                for course_id, items in data['neighbors'].items()
+            }
+            self._mtime = mtime
+
+    def rebuild(self):
+        """Recalcula o índice a partir do banco e grava o arquivo. Retorna quantos cursos têm vizinhos."""
+        similarity = build_similarity(interaction_weights(),
+                                      current_app.config.get('RECOMMENDATIONS_NEIGHBORS', 10))
+        path = self._path()
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'built_at': datetime.utcnow().isoformat(), 'neighbors': similarity}, f)
+        # Troca atômica: um processo lendo o arquivo nunca vê um índice pela metade
+        os.replace(tmp_path, path)
+        self._checked_at = 0
+        return len(similarity)
+
+    def similar(self, course_id, limit=4):
+        """Cursos mais parecidos com `course_id`: lista de (course_id, similaridade)."""
+        self._maybe_reload()
+        return self._neighbors.get(course_id, [])[:limit]
+
+    def for_user(self, course_ids, limit=4):
+        """
+        Recomendações para quem fez os cursos `course_ids`: soma as
+        similaridades dos vizinhos de cada curso, ignora os que o usuário já
+        fez e guarda, para cada sugestão, o curso que mais contribuiu.
+        """
+        self._maybe_reload()
+        known = set(course_ids)
+        scores = defaultdict(float)
+        because = {}
+        for course_id in known:
+            for other_id, score in self._neighbors.get(course_id, []):
+                if other_id in known:
+                    continue
+                scores[other_id] += score
+                if other_id not in because or score > because[other_id][1]:
+                    because[other_id] = (course_id, score)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [Recommendation(other_id, round(score, 4), because[other_id][0]) for other_id, score in ranked]
+
+
+# Instância única usada pela aplicação
+course_recommender = CourseRecommender()
+
+
+def course_cards(course_ids):
+    """Título e categoria dos cursos, em uma consulta, sem a descrição. Retorna {id: CourseCard}."""
+    if not course_ids:
+        return {}
+    rows = db.session.execute(
+        select(Course.id, Course.title, Course.category).where(Course.id.in_(set(course_ids)))
+    )
+    return {row.id: CourseCard(*row) for row in rows}
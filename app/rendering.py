@@ -0,0 +1,131 @@
+# app/rendering.py
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import markdown
+from flask import current_app, has_app_context
+from sqlalchemy import event, select, update
+
+from . import db
+from .models import Course, Lesson, ForumTopic, ForumPost
+
+# Modelo -> (coluna em Markdown, coluna com o HTML pré-renderizado)
+RENDERED_COLUMNS = {
+    Course: ('description', 'description_html'),
+    Lesson: ('content', 'content_html'),
+    ForumTopic: ('content', 'content_html'),
+    ForumPost: ('content', 'content_html'),
+}
+
+
+class MarkdownCache:
+    """
+    Cache LRU do HTML gerado a partir de Markdown, indexado pelo hash do
+    texto: o mesmo conteúdo nunca é convertido duas vezes enquanto estiver
+    em cache, seja qual for a aula, tópico ou resposta de onde veio.
+
+    O limite é de memória (MARKDOWN_CACHE_MAX_BYTES, somando o tamanho do
+    HTML guardado), não de quantidade de entradas; ao passar do limite, as
+    entradas usadas há mais tempo saem primeiro.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def _max_bytes(self):
+        default = 16 * 1024 * 1024
+        return current_app.config.get('MARKDOWN_CACHE_MAX_BYTES', default) if has_app_context() else default
+
+    def render(self, text):
+        if not text:
+            return ''
+        key = hashlib.sha1(text.encode('utf-8')).digest()
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                return html
+
+        html = markdown.markdown(text)
+        self._store(key, html)
+        return html
+
+    def _store(self, key, html):
+        max_bytes = self._max_bytes()
+        size = len(html)
+        if size > max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = html
+            self._size += size
+            while self._size > max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+# Instância única usada pela aplicação
+markdown_cache = MarkdownCache()
+
+
+def render_markdown(text):
+    return markdown_cache.render(text)
+
+
+def rendered_html(obj):
+    """HTML do corpo do objeto: o pré-renderizado, se houver, ou o gerado (em cache) a partir do Markdown."""
+    source, target = RENDERED_COLUMNS[type(obj)]
+    return getattr(obj, target) or render_markdown(getattr(obj, source))
+
+
+# --- PRÉ-RENDERIZAÇÃO ---
+
+def prerender(obj):
+    """
+    Grava no objeto o HTML do corpo, para ser salvo junto com ele (painel de
+    administração e formulários do fórum). Objetos de outros modelos são ignorados.
+    """
+    columns = RENDERED_COLUMNS.get(type(obj))
+    if columns:
+        source, target = columns
+        setattr(obj, target, render_markdown(getattr(obj, source)))
+
+
+def prerender_missing(batch_size=200):
+    """Preenche o HTML das linhas que ainda não o têm. Retorna quantas linhas foram atualizadas."""
+    total = 0
+    for model, (source, target) in RENDERED_COLUMNS.items():
+        table = model.__table__
+        while True:
+            rows = db.session.execute(
+                select(table.c.id, table.c[source]).where(table.c[target].is_(None)).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            for row_id, text in rows:
+                db.session.execute(update(table).where(table.c.id == row_id)
+                                   .values({target: render_markdown(text)}))
+            db.session.commit()
+            total += len(rows)
+    return total
+
+
+def _clear_prerendered(target_column):
+    def _on_set(target, value, oldvalue, initiator):
+        # O HTML gravado deixa de valer; até ser pré-renderizado de novo, a leitura usa o cache
+        setattr(target, target_column, None)
+    return _on_set
+
+
+for _model, (_source, _target) in RENDERED_COLUMNS.items():
+    event.listen(getattr(_model, _source), 'set', _clear_prerendered(_target))
@@ -0,0 +1,315 @@
+# app/search.py
+
+import re
+import time
+from collections import namedtuple
+
+from markupsafe import Markup, escape
+from sqlalchemy import event, text, inspect, select, or_, false, bindparam, Integer
+from sqlalchemy.orm import undefer
+
+from . import db
+from .models import Course, Lesson, ForumTopic, ForumPost
+
+# Marcadores usados pelo banco para destacar os termos no trecho (snippet).
+# São trocados por <mark> somente depois de escapar o conteúdo do usuário.
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+
+# Tipo do documento -> (modelo, coluna de título, coluna de corpo)
+INDEXED_MODELS = {
+    'course': (Course, 'title', 'description'),
+    'lesson': (Lesson, 'title', 'content'),
+    'topic': (ForumTopic, 'title', 'content'),
+    'post': (ForumPost, None, 'content'),
+}
+_KIND_BY_MODEL = {model: kind for kind, (model, _, _) in INDEXED_MODELS.items()}
+
+# Código de cada tipo no rowid do índice FTS5 (rowid = ref_id * _KIND_SLOTS + código),
+# que permite achar o documento pela chave da tabela virtual. Um tipo novo exige
+# um código novo e `flask search-rebuild`.
+_KIND_CODES = {'course': 0, 'lesson': 1, 'topic': 2, 'post': 3}
+_KIND_SLOTS = 4
+
+# Intervalo (em segundos) para verificar de novo um índice que ainda não existia
+_INDEX_RECHECK_SECONDS = 60
+
+
+class SearchHit(namedtuple('SearchHit', ['kind', 'ref_id', 'title', 'snippet', 'rank'])):
+    __slots__ = ()
+
+    @property
+    def snippet_html(self):
+        html = str(escape(self.snippet or ''))
+        return Markup(html.replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>'))
+
+
+def _tokens(query):
+    return re.findall(r'\w+', query or '', re.UNICODE)
+
+
+def _document(obj):
+    kind = _KIND_BY_MODEL[type(obj)]
+    _, title_attr, body_attr = INDEXED_MODELS[kind]
+    return {
+        'kind': kind,
+        'ref_id': obj.id,
+        'title': getattr(obj, title_attr) if title_attr else '',
+        'body': getattr(obj, body_attr) or '',
+    }
+
+
+# --- BACKENDS ---
+
+class SQLiteSearchBackend:
+    """
+    Índice FTS5 (tabela virtual `search_index`), ranqueado por bm25. O rowid
+    de cada documento é derivado do tipo e do id de origem, então atualizar
+    ou remover um documento é uma busca pela chave, sem varrer o índice.
+    """
+
+    table = 'search_index'
+
+    def create(self, conn):
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            "kind UNINDEXED, ref_id UNINDEXED, title, body, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+
+    def drop(self, conn):
+        conn.execute(text('DROP TABLE IF EXISTS search_index'))
+
+    def _rowid(self, kind, ref_id):
+        return ref_id * _KIND_SLOTS + _KIND_CODES[kind]
+
+    def upsert(self, conn, docs):
+        if not docs:
+            return
+        # A versão anterior do documento, se houver, é substituída pelo rowid
+        conn.execute(text(
+            'INSERT OR REPLACE INTO search_index (rowid, kind, ref_id, title, body) '
+            'VALUES (:rowid, :kind, :ref_id, :title, :body)'
+        ), [{**doc, 'rowid': self._rowid(doc['kind'], doc['ref_id'])} for doc in docs])
+
+    def delete(self, conn, keys):
+        if keys:
+            conn.execute(text('DELETE FROM search_index WHERE rowid = :rowid'),
+                         [{'rowid': self._rowid(kind, ref_id)} for kind, ref_id in keys])
+
+    def _match(self, tokens):
+        # Cada termo vira uma busca por prefixo entre aspas, o que neutraliza a sintaxe do FTS5
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    def match_ids(self, kind, tokens):
+        # Parâmetros únicos: a mesma consulta pode ter várias destas subconsultas
+        return text(
+            'SELECT ref_id FROM search_index WHERE search_index MATCH :match AND kind = :kind'
+        ).bindparams(bindparam('match', self._match(tokens), unique=True),
+                     bindparam('kind', kind, unique=True)).columns(ref_id=Integer)
+
+    def search(self, conn, tokens, kinds, limit):
+        rows = conn.execute(text(
+            'SELECT kind, ref_id, title, '
+            "snippet(search_index, 3, :mark_start, :mark_end, '…', 16) AS snippet, "
+            'bm25(search_index, 0.0, 0.0, 5.0, 1.0) AS rank '
+            'FROM search_index WHERE search_index MATCH :match AND kind IN :kinds '
+            'ORDER BY rank LIMIT :limit'
+        ).bindparams(bindparam('kinds', expanding=True)), {
+            'match': self._match(tokens), 'kinds': list(kinds), 'limit': limit,
+            'mark_start': _MARK_START, 'mark_end': _MARK_END,
+        })
+        return [SearchHit(row.kind, int(row.ref_id), row.title, row.snippet, -row.rank) for row in rows]
+
+
+class PostgresSearchBackend:
+    """Tabela `search_documents` com coluna tsvector indexada por GIN, ranqueada por ts_rank."""
+
+    table = 'search_documents'
+    language = 'portuguese'
+
+    def create(self, conn):
+        conn.execute(text(
+            'CREATE TABLE IF NOT EXISTS search_documents ('
+            'kind VARCHAR(20) NOT NULL, ref_id INTEGER NOT NULL, '
+            "title TEXT NOT NULL DEFAULT '', body TEXT NOT NULL DEFAULT '', "
+            'document TSVECTOR NOT NULL, PRIMARY KEY (kind, ref_id))'
+        ))
+        conn.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_search_documents_document ON search_documents USING GIN (document)'
+        ))
+
+    def drop(self, conn):
+        conn.execute(text('DROP TABLE IF EXISTS search_documents'))
+
+    def upsert(self, conn, docs):
+        if not docs:
+            return
+        conn.execute(text(
+            'INSERT INTO search_documents (kind, ref_id, title, body, document) '
+            'VALUES (:kind, :ref_id, :title, :body, '
+            f"setweight(to_tsvector('{self.language}', :title), 'A') || "
+            f"setweight(to_tsvector('{self.language}', :body), 'B')) "
+            'ON CONFLICT (kind, ref_id) DO UPDATE SET '
+            'title = EXCLUDED.title, body = EXCLUDED.body, document = EXCLUDED.document'
+        ), docs)
+
+    def delete(self, conn, keys):
+        if keys:
+            conn.execute(text('DELETE FROM search_documents WHERE kind = :kind AND ref_id = :ref_id'),
+                         [{'kind': kind, 'ref_id': ref_id} for kind, ref_id in keys])
+
+    def _tsquery(self, tokens):
+        return ' & '.join(f'{token}:*' for token in tokens)
+
+    def match_ids(self, kind, tokens):
+        return text(
+            'SELECT ref_id FROM search_documents '
+            f"WHERE document @@ to_tsquery('{self.language}', :tsquery) AND kind = :kind"
+        ).bindparams(bindparam('tsquery', self._tsquery(tokens), unique=True),
+                     bindparam('kind', kind, unique=True)).columns(ref_id=Integer)
+
+    def search(self, conn, tokens, kinds, limit):
+        options = f'StartSel={_MARK_START}, StopSel={_MARK_END}, MaxWords=30, MinWords=10'
+        rows = conn.execute(text(
+            'SELECT kind, ref_id, title, '
+            f"ts_headline('{self.language}', body, query, :options) AS snippet, "
+            'ts_rank(document, query) AS rank '
+            f"FROM search_documents, to_tsquery('{self.language}', :tsquery) AS query "
+            'WHERE document @@ query AND kind IN :kinds '
+            'ORDER BY rank DESC LIMIT :limit'
+        ).bindparams(bindparam('kinds', expanding=True)), {
+            'tsquery': self._tsquery(tokens), 'kinds': list(kinds), 'limit': limit, 'options': options,
+        })
+        return [SearchHit(row.kind, row.ref_id, row.title, row.snippet, row.rank) for row in rows]
+
+
+_BACKENDS = {
+    'sqlite': SQLiteSearchBackend(),
+    'postgresql': PostgresSearchBackend(),
+}
+
+# Bancos (URL do engine) em que o índice já existe. Só o resultado positivo é
+# guardado; a ausência é verificada de novo a cada _INDEX_RECHECK_SECONDS, para
+# que uma migração ou `flask search-rebuild` feitos depois da inicialização
+# passem a valer sem reiniciar o processo.
+_index_ready = set()
+_index_checked_at = {}
+
+
+def _backend(conn):
+    """Retorna o backend do dialeto atual se o índice já existir, senão None."""
+    backend = _BACKENDS.get(conn.dialect.name)
+    if backend is None:
+        return None
+    key = str(conn.engine.url)
+    if key in _index_ready:
+        return backend
+    now = time.monotonic()
+    if now - _index_checked_at.get(key, float('-inf')) < _INDEX_RECHECK_SECONDS:
+        return None
+    _index_checked_at[key] = now
+    if not inspect(conn).has_table(backend.table):
+        return None
+    _index_ready.add(key)
+    return backend
+
+
+# --- CONSULTAS ---
+
+def match_ids(kind, query):
+    """
+    Subconsulta com os IDs dos documentos de `kind` que casam com a busca.
+    Sem índice disponível (outro banco ou índice ainda não criado), recorre a ILIKE.
+    """
+    tokens = _tokens(query)
+    model, title_attr, body_attr = INDEXED_MODELS[kind]
+    if not tokens:
+        return select(model.id).where(false())
+
+    backend = _backend(db.session.connection())
+    if backend is not None:
+        return backend.match_ids(kind, tokens)
+
+    columns = [getattr(model, attr) for attr in (title_attr, body_attr) if attr]
+    return select(model.id).where(or_(*[column.ilike(f'%{query}%') for column in columns]))
+
+
+def search(query, kinds=tuple(INDEXED_MODELS), limit=50):
+    """Busca ranqueada, com trechos destacados, nos tipos de documento pedidos."""
+    tokens = _tokens(query)
+    if not tokens:
+        return []
+
+    conn = db.session.connection()
+    backend = _backend(conn)
+    if backend is not None:
+        return backend.search(conn, tokens, kinds, limit)
+
+    hits = []
+    for kind in kinds:
+        model, title_attr, body_attr = INDEXED_MODELS[kind]
+        for obj in model.query.options(undefer(getattr(model, body_attr))) \
+                .filter(model.id.in_(match_ids(kind, query))).limit(limit):
+            doc = _document(obj)
+            hits.append(SearchHit(kind, obj.id, doc['title'], doc['body'][:200], 0))
+    return hits[:limit]
+
+
+# --- MANUTENÇÃO DO ÍNDICE ---
+
+def rebuild_index():
+    """Recria o índice de busca do zero. Retorna a quantidade de documentos indexados."""
+    total = 0
+    with db.engine.begin() as conn:
+        backend = _BACKENDS.get(conn.dialect.name)
+        if backend is None:
+            return 0
+        backend.drop(conn)
+        backend.create(conn)
+        for kind, (model, title_attr, body_attr) in INDEXED_MODELS.items():
+            columns = [model.id] + [getattr(model, attr) for attr in (title_attr, body_attr) if attr]
+            last_id = 0
+            while True:
+                # Lotes em ordem de id, para não carregar tabelas inteiras na memória
+                rows = conn.execute(
+                    select(*columns).where(model.id > last_id).order_by(model.id).limit(500)
+                ).all()
+                if not rows:
+                    break
+                backend.upsert(conn, [{
+                    'kind': kind,
+                    'ref_id': row[0],
+                    'title': row[1] if title_attr else '',
+                    'body': row[-1] or '',
+                } for row in rows])
+                total += len(rows)
+                last_id = rows[-1][0]
+        _index_ready.add(str(conn.engine.url))
+    return total
+
+
+def _indexed_fields_changed(obj):
+    kind = _KIND_BY_MODEL[type(obj)]
+    _, title_attr, body_attr = INDEXED_MODELS[kind]
+    state = inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in (title_attr, body_attr) if attr)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _update_index(session, flush_context):
+    """Mantém o índice em dia na mesma transação das escritas nos modelos indexados."""
+    upserts = [obj for obj in session.new if type(obj) in _KIND_BY_MODEL]
+    upserts += [obj for obj in session.dirty
+                if type(obj) in _KIND_BY_MODEL and _indexed_fields_changed(obj)]
+    deletes = [(_KIND_BY_MODEL[type(obj)], obj.id) for obj in session.deleted if type(obj) in _KIND_BY_MODEL]
+    if not upserts and not deletes:
+        return
+
+    conn = session.connection()
+    backend = _backend(conn)
+    if backend is None:
+        return
+    # Upserts e remoções localizam cada documento pela chave, sem varrer o índice
+    backend.upsert(conn, [_document(obj) for obj in upserts])
+    backend.delete(conn, deletes)
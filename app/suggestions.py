@@ -0,0 +1,132 @@
+# app/suggestions.py
+
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import select, func, union_all
+from sqlalchemy.orm import aliased
+
+from . import db
+from .cache import cache
+from .friends import friend_graph
+from .models import User, Friendship, Enrollment
+
+# Uma sugestão já pronta para o template
+Suggestion = namedtuple('Suggestion', ['user', 'mutual_friends', 'shared_courses'])
+
+# Peso de um amigo em comum em relação a um curso em comum na ordenação
+MUTUAL_FRIEND_WEIGHT = 3
+
+
+class PeopleSuggestions:
+    """
+    "Pessoas que você talvez conheça": usuários a dois passos no grafo de
+    amizades (amigos de amigos) e colegas de curso, ordenados pelo número de
+    amigos em comum e de cursos em comum.
+
+    Cada contagem vem de uma única consulta agrupada, limitada aos
+    SUGGESTIONS_CANDIDATES melhores candidatos, e o ranking resultante
+    (apenas IDs e contagens) fica em cache por usuário. As páginas são fatias
+    desse ranking; só os usuários da página são carregados do banco.
+    Pedidos de amizade feitos depois do cálculo são filtrados na leitura,
+    usando a vizinhança em cache do grafo de amizades.
+    """
+
+    def _key(self, user_id):
+        return f'people_suggestions:{user_id}'
+
+    def _config(self, key, default):
+        return current_app.config.get(key, default)
+
+    def _mutual_friend_counts(self, friend_ids, excluded, limit):
+        """{candidato: amigos em comum}, para quem é amigo de algum dos `friend_ids`."""
+        if not friend_ids:
+            return {}
+        edges = union_all(
+            select(Friendship.addressee_id.label('candidate_id'), Friendship.requester_id.label('via_id'))
+            .where(Friendship.requester_id.in_(friend_ids), Friendship.status == 'accepted'),
+            select(Friendship.requester_id, Friendship.addressee_id)
+            .where(Friendship.addressee_id.in_(friend_ids), Friendship.status == 'accepted'),
+        ).subquery()
+        total = func.count(func.distinct(edges.c.via_id))
+        rows = db.session.execute(
+            select(edges.c.candidate_id, total)
+            .where(edges.c.candidate_id.not_in(excluded))
+            .group_by(edges.c.candidate_id)
+            .order_by(total.desc(), edges.c.candidate_id)
+            .limit(limit)
+        )
+        return dict(rows.all())
+
+    def _shared_course_counts(self, user_id, excluded, limit):
+        """{candidato: cursos em comum}, para quem está inscrito em algum curso do usuário."""
+        mine = aliased(Enrollment)
+        theirs = aliased(Enrollment)
+        total = func.count(theirs.course_id)
+        rows = db.session.execute(
+            select(theirs.user_id, total)
+            .join(mine, mine.course_id == theirs.course_id)
+            .where(mine.user_id == user_id, theirs.user_id.not_in(excluded))
+            .group_by(theirs.user_id)
+            .order_by(total.desc(), theirs.user_id)
+            .limit(limit)
+        )
+        return dict(rows.all())
+
+    def _compute(self, user_id):
+        adjacency = friend_graph.adjacency(user_id)
+        excluded = list(adjacency.friends | adjacency.sent | adjacency.received | {user_id})
+        limit = self._config('SUGGESTIONS_CANDIDATES', 500)
+
+        mutual = self._mutual_friend_counts(list(adjacency.friends), excluded, limit)
+        shared = self._shared_course_counts(user_id, excluded, limit)
+
+        ranking = [(candidate_id, mutual.get(candidate_id, 0), shared.get(candidate_id, 0))
+                   for candidate_id in mutual.keys() | shared.keys()]
+        ranking.sort(key=lambda item: (-(item[1] * MUTUAL_FRIEND_WEIGHT + item[2]), item[0]))
+        return ranking[:limit]
+
+    def ranking(self, user_id):
+        """Lista de (id do candidato, amigos em comum, cursos em comum), da melhor sugestão para a pior."""
+        timeout = self._config('SUGGESTIONS_CACHE_TIMEOUT', 600)
+        return cache.get_or_set(self._key(user_id), lambda: self._compute(user_id), timeout)
+
+    def page(self, user_id, page=1, per_page=None):
+        """Retorna (sugestões da página, há_mais_páginas)."""
+        per_page = per_page or self._config('SUGGESTIONS_PER_PAGE', 6)
+        adjacency = friend_graph.adjacency(user_id)
+        connected = adjacency.friends | adjacency.sent | adjacency.received
+        ranking = [item for item in self.ranking(user_id) if item[0] not in connected]
+
+        start = (page - 1) * per_page
+        selected = ranking[start:start + per_page]
+        if not selected:
+            return [], False
+
+        users = {user.id: user for user in User.query.filter(User.id.in_([item[0] for item in selected]))}
+        suggestions = [Suggestion(users[candidate_id], mutual, shared)
+                       for candidate_id, mutual, shared in selected if candidate_id in users]
+        return suggestions, len(ranking) > start + per_page
+
+    def invalidate(self, *user_ids):
+        cache.delete(*[self._key(user_id) for user_id in user_ids])
+
+
+# Instância única usada pela aplicação
+people_suggestions = PeopleSuggestions()
+
+
+def community_page(user_id, after=None, per_page=30):
+    """
+    Página da lista de usuários em ordem alfabética, filtrada pela posição
+    (username do último usuário exibido), sem OFFSET. Retorna (usuários,
+    username a partir do qual começa a próxima página ou None).
+    """
+    query = User.query.filter(User.id != user_id)
+    if after:
+        query = query.filter(User.username > after)
+    users = query.order_by(User.username.asc()).limit(per_page + 1).all()
+    if len(users) > per_page:
+        users = users[:per_page]
+        return users, users[-1].username
+    return users, None
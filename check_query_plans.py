@@ -0,0 +1,208 @@
+"""
+Verifica os planos de execução das consultas mais frequentes da aplicação.
+
+Monta o esquema em um banco SQLite em memória pelas migrações do Alembic e
+confere se os índices criados por elas são os declarados em app/models.py.
+Depois roda EXPLAIN QUERY PLAN em cada consulta e termina com erro se alguma
+delas fizer varredura completa de tabela (SCAN sem índice) ou se os índices
+das migrações e dos modelos divergirem.
+
+Uso: python check_query_plans.py
+"""
+import sys
+from datetime import datetime, timedelta
+
+from alembic.script import ScriptDirectory
+from flask_migrate import stamp, upgrade, downgrade
+from sqlalchemy import select, func, or_, and_, inspect
+from sqlalchemy.orm import aliased
+
+from config import Config
+from app import create_app, db, migrate
+from app.models import User, Course, Lesson, Enrollment, CourseLike, Friendship, PrivateMessage, \
+    ContentSuggestion, ForumTopic, ForumPost, ActivityLog
+from app.catalog import course_page_query, encode_cursor
+from app.events import history_queries
+
+USER_ID = 1
+OTHER_ID = 2
+NOW = datetime.utcnow()
+
+# Última revisão anterior às migrações que criam índices. As tabelas mais
+# antigas vêm do create_all (o histórico não as cria do zero); só os índices
+# abaixo existiam nelas, todos os outros têm de vir das migrações.
+BASELINE_REVISION = '277dddb333f6'
+BASELINE_INDEXES = {'ix_private_messages_timestamp'}
+
+
+class CheckConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+def hot_queries():
+    """
+    (descrição, consulta). As consultas do chat e do catálogo são geradas
+    pelas próprias funções da aplicação; as demais seguem o formato usado
+    em main/routes.py e nos serviços.
+    """
+    cursor = encode_cursor(Course(created_at=NOW, id=100))
+    friends_sent = select(Friendship.addressee_id, Friendship.status).where(Friendship.requester_id == USER_ID)
+    mine, theirs = aliased(Enrollment), aliased(Enrollment)
+    friends_received = select(Friendship.requester_id, Friendship.status).where(Friendship.addressee_id == USER_ID)
+    return [
+        ('Mensagens não lidas por remetente',
+         select(User.username, func.count(PrivateMessage.id))
+         .join(PrivateMessage, User.id == PrivateMessage.sender_id)
+         .where(PrivateMessage.recipient_id == USER_ID, PrivateMessage.read == False)
+         .group_by(User.username)),
+        ('Marcar mensagens como lidas',
+         select(PrivateMessage.id).where(PrivateMessage.recipient_id == USER_ID,
+                                         PrivateMessage.sender_id == OTHER_ID,
+                                         PrivateMessage.read == False)),
+        *[(f'Histórico do chat (sentido {n})', query)
+          for n, query in enumerate(history_queries(USER_ID, OTHER_ID, limit=31), 1)],
+        *[(f'Histórico do chat (página anterior, sentido {n})', query)
+          for n, query in enumerate(history_queries(USER_ID, OTHER_ID, (NOW, 100), limit=31), 1)],
+        ('Grafo de amizades do usuário', friends_sent.union_all(friends_received)),
+        ('Amigos de amigos',
+         select(Friendship.addressee_id, Friendship.requester_id)
+         .where(Friendship.requester_id.in_([USER_ID, OTHER_ID]), Friendship.status == 'accepted')
+         .union_all(select(Friendship.requester_id, Friendship.addressee_id)
+                    .where(Friendship.addressee_id.in_([USER_ID, OTHER_ID]), Friendship.status == 'accepted'))),
+        ('Colegas de curso',
+         select(theirs.user_id, func.count(theirs.course_id))
+         .join(mine, mine.course_id == theirs.course_id)
+         .where(mine.user_id == USER_ID, theirs.user_id != USER_ID)
+         .group_by(theirs.user_id)),
+        ('Comunidade (página seguinte)',
+         select(User.id, User.username).where(User.id != USER_ID, User.username > 'ana')
+         .order_by(User.username.asc()).limit(31)),
+        ('Pedidos de amizade pendentes',
+         select(Friendship).where(Friendship.addressee_id == USER_ID, Friendship.status == 'pending')),
+        ('Catálogo de cursos (página seguinte)', course_page_query(cursor=cursor).statement),
+        ('Catálogo de cursos (busca, página seguinte)', course_page_query('motor', cursor).statement),
+        ('Aulas do curso',
+         select(Lesson.id, Lesson.title).where(Lesson.course_id == USER_ID).order_by(Lesson.id.asc())),
+        ('Ranking do curso',
+         select(Enrollment.user_id, Enrollment.score).where(Enrollment.course_id == USER_ID)
+         .order_by(Enrollment.score.desc())),
+        ('Curtidas do curso',
+         select(func.count()).where(CourseLike.course_id == USER_ID, CourseLike.is_like == True)),
+        ('Usuários online',
+         select(User.id, User.last_seen).where(User.last_seen > NOW - timedelta(minutes=5))),
+        ('Top 10 por pontuação',
+         select(User.id, User.username, User.score).order_by(User.score.desc()).limit(10)),
+        ('Minhas sugestões',
+         select(ContentSuggestion).where(ContentSuggestion.user_id == USER_ID)
+         .order_by(ContentSuggestion.created_at.desc())),
+        ('Tópicos da categoria (página seguinte)',
+         select(ForumTopic).where(ForumTopic.category_id == USER_ID, or_(
+             ForumTopic.created_at < NOW,
+             and_(ForumTopic.created_at == NOW, ForumTopic.id < 100)
+         )).order_by(ForumTopic.created_at.desc(), ForumTopic.id.desc()).limit(21)),
+        ('Respostas do tópico (página)',
+         select(ForumPost).where(ForumPost.topic_id == USER_ID)
+         .order_by(ForumPost.created_at.asc(), ForumPost.id.asc()).offset(40).limit(20)),
+        ('Atividades do perfil',
+         select(ActivityLog).where(ActivityLog.user_id == USER_ID).order_by(ActivityLog.created_at.desc())),
+    ]
+
+
+def full_scans(plan_rows):
+    """Linhas do plano que percorrem uma tabela inteira sem usar índice."""
+    return [detail for _, _, _, detail in plan_rows
+            if detail.startswith('SCAN ') and ' USING ' not in detail and 'CONSTANT ROW' not in detail
+            and not _virtual_table_lookup(detail)]
+
+
+def _virtual_table_lookup(detail):
+    # Ex.: "SCAN search_index VIRTUAL TABLE INDEX 0:M3" (busca no FTS5); sem restrição, fica "INDEX 0:"
+    return ' VIRTUAL TABLE INDEX ' in detail and not detail.endswith(':')
+
+
+def _head_revision():
+    """Topo da cadeia de migrações que passa pela revisão de referência."""
+    script = ScriptDirectory.from_config(migrate.get_config())
+    for head in script.get_heads():
+        if any(rev.revision == BASELINE_REVISION for rev in script.iterate_revisions(head, 'base')):
+            return head
+    raise RuntimeError(f'Nenhuma migração descende de {BASELINE_REVISION}')
+
+
+def _indexes(engine):
+    """{nome do índice: colunas} do banco."""
+    inspector = inspect(engine)
+    return {index['name']: tuple(index['column_names'])
+            for table in inspector.get_table_names() for index in inspector.get_indexes(table)}
+
+
+def _model_indexes():
+    return {index.name: tuple(column.name for column in index.columns)
+            for table in db.metadata.tables.values() for index in table.indexes}
+
+
+def build_schema():
+    """
+    Monta o esquema pelas migrações: cria as tabelas, volta até BASELINE_REVISION
+    (o que remove tudo o que as migrações criam) e aplica as migrações até o topo.
+    Retorna as divergências entre os índices resultantes e os dos modelos.
+    """
+    head = _head_revision()
+    db.create_all()
+    stamp(revision=head)
+    downgrade(revision=BASELINE_REVISION)
+    # Índice que sobrevive ao downgrade foi criado só pelo create_all: nenhuma migração o cria
+    problems = [f'{name}: declarado nos modelos, mas nenhuma migração o cria'
+                for name in sorted(set(_indexes(db.engine)) - BASELINE_INDEXES)]
+    upgrade(revision=head)
+
+    migrated, declared = _indexes(db.engine), _model_indexes()
+    for name in sorted(migrated.keys() | declared.keys()):
+        if name not in declared:
+            problems.append(f'{name}: criado pelas migrações, mas não declarado nos modelos')
+        elif migrated.get(name) != declared[name]:
+            problems.append(f'{name}: colunas {migrated.get(name)} nas migrações e {declared[name]} nos modelos')
+    return problems
+
+
+def check():
+    app = create_app(CheckConfig)
+    with app.app_context():
+        return _check()
+
+
+def _check():
+    failures = 0
+    for problem in build_schema():
+        failures += 1
+        print(f"[FALHA] Índice divergente: {problem}")
+
+    with db.engine.connect() as conn:
+        for description, statement in hot_queries():
+            compiled = statement.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+            params = compiled.construct_params()
+            rows = conn.exec_driver_sql(
+                'EXPLAIN QUERY PLAN ' + str(compiled),
+                tuple(params[name] for name in compiled.positiontup)
+            ).all()
+
+            scans = full_scans(rows)
+            if scans:
+                failures += 1
+                print(f"[FALHA] {description}")
+                for detail in scans:
+                    print(f"        {detail}")
+            else:
+                print(f"[OK]    {description}")
+                for row in rows:
+                    print(f"        {row[3]}")
+
+    if failures:
+        print(f"\n{failures} falha(s): índices divergentes ou consultas com varredura completa de tabela.")
+        return 1
+    print("\nNenhuma consulta frequente faz varredura completa de tabela.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(check())
@@ -21,6 +21,100 @@ class Config:
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Tempo (em segundos) que os dados globais dos templates ficam em cache
+    # (mensagens não lidas, lista de amigos e ranking).
+    CONTEXT_CACHE_TIMEOUT = int(os.environ.get('CONTEXT_CACHE_TIMEOUT') or 300)
+
+    # Intervalo (em segundos) para recarregar o ranking em memória a partir do banco.
+    LEADERBOARD_REFRESH_SECONDS = int(os.environ.get('LEADERBOARD_REFRESH_SECONDS') or 300)
+
+    # Presença: janela para considerar alguém online e intervalo (em segundos)
+    # entre as gravações em lote do last_seen.
+    ONLINE_WINDOW_MINUTES = 5
+    PRESENCE_FLUSH_INTERVAL = int(os.environ.get('PRESENCE_FLUSH_INTERVAL') or 30)
+
+    # Com mais de um worker, as conexões do Socket.IO ficam registradas em um
+    # armazenamento compartilhado (Redis) e os emits passam pela fila de mensagens.
+    # Sem essas variáveis, tudo fica no próprio processo (o pacote redis só é
+    # necessário quando elas estão definidas).
+    PRESENCE_STORE_URL = os.environ.get('PRESENCE_STORE_URL')
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+
+    # Com o armazenamento compartilhado, cada worker renova um sinal de vida
+    # a cada PRESENCE_HEARTBEAT_INTERVAL segundos, válido por PRESENCE_WORKER_TTL;
+    # as conexões de um worker cujo sinal expirou são removidas pelos demais.
+    PRESENCE_HEARTBEAT_INTERVAL = 10
+    PRESENCE_WORKER_TTL = 30
+
+    # Janela (em segundos) em que entradas e saídas são agrupadas antes de
+    # serem enviadas aos amigos de cada usuário.
+    PRESENCE_BROADCAST_INTERVAL = 2
+
+    # Quantidade de cursos por página no catálogo (rolagem infinita).
+    COURSES_PER_PAGE = 12
+
+    # Comunidade: usuários por página na lista geral e, nas sugestões de
+    # "pessoas que você talvez conheça", sugestões por página, candidatos
+    # considerados por cálculo e validade (em segundos) do ranking em cache.
+    USERS_PER_PAGE = 30
+    SUGGESTIONS_PER_PAGE = 6
+    SUGGESTIONS_CANDIDATES = 500
+    SUGGESTIONS_CACHE_TIMEOUT = int(os.environ.get('SUGGESTIONS_CACHE_TIMEOUT') or 600)
+
+    # Recomendações de cursos (app/recommendations.py): arquivo do índice gerado
+    # por `flask recommendations-rebuild`, vizinhos guardados por curso e
+    # intervalo (em segundos) entre as verificações de um índice novo no disco.
+    RECOMMENDATIONS_INDEX_PATH = os.environ.get('RECOMMENDATIONS_INDEX_PATH') or \
+        os.path.join(basedir, 'course_similarity.json')
+    RECOMMENDATIONS_NEIGHBORS = 10
+    RECOMMENDATIONS_RELOAD_INTERVAL = 60
+
+    # Validade (em segundos) do gabarito de cada simulado em cache; ele também
+    # sai do cache assim que uma pergunta ou resposta do simulado é alterada.
+    QUIZ_KEY_CACHE_TIMEOUT = 3600
+
+    # Fórum: tópicos por página em uma categoria, respostas por página em um
+    # tópico e intervalo (em segundos) entre as gravações em lote das
+    # visualizações dos tópicos.
+    FORUM_TOPICS_PER_PAGE = 20
+    FORUM_POSTS_PER_PAGE = 20
+    FORUM_VIEWS_FLUSH_INTERVAL = 10
+
+    # Cache de respostas HTTP (app/http_cache.py): validade (em segundos) da
+    # página inicial guardada para os visitantes anônimos.
+    RESPONSE_CACHE_PUBLIC_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_PUBLIC_TIMEOUT') or 60)
+
+    # Memória máxima (em bytes) do cache do HTML gerado a partir do Markdown
+    # de cursos, aulas e fórum.
+    MARKDOWN_CACHE_MAX_BYTES = int(os.environ.get('MARKDOWN_CACHE_MAX_BYTES') or 16 * 1024 * 1024)
+
+    # Quantidade de mensagens enviadas por vez no histórico do chat privado.
+    CHAT_HISTORY_PAGE_SIZE = 30
+
+    # Log de atividades: intervalo (em segundos) entre as gravações em lote,
+    # limite do buffer em memória, itens por página no perfil e por quantos
+    # dias os eventos brutos são mantidos antes de virarem contagens diárias.
+    ACTIVITY_FLUSH_INTERVAL = 10
+    ACTIVITY_BUFFER_MAX = 1000
+    ACTIVITY_PAGE_SIZE = 20
+    ACTIVITY_RETENTION_DAYS = int(os.environ.get('ACTIVITY_RETENTION_DAYS') or 90)
+
+    # Fila de saída de e-mails (app/email.py): tamanho do pool de workers, e-mails
+    # por conexão SMTP, intervalo de verificação da fila, tentativas com espera
+    # exponencial, janela de deduplicação, limite de e-mails por destinatário por hora,
+    # máximo de e-mails aguardando envio, tempo após o qual um e-mail preso em envio
+    # volta à fila e intervalo dessa verificação.
+    EMAIL_WORKERS = int(os.environ.get('EMAIL_WORKERS') or 2)
+    EMAIL_BATCH_SIZE = 20
+    EMAIL_POLL_INTERVAL = 3
+    EMAIL_MAX_ATTEMPTS = 5
+    EMAIL_RETRY_BASE_SECONDS = 30
+    EMAIL_DEDUP_SECONDS = 600
+    EMAIL_RATE_LIMIT = 5
+    EMAIL_OUTBOX_MAX_PENDING = int(os.environ.get('EMAIL_OUTBOX_MAX_PENDING') or 1000)
+    EMAIL_STALE_SENDING_SECONDS = 600
+    EMAIL_RECOVER_INTERVAL = 60
+
     # (O restante das configurações de e-mail permanece o mesmo)
     MAIL_SERVER = os.environ.get('MAIL_SERVER') or 'sandbox.smtp.mailtrap.io'
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 2525)
@@ -0,0 +1,32 @@
+"""Adiciona contador de respostas ao tópico
+
+Revision ID: 0a7e5c3d9b14
+Revises: f3b9d6e2a7c1
+Create Date: 2026-10-17 20:05:33.417958
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a7e5c3d9b14'
+down_revision = 'f3b9d6e2a7c1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('forum_topics', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('post_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Povoa o contador com as respostas já existentes
+    op.execute(
+        'UPDATE forum_topics SET '
+        'post_count = (SELECT COUNT(*) FROM forum_posts WHERE forum_posts.topic_id = forum_topics.id)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('forum_topics', schema=None) as batch_op:
+        batch_op.drop_column('post_count')
@@ -0,0 +1,70 @@
+"""Adiciona resumo de atividade ao fórum
+
+Revision ID: 1b4f8e2c6d93
+Revises: 0a7e5c3d9b14
+Create Date: 2026-10-17 21:18:06.772145
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1b4f8e2c6d93'
+down_revision = '0a7e5c3d9b14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('forum_topics', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_post_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('last_post_user_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_forum_topics_last_post_user_id', 'users',
+                                    ['last_post_user_id'], ['id'], ondelete='SET NULL')
+        # A paginação por cursor da categoria ordena por (created_at, id)
+        batch_op.drop_index('ix_forum_topics_category_created')
+        batch_op.create_index('ix_forum_topics_category_created', ['category_id', 'created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('forum_categories', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('topic_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('post_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('last_post_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('last_post_user_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_forum_categories_last_post_user_id', 'users',
+                                    ['last_post_user_id'], ['id'], ondelete='SET NULL')
+
+    # Povoa os resumos com os dados já existentes: primeiro os tópicos, depois as categorias
+    op.execute(
+        'UPDATE forum_topics SET '
+        'last_post_at = COALESCE((SELECT p.created_at FROM forum_posts p WHERE p.topic_id = forum_topics.id '
+        'ORDER BY p.created_at DESC, p.id DESC LIMIT 1), forum_topics.created_at), '
+        'last_post_user_id = COALESCE((SELECT p.user_id FROM forum_posts p WHERE p.topic_id = forum_topics.id '
+        'ORDER BY p.created_at DESC, p.id DESC LIMIT 1), forum_topics.user_id)'
+    )
+    op.execute(
+        'UPDATE forum_categories SET '
+        'topic_count = (SELECT COUNT(*) FROM forum_topics t WHERE t.category_id = forum_categories.id), '
+        'post_count = (SELECT COALESCE(SUM(t.post_count), 0) FROM forum_topics t '
+        'WHERE t.category_id = forum_categories.id), '
+        'last_post_at = (SELECT t.last_post_at FROM forum_topics t WHERE t.category_id = forum_categories.id '
+        'ORDER BY t.last_post_at DESC, t.id DESC LIMIT 1), '
+        'last_post_user_id = (SELECT t.last_post_user_id FROM forum_topics t '
+        'WHERE t.category_id = forum_categories.id ORDER BY t.last_post_at DESC, t.id DESC LIMIT 1)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('forum_categories', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_forum_categories_last_post_user_id', type_='foreignkey')
+        batch_op.drop_column('last_post_user_id')
+        batch_op.drop_column('last_post_at')
+        batch_op.drop_column('post_count')
+        batch_op.drop_column('topic_count')
+
+    with op.batch_alter_table('forum_topics', schema=None) as batch_op:
+        batch_op.drop_index('ix_forum_topics_category_created')
+        batch_op.create_index('ix_forum_topics_category_created', ['category_id', 'created_at'], unique=False)
+        batch_op.drop_constraint('fk_forum_topics_last_post_user_id', type_='foreignkey')
+        batch_op.drop_column('last_post_user_id')
+        batch_op.drop_column('last_post_at')
@@ -0,0 +1,46 @@
+"""Adiciona HTML pré-renderizado ao conteúdo
+
+Revision ID: 2c7a9e4f1b58
+Revises: 1b4f8e2c6d93
+Create Date: 2026-10-17 22:41:53.208417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c7a9e4f1b58'
+down_revision = '1b4f8e2c6d93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # As colunas começam vazias; `flask markdown-prerender` preenche as linhas existentes
+    # (até lá, as páginas convertem o Markdown na leitura, com cache em memória)
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('description_html', sa.Text(), nullable=True))
+
+    with op.batch_alter_table('lessons', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_html', sa.Text(), nullable=True))
+
+    with op.batch_alter_table('forum_topics', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_html', sa.Text(), nullable=True))
+
+    with op.batch_alter_table('forum_posts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_html', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('forum_posts', schema=None) as batch_op:
+        batch_op.drop_column('content_html')
+
+    with op.batch_alter_table('forum_topics', schema=None) as batch_op:
+        batch_op.drop_column('content_html')
+
+    with op.batch_alter_table('lessons', schema=None) as batch_op:
+        batch_op.drop_column('content_html')
+
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.drop_column('description_html')
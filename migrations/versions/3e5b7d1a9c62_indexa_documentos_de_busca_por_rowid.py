@@ -0,0 +1,46 @@
+"""Indexa documentos de busca por rowid
+
+Revision ID: 3e5b7d1a9c62
+Revises: 2c7a9e4f1b58
+Create Date: 2026-10-18 09:12:27.604318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e5b7d1a9c62'
+down_revision = '2c7a9e4f1b58'
+branch_labels = None
+depends_on = None
+
+
+# Mesmos códigos de app/search.py: rowid = ref_id * 4 + código do tipo
+ROWID = ("ref_id * 4 + CASE kind WHEN 'course' THEN 0 WHEN 'lesson' THEN 1 "
+         "WHEN 'topic' THEN 2 ELSE 3 END")
+
+
+def upgrade():
+    # Só o índice FTS5 do SQLite muda: os documentos passam a ser localizados pelo
+    # rowid, em vez de filtrar as colunas UNINDEXED kind e ref_id (varredura completa).
+    # No PostgreSQL a chave primária (kind, ref_id) já cumpre esse papel.
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite' or not sa.inspect(bind).has_table('search_index'):
+        return
+    op.execute(
+        "CREATE VIRTUAL TABLE search_index_new USING fts5("
+        "kind UNINDEXED, ref_id UNINDEXED, title, body, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    op.execute(
+        f'INSERT INTO search_index_new (rowid, kind, ref_id, title, body) '
+        f'SELECT {ROWID}, kind, ref_id, title, body FROM search_index'
+    )
+    op.execute('DROP TABLE search_index')
+    op.execute('ALTER TABLE search_index_new RENAME TO search_index')
+
+
+def downgrade():
+    # A versão anterior localiza os documentos por kind e ref_id, com qualquer rowid
+    pass
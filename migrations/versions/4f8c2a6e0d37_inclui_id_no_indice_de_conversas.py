@@ -0,0 +1,31 @@
+"""Inclui id no índice de conversas
+
+Revision ID: 4f8c2a6e0d37
+Revises: 3e5b7d1a9c62
+Create Date: 2026-10-18 09:47:02.915733
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f8c2a6e0d37'
+down_revision = '3e5b7d1a9c62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # O histórico do chat pagina cada sentido da conversa por (timestamp, id)
+    with op.batch_alter_table('private_messages', schema=None) as batch_op:
+        batch_op.drop_index('ix_private_messages_conversation')
+        batch_op.create_index('ix_private_messages_conversation',
+                              ['sender_id', 'recipient_id', 'timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('private_messages', schema=None) as batch_op:
+        batch_op.drop_index('ix_private_messages_conversation')
+        batch_op.create_index('ix_private_messages_conversation',
+                              ['sender_id', 'recipient_id', 'timestamp'], unique=False)
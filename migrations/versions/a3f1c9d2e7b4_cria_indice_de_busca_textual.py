@@ -0,0 +1,46 @@
+"""Cria índice de busca textual
+
+Revision ID: a3f1c9d2e7b4
+Revises: 277dddb333f6
+Create Date: 2026-10-17 10:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f1c9d2e7b4'
+down_revision = '277dddb333f6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # O índice fica fora dos modelos: FTS5 no SQLite, tsvector + GIN no PostgreSQL.
+    # Depois da migração, povoe o índice com `flask search-rebuild`.
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            "kind UNINDEXED, ref_id UNINDEXED, title, body, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    elif dialect == 'postgresql':
+        op.execute(
+            'CREATE TABLE IF NOT EXISTS search_documents ('
+            'kind VARCHAR(20) NOT NULL, ref_id INTEGER NOT NULL, '
+            "title TEXT NOT NULL DEFAULT '', body TEXT NOT NULL DEFAULT '', "
+            'document TSVECTOR NOT NULL, PRIMARY KEY (kind, ref_id))'
+        )
+        op.execute(
+            'CREATE INDEX IF NOT EXISTS ix_search_documents_document ON search_documents USING GIN (document)'
+        )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS search_index')
+    elif dialect == 'postgresql':
+        op.execute('DROP TABLE IF EXISTS search_documents')
@@ -0,0 +1,49 @@
+"""Adiciona contadores denormalizados ao curso
+
+Revision ID: b7d2e4a91c3f
+Revises: a3f1c9d2e7b4
+Create Date: 2026-10-17 11:02:17.845120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e4a91c3f'
+down_revision = 'a3f1c9d2e7b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('likes_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('dislikes_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('enrollment_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Povoa os contadores com os dados já existentes
+    op.execute(
+        'UPDATE courses SET '
+        'likes_count = (SELECT COUNT(*) FROM course_likes '
+        'WHERE course_likes.course_id = courses.id AND course_likes.is_like = true), '
+        'dislikes_count = (SELECT COUNT(*) FROM course_likes '
+        'WHERE course_likes.course_id = courses.id AND course_likes.is_like = false), '
+        'rating_sum = (SELECT COALESCE(SUM(stars), 0) FROM course_ratings '
+        'WHERE course_ratings.course_id = courses.id), '
+        'rating_count = (SELECT COUNT(*) FROM course_ratings '
+        'WHERE course_ratings.course_id = courses.id), '
+        'enrollment_count = (SELECT COUNT(*) FROM enrollments '
+        'WHERE enrollments.course_id = courses.id)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.drop_column('enrollment_count')
+        batch_op.drop_column('rating_count')
+        batch_op.drop_column('rating_sum')
+        batch_op.drop_column('dislikes_count')
+        batch_op.drop_column('likes_count')
@@ -0,0 +1,56 @@
+"""Adiciona índices para as consultas frequentes
+
+Revision ID: c4e8f2a61d05
+Revises: b7d2e4a91c3f
+Create Date: 2026-10-17 14:26:41.503217
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8f2a61d05'
+down_revision = 'b7d2e4a91c3f'
+branch_labels = None
+depends_on = None
+
+
+# (nome do índice, tabela, colunas) — os mesmos declarados em app/models.py
+INDEXES = [
+    ('ix_users_score', 'users', ['score']),
+    ('ix_users_last_seen', 'users', ['last_seen']),
+    ('ix_courses_created_at_id', 'courses', ['created_at', 'id']),
+    ('ix_lessons_course_id', 'lessons', ['course_id']),
+    ('ix_enrollments_course_score', 'enrollments', ['course_id', 'score']),
+    ('ix_course_ratings_course_id', 'course_ratings', ['course_id']),
+    ('ix_course_likes_course_like', 'course_likes', ['course_id', 'is_like']),
+    ('ix_friendships_requester_status', 'friendships', ['requester_id', 'status', 'addressee_id']),
+    ('ix_friendships_addressee_status', 'friendships', ['addressee_id', 'status', 'requester_id']),
+    ('ix_private_messages_recipient_read', 'private_messages', ['recipient_id', 'read', 'sender_id']),
+    ('ix_private_messages_conversation', 'private_messages', ['sender_id', 'recipient_id', 'timestamp']),
+    ('ix_content_suggestions_user_created', 'content_suggestions', ['user_id', 'created_at']),
+    ('ix_forum_topics_category_created', 'forum_topics', ['category_id', 'created_at']),
+    ('ix_forum_posts_topic_created', 'forum_posts', ['topic_id', 'created_at']),
+    ('ix_activity_logs_user_created', 'activity_logs', ['user_id', 'created_at']),
+]
+
+
+def _existing_tables():
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def upgrade():
+    # As tabelas do fórum, do log de atividades e de curtidas podem ter sido
+    # criadas só pelo db.create_all(); nesse caso o próprio create_all já cria os índices.
+    tables = _existing_tables()
+    for name, table, columns in INDEXES:
+        if table in tables:
+            op.create_index(name, table, columns, unique=False, if_not_exists=True)
+
+
+def downgrade():
+    tables = _existing_tables()
+    for name, table, columns in reversed(INDEXES):
+        if table in tables:
+            op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,31 @@
+"""Cria resumo diário de atividades
+
+Revision ID: e2f7c4d91a08
+Revises: d6a3b8e05f27
+Create Date: 2026-10-17 16:37:52.118904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2f7c4d91a08'
+down_revision = 'd6a3b8e05f27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('activity_rollups',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('event_type', sa.String(length=50), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'event_type', 'day')
+    )
+
+
+def downgrade():
+    op.drop_table('activity_rollups')
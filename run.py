@@ -5,6 +5,13 @@ eventlet.monkey_patch()
 
 from app import create_app, db, socketio
 from app.models import User, Course, Lesson, Quiz, Question, Answer, Friendship, Enrollment, ContentSuggestion
+from app.search import rebuild_index
+from app.catalog import reconcile_counters
+from app.forum import reconcile_forum_counters
+from app.email import email_outbox
+from app.activity import compact_activity
+from app.recommendations import course_recommender
+from app.rendering import prerender_missing
 from werkzeug.security import generate_password_hash
 import click
 
@@ -211,10 +218,97 @@ def seed_all_command():
     _create_users()
     _create_courses_and_lessons()
     _create_social_features()
+
+    click.echo('Pré-renderizando conteúdo em Markdown...')
+    prerender_missing()
+
+    click.echo('Indexando conteúdo para a busca...')
+    rebuild_index()
     
     click.secho('*** BANCO DE DADOS POVOADO COM SUCESSO! ***', fg='green')
 
 
+@app.cli.command('search-rebuild')
+def search_rebuild_command():
+    """
+    Recria o índice de busca textual (cursos, aulas, tópicos e respostas do fórum).
+    Usa FTS5 no SQLite e tsvector/GIN no PostgreSQL.
+    """
+    click.echo('Recriando índice de busca...')
+    total = rebuild_index()
+    click.secho(f'*** ÍNDICE DE BUSCA RECRIADO: {total} DOCUMENTOS ***', fg='green')
+
+
+@app.cli.command('reconcile-counters')
+def reconcile_counters_command():
+    """
+    Recalcula os contadores denormalizados dos cursos (curtidas, avaliações e
+    inscrições) e do fórum (respostas e última atividade de tópicos e
+    categorias) a partir das tabelas de origem, corrigindo divergências.
+    """
+    click.echo('Conferindo contadores dos cursos...')
+    total = reconcile_counters()
+    click.echo('Conferindo contadores do fórum...')
+    topics, categories = reconcile_forum_counters()
+    click.secho(f'*** {total} CURSO(S), {topics} TÓPICO(S) E {categories} CATEGORIA(S) DO FÓRUM '
+                f'CORRIGIDO(S) ***', fg='green')
+
+
+@app.cli.command('activity-compact')
+@click.option('--days', type=int, default=None, help='Dias de eventos brutos a manter (padrão: ACTIVITY_RETENTION_DAYS).')
+def activity_compact_command(days):
+    """
+    Aplica a política de retenção do log de atividades: eventos mais antigos
+    que o limite viram contagens diárias por usuário e tipo e são apagados.
+    """
+    days = days if days is not None else app.config['ACTIVITY_RETENTION_DAYS']
+    click.echo(f'Compactando atividades com mais de {days} dias...')
+    compacted, rollups = compact_activity(days)
+    click.secho(f'*** {compacted} ATIVIDADE(S) AGREGADA(S) EM {rollups} RESUMO(S) ***', fg='green')
+
+
+@app.cli.command('recommendations-rebuild')
+def recommendations_rebuild_command():
+    """
+    Recalcula o índice de cursos semelhantes (filtragem colaborativa item a
+    item sobre inscrições, aulas concluídas, avaliações e curtidas) e grava
+    o arquivo lido pelos servidores em RECOMMENDATIONS_INDEX_PATH.
+    """
+    click.echo('Calculando similaridade entre cursos...')
+    total = course_recommender.rebuild()
+    click.secho(f'*** ÍNDICE DE RECOMENDAÇÕES GERADO: {total} CURSO(S) ***', fg='green')
+
+
+@app.cli.command('markdown-prerender')
+def markdown_prerender_command():
+    """
+    Converte para HTML o corpo dos cursos, aulas, tópicos e respostas que
+    ainda não têm a versão pré-renderizada (ex.: conteúdo anterior à coluna).
+    """
+    click.echo('Pré-renderizando conteúdo em Markdown...')
+    total = prerender_missing()
+    click.secho(f'*** {total} REGISTRO(S) PRÉ-RENDERIZADO(S) ***', fg='green')
+
+
+@app.cli.command('send-emails')
+def send_emails_command():
+    """
+    Envia agora todos os e-mails vencidos da fila de saída, em lotes que
+    reaproveitam a conexão SMTP. Útil para esvaziar a fila fora do servidor.
+    """
+    email_outbox.recover_stale()
+    total_sent = total_failed = 0
+    while True:
+        sent, failed = email_outbox.process_due()
+        if not sent and not failed:
+            break
+        total_sent += sent
+        total_failed += failed
+    click.secho(f'*** {total_sent} E-MAIL(S) ENVIADO(S), {total_failed} FALHA(S) ***', fg='green')
+
+
 if __name__ == '__main__':
+    # Workers da fila de e-mails (envia também o que ficou pendente antes de reiniciar)
+    email_outbox.start(app)
     # Agora usamos socketio.run() para iniciar o servidor correto
     socketio.run(app, debug=True, host='0.0.0.0', port=5000)
@@ -1,5 +1,8 @@
 from app import create_app, db
 from app.models import User, Course, Lesson, Quiz, Question, Answer, Friendship, Enrollment, ContentSuggestion, ForumCategory, ForumTopic, ForumPost, ActivityLog
+from app.search import rebuild_index
+from app.forum import reconcile_forum_counters
+from app.rendering import prerender_missing
 from werkzeug.security import generate_password_hash
 from datetime import datetime
 
@@ -192,6 +195,15 @@ def populate():
             db.session.add(ActivityLog(user=user_bruno, event_type='new_friend', details='Agora é amigo de ana.silva'))
 
         db.session.commit()
+
+        print("Calculando contadores do fórum...")
+        reconcile_forum_counters()
+
+        print("Pré-renderizando conteúdo em Markdown...")
+        prerender_missing()
+
+        print("Indexando conteúdo para a busca...")
+        rebuild_index()
         print("*** SUCESSO! Banco de dados recriado e povoado. ***")
 
 if __name__ == '__main__':
@@ -0,0 +1,51 @@
+# tests/test_cache.py
+
+import unittest
+
+from app.cache import LocalStore, SharedVersions, cache
+
+
+class SharedVersionsTest(unittest.TestCase):
+    """Versões compartilhadas: dois SharedVersions sobre o mesmo armazenamento fazem o papel de dois workers."""
+
+    def setUp(self):
+        cache.clear()
+        store = LocalStore()
+        self.worker_a = SharedVersions(store)
+        self.worker_b = SharedVersions(store)
+        self.loads = 0
+
+    def _load(self):
+        self.loads += 1
+        return {'bruno': self.loads}
+
+    def test_new_versions_do_not_start_at_zero(self):
+        version = self.worker_a.get('x')
+        self.assertGreater(version, 0)
+        self.assertEqual(self.worker_b.get('x'), version)
+
+    def test_cached_value_is_reused_until_bump(self):
+        self.worker_a.cached('k', 'v', self._load)
+        self.worker_a.cached('k', 'v', self._load)
+        self.assertEqual(self.loads, 1)
+
+    def test_bump_from_another_worker_invalidates(self):
+        self.worker_a.cached('k', 'v', self._load)
+        self.worker_b.bump('v')
+        self.assertEqual(self.worker_a.cached('k', 'v', self._load), {'bruno': 2})
+
+    def test_update_keeps_entry_valid(self):
+        self.worker_a.cached('k', 'v', self._load)
+        self.worker_a.update('k', 'v', lambda counts: {**counts, 'carla': 1})
+        self.assertEqual(self.worker_a.cached('k', 'v', self._load), {'bruno': 1, 'carla': 1})
+        self.assertEqual(self.loads, 1)
+
+    def test_update_on_stale_entry_reloads(self):
+        self.worker_a.cached('k', 'v', self._load)
+        self.worker_b.bump('v')
+        self.worker_a.update('k', 'v', lambda counts: {**counts, 'carla': 1})
+        self.assertEqual(self.worker_a.cached('k', 'v', self._load), {'bruno': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+# tests/test_email.py
+
+import logging
+import socket
+import unittest
+from datetime import datetime, timedelta
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:  # dependência só dos testes
+    Controller = None
+
+logging.getLogger('mail.log').setLevel(logging.WARNING)
+
+from config import Config
+from app import create_app, db
+from app.email import email_outbox, EmailQueueFull
+from app.models import User, OutboxEmail
+
+
+class TestConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    MAIL_SERVER = '127.0.0.1'
+    MAIL_USE_TLS = False
+    MAIL_USE_SSL = False
+    MAIL_USERNAME = None
+    MAIL_PASSWORD = None
+    EMAIL_OUTBOX_MAX_PENDING = 2
+    EMAIL_WORKERS = 0
+    WTF_CSRF_ENABLED = False
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class _Inbox:
+    """Handler do aiosmtpd que guarda as mensagens recebidas."""
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return '250 OK'
+
+
+@unittest.skipIf(Controller is None, 'aiosmtpd não está instalado')
+class EmailOutboxTest(unittest.TestCase):
+
+    def setUp(self):
+        self.inbox = _Inbox()
+        TestConfig.MAIL_PORT = _free_port()
+        self.smtp = Controller(self.inbox, hostname='127.0.0.1', port=TestConfig.MAIL_PORT)
+        self.smtp.start()
+
+        self.app = create_app(TestConfig)
+        self.context = self.app.test_request_context(base_url='http://plataforma.test/')
+        self.context.push()
+        db.create_all()
+
+        self.users = [User(username=f'aluno{i}', email=f'aluno{i}@example.com', password_hash='x')
+                      for i in range(3)]
+        db.session.add_all(self.users)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+        self.smtp.stop()
+
+    def test_batch_is_sent_over_smtp(self):
+        email_outbox.enqueue('confirmation', self.users[0])
+        email_outbox.enqueue('password_reset', self.users[1])
+
+        self.assertEqual(email_outbox.process_due(), (2, 0))
+        self.assertEqual(sorted(rcpt for message in self.inbox.messages for rcpt in message.rcpt_tos),
+                         ['aluno0@example.com', 'aluno1@example.com'])
+        self.assertIn(b'http://plataforma.test/', self.inbox.messages[0].content)
+        self.assertEqual(email_outbox.pending_count(), 0)
+
+    def test_duplicate_request_is_ignored(self):
+        self.assertIsNotNone(email_outbox.enqueue('confirmation', self.users[0]))
+        self.assertIsNone(email_outbox.enqueue('confirmation', self.users[0]))
+
+    def test_full_queue_refuses_new_emails(self):
+        email_outbox.enqueue('confirmation', self.users[0])
+        email_outbox.enqueue('confirmation', self.users[1])
+        with self.assertRaises(EmailQueueFull):
+            email_outbox.enqueue('confirmation', self.users[2])
+        self.assertEqual(email_outbox.pending_count(), 2)
+
+    def test_reset_form_answers_the_same_when_queue_is_full(self):
+        email_outbox.enqueue('confirmation', self.users[0])
+        email_outbox.enqueue('confirmation', self.users[1])
+
+        client = self.app.test_client()
+        pages = [client.post('/auth/reset_password_request', data={'email': address},
+                             follow_redirects=True).get_data(as_text=True)
+                 for address in ('aluno2@example.com', 'ninguem@example.com')]
+        for page in pages:
+            self.assertIn('Um e-mail com instruções para redefinir sua senha foi enviado.', page)
+            self.assertNotIn('fila de envio está cheia', page)
+        self.assertEqual(email_outbox.pending_count(), 2)
+
+    def test_stale_sending_email_returns_to_queue(self):
+        email = email_outbox.enqueue('confirmation', self.users[0])
+        email.status = 'sending'
+        email.next_attempt_at = datetime.utcnow() - timedelta(minutes=11)
+        db.session.commit()
+
+        self.assertEqual(email_outbox.recover_stale(), 1)
+        self.assertEqual(email_outbox.process_due(), (1, 0))
+        self.assertEqual(db.session.get(OutboxEmail, email.id).status, 'sent')
+
+
+if __name__ == '__main__':
+    unittest.main()
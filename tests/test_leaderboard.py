@@ -0,0 +1,30 @@
+# tests/test_leaderboard.py
+
+import random
+import unittest
+
+from app.leaderboard import SortedScores
+
+
+class SortedScoresTest(unittest.TestCase):
+
+    def test_from_pairs_matches_incremental_updates(self):
+        pairs = [(member_id, random.randint(0, 50)) for member_id in range(500)]
+        incremental = SortedScores()
+        for member_id, score in pairs:
+            incremental.update(member_id, score)
+
+        built = SortedScores.from_pairs(pairs)
+        self.assertEqual(built.top(500), incremental.top(500))
+        self.assertEqual([built.rank(member_id) for member_id in range(500)],
+                         [incremental.rank(member_id) for member_id in range(500)])
+
+    def test_from_pairs_treats_missing_score_as_zero(self):
+        scores = SortedScores.from_pairs([(1, None), (2, 5)])
+        self.assertEqual(scores.top(2), [(2, 5), (1, 0)])
+        scores.update(1, 7)
+        self.assertEqual(scores.rank(1), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
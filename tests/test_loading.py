@@ -0,0 +1,71 @@
+# tests/test_loading.py
+
+import unittest
+
+from werkzeug.security import generate_password_hash
+
+from config import Config
+from app import create_app, db
+from app.loading import assert_bodies_not_loaded
+from app.models import User, Course, Lesson, ForumCategory, ForumTopic
+
+
+class TestConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    EMAIL_WORKERS = 0
+    COURSES_PER_PAGE = 2
+
+
+class ListingsDoNotLoadBodiesTest(unittest.TestCase):
+    """As listagens nunca buscam as colunas de corpo (texto sem limite) das linhas."""
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+
+        user = User(username='ana', email='ana@example.com', confirmed=True,
+                    password_hash=generate_password_hash('senha', method='pbkdf2:sha256:1000'))
+        courses = [Course(title=f'Curso {i}', description='Descrição longa ' * 50, category='Automação')
+                   for i in range(3)]
+        self.lessons = [Lesson(title=f'Aula {i}', content='Conteúdo ' * 50, course=courses[0]) for i in range(3)]
+        category = ForumCategory(name='Dúvidas', slug='duvidas')
+        topics = [ForumTopic(title=f'Tópico {i}', content='Pergunta ' * 50, user=user, category=category)
+                  for i in range(3)]
+        db.session.add_all([user, *courses, *self.lessons, category, *topics])
+        db.session.commit()
+        self.course_id, self.category_id = courses[0].id, category.id
+
+        self.client = self.app.test_client()
+        self.client.post('/auth/login', data={'email': 'ana@example.com', 'password': 'senha'})
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def _get(self, url, **kwargs):
+        with assert_bodies_not_loaded(**kwargs):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return response
+
+    def test_course_catalog(self):
+        self._get('/cursos')
+
+    def test_course_catalog_api(self):
+        first_page = self._get('/api/cursos').get_json()
+        self._get(f"/api/cursos?cursor={first_page['next_cursor']}")
+
+    def test_forum_category(self):
+        self._get(f'/forum/categoria/{self.category_id}')
+
+    def test_lesson_navigation(self):
+        # Só a aula aberta traz o conteúdo; a navegação lista as outras sem corpo
+        lesson = self.lessons[1]
+        self._get(f'/cursos/{self.course_id}/aula/{lesson.id}', allow={(Lesson, lesson.id)})
+
+
+if __name__ == '__main__':
+    unittest.main()
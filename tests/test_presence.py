@@ -0,0 +1,86 @@
+# tests/test_presence.py
+
+import time
+import unittest
+
+from app.cache import LocalStore
+from app.presence import InMemoryPresenceBackend, SharedStorePresenceBackend
+
+
+class PresenceBackendContract:
+    """Comportamento comum aos backends de presença."""
+
+    def make_backend(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.backend = self.make_backend()
+
+    def test_multiple_tabs(self):
+        self.assertTrue(self.backend.add(1, 'ana', 'sid-a'))
+        self.assertFalse(self.backend.add(1, 'ana', 'sid-b'))
+        self.assertEqual(self.backend.sids(1), {'sid-a', 'sid-b'})
+
+        self.assertEqual(self.backend.remove('sid-a'), (1, 'ana', False))
+        self.assertTrue(self.backend.is_online(1))
+        self.assertEqual(self.backend.remove('sid-b'), (1, 'ana', True))
+        self.assertFalse(self.backend.is_online(1))
+
+    def test_unknown_sid(self):
+        self.assertIsNone(self.backend.remove('desconhecido'))
+
+    def test_online_queries(self):
+        self.backend.add(1, 'ana', 'sid-a')
+        self.backend.add(2, 'bruno', 'sid-b')
+        self.assertEqual(self.backend.online_users(), {1: 'ana', 2: 'bruno'})
+        self.assertEqual(self.backend.online_among([2, 3]), {2: 'bruno'})
+        self.assertEqual(self.backend.online_count(), 2)
+
+
+class InMemoryPresenceBackendTest(PresenceBackendContract, unittest.TestCase):
+    def make_backend(self):
+        return InMemoryPresenceBackend()
+
+
+class SharedStorePresenceBackendTest(PresenceBackendContract, unittest.TestCase):
+    def make_backend(self):
+        self.store = LocalStore()
+        return SharedStorePresenceBackend(self.store, worker_id='w1')
+
+    def test_connections_on_two_workers(self):
+        other = SharedStorePresenceBackend(self.store, worker_id='w2')
+        self.assertTrue(self.backend.add(1, 'ana', 'sid-a'))
+        self.assertFalse(other.add(1, 'ana', 'sid-b'))
+
+        # A saída em um worker não derruba a conexão aberta no outro
+        self.assertEqual(self.backend.remove('sid-a'), (1, 'ana', False))
+        self.assertEqual(other.online_users(), {1: 'ana'})
+        self.assertEqual(other.remove('sid-b'), (1, 'ana', True))
+        self.assertEqual(self.backend.online_count(), 0)
+
+    def test_dead_worker_is_reaped(self):
+        crashed = SharedStorePresenceBackend(self.store, worker_id='w2')
+        crashed.heartbeat(ttl=0.05)
+        crashed.add(1, 'ana', 'sid-a')
+        crashed.add(2, 'bruno', 'sid-b')
+        self.backend.heartbeat(ttl=30)
+        self.backend.add(2, 'bruno', 'sid-c')
+
+        self.assertEqual(self.backend.reap_dead_workers(), [])
+        time.sleep(0.1)
+        removed = sorted(self.backend.reap_dead_workers())
+        self.assertEqual(removed, [(1, 'ana', True), (2, 'bruno', False)])
+        self.assertEqual(self.backend.online_users(), {2: 'bruno'})
+        self.assertEqual(self.backend.sids(2), {'sid-c'})
+        self.assertEqual(self.backend.reap_dead_workers(), [])
+
+    def test_live_worker_is_kept(self):
+        other = SharedStorePresenceBackend(self.store, worker_id='w2')
+        other.heartbeat(ttl=30)
+        other.add(1, 'ana', 'sid-a')
+        self.assertEqual(self.backend.reap_dead_workers(), [])
+        self.assertTrue(self.backend.is_online(1))
+
+
+if __name__ == '__main__':
+    unittest.main()